@@ -128,6 +128,107 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Rows per INSERT/lookup for bulk mutations and imports
+CRM_BULK_BATCH_SIZE = 500
+
+# Products with less stock than this are restocked and shown by lowStock
+CRM_LOW_STOCK_THRESHOLD = 10
+
+# Dotted path to a crm.search backend; None picks one for the database
+CRM_SEARCH_BACKEND = None
+
+# Parsed/validated GraphQL documents kept per process
+CRM_DOCUMENT_CACHE_SIZE = 500
+
+# Seconds an Automatic Persisted Query stays registered (None = no expiry)
+CRM_PERSISTED_QUERY_TIMEOUT = None
+
+# Root query fields whose responses are cached, with their TTL in seconds,
+# e.g. {"allProducts": 300, "allCustomers": 60}. Empty disables the cache.
+CRM_RESPONSE_CACHE_FIELDS = {}
+
+# Django cache used for responses; point it at Redis to share across workers
+CRM_RESPONSE_CACHE_ALIAS = "default"
+
+# Serve /graphql with the async view (run under an ASGI server such as uvicorn)
+CRM_ASYNC_GRAPHQL = False
+
+# Worker threads the async view resolves ORM fields in
+CRM_ASYNC_GRAPHQL_WORKERS = 8
+
+# Queries deeper or costlier than this are rejected before execution
+# (edges/node do not count towards depth; see crm.query_cost). None
+# disables the check. A connection without first/last counts as 100 rows,
+# so customers -> orders -> products without first costs 10101; set a
+# maximum cost only once clients page explicitly.
+CRM_QUERY_MAX_DEPTH = 10
+CRM_QUERY_MAX_COST = None
+
+# Token-bucket budgets in cost points: per API key (X-API-Key header),
+# with "default" for everyone else, e.g.
+# {"default": {"capacity": 50000, "rate": 500}}. None disables budgets.
+CRM_QUERY_BUDGETS = None
+
+# Per-resolver and per-SQL timings, logged as one JSON line per operation
+# on "crm.graphql"; operations slower than CRM_SLOW_REQUEST_MS also go to
+# "crm.graphql.slow", and SQL shapes repeated more than
+# CRM_N_PLUS_ONE_THRESHOLD times are reported as likely N+1 queries.
+# Off by default; when on, CRM_TRACE_SAMPLE_RATE of operations are traced.
+CRM_GRAPHQL_TRACING = False
+CRM_TRACE_SAMPLE_RATE = 1.0
+CRM_TRACE_IN_RESPONSE = DEBUG
+CRM_SLOW_REQUEST_MS = 500
+CRM_N_PLUS_ONE_THRESHOLD = 10
+
+# Prometheus metrics for GraphQL operations, served at /metrics. Under
+# gunicorn or Celery, set PROMETHEUS_MULTIPROC_DIR to an empty directory
+# shared by the workers so /metrics reports all of them.
+CRM_METRICS_ENABLED = True
+# Operation names (chosen by clients) with their own latency series; every
+# other named operation is reported as "other".
+CRM_METRICS_OPERATIONS = set()
+
+# Jobs that go through crm.graphql_client (the low-stock cron, the weekly
+# report and the sales rollup refresh) run their GraphQL operations
+# in-process. Set CRM_JOBS_GRAPHQL_URL to POST them to a server instead
+# (jobs on hosts without database access), with CRM_JOBS_GRAPHQL_API_KEY
+# as X-API-Key.
+# The reminder and cleanup tasks page and checkpoint through the ORM and
+# always need the database.
+CRM_JOBS_GRAPHQL_URL = None
+CRM_JOBS_GRAPHQL_API_KEY = None
+CRM_JOBS_GRAPHQL_TIMEOUT = 30
+
+# Order reminders go out in pages of CRM_REMINDER_BATCH_SIZE customers,
+# one SMTP connection per page, reused across tasks by the pooled backend.
+CRM_REMINDER_BATCH_SIZE = 200
+EMAIL_BACKEND = 'crm.mail.PooledEmailBackend'
+DEFAULT_FROM_EMAIL = 'crm@localhost'
+
+# Inactive-customer cleanup deletes CRM_CLEANUP_BATCH_SIZE customers per
+# transaction and sleeps CRM_CLEANUP_PAUSE seconds between batches.
+CRM_CLEANUP_BATCH_SIZE = 500
+CRM_CLEANUP_PAUSE = 0.5
+
+# /export/<name>.<csv|ndjson> reads rows from the database and writes
+# them to the response CRM_EXPORT_CHUNK_SIZE at a time.
+CRM_EXPORT_CHUNK_SIZE = 2000
+
+# manage.py crm_import validates and writes CRM_IMPORT_BATCH_SIZE rows at a
+# time, each batch in its own transaction.
+CRM_IMPORT_BATCH_SIZE = 2000
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'crm.graphql': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
 CRONJOBS = [
     ('*/5 * * * *', 'crm.cron.log_crm_heartbeat'),
     ('0 */12 * * *', 'crm.cron.update_low_stock'),
@@ -139,5 +240,17 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'crm.tasks.generate_crm_report',
         'schedule': crontab(day_of_week='mon', hour=6, minute=0),  # every Monday at 6 AM
     },
+    'send-order-reminders': {
+        'task': 'crm.tasks.send_order_reminders',
+        'schedule': crontab(hour=8, minute=0),  # every day at 8 AM
+    },
+    'clean-inactive-customers': {
+        'task': 'crm.tasks.clean_inactive_customers',
+        'schedule': crontab(day_of_week='sun', hour=2, minute=0),  # every Sunday at 2 AM
+    },
+    'refresh-sales-rollups': {
+        'task': 'crm.tasks.refresh_sales_rollups',
+        'schedule': crontab(minute='*/5'),  # every 5 minutes
+    },
 }
 
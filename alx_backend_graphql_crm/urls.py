@@ -14,13 +14,23 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path
-from graphene_django.views import GraphQLView
 from django.views.decorators.csrf import csrf_exempt
 from alx_backend_graphql_crm.schema import schema
+from alx_backend_graphql_crm.views import (
+    AsyncCRMGraphQLView, CRMGraphQLView, export, graphql_cache_stats, healthz, metrics, readyz,
+)
+
+GraphQLView = AsyncCRMGraphQLView if settings.CRM_ASYNC_GRAPHQL else CRMGraphQLView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path("graphql", csrf_exempt(GraphQLView.as_view(graphiql=True, schema=schema))),
+    path("graphql/cache-stats", graphql_cache_stats),
+    path("metrics", metrics),
+    path("healthz", healthz),
+    path("readyz", readyz),
+    path("export/<str:name>.<str:fmt>", export),
 ]
@@ -0,0 +1,613 @@
+import asyncio
+import hashlib
+import inspect
+import json
+import random
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import close_old_connections, connection, transaction
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, HttpResponseForbidden, HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
+from django.http.response import HttpResponseBadRequest
+from django.utils.decorators import method_decorator
+from django.utils.text import compress_sequence
+from django.views.decorators.csrf import ensure_csrf_cookie
+from graphene_django.constants import MUTATION_ERRORS_FLAG
+from graphene_django.settings import graphene_settings
+from graphene_django.utils.utils import set_rollback
+from graphene_django.views import GraphQLView, HttpError
+from graphql import ExecutionContext, ExecutionResult, FieldNode, GraphQLError, OperationType, execute, get_operation_ast, parse
+from graphql.pyutils import Path, Undefined
+from graphql.validation import validate
+
+from crm.export import CONTENT_TYPES, PERMISSIONS, encode, export_rows
+from crm.health import check_readiness
+from crm.loaders import context_loader
+from crm.metrics import record_operation, render_metrics
+from crm.query_cost import analyze, check_limits, client_budget
+from crm.response_cache import ResponseCache, response_cache_stats
+from crm.tracing import RequestTrace, TracingMiddleware, current_trace, trace_thread
+
+
+class DocumentCache:
+    """
+    LRU of parsed and validated documents keyed by the sha256 of the query.
+
+    Validation errors are cached with the document, so a query is parsed
+    and validated once per process however often it is sent.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+class PersistedQueryStats:
+    """Counters for Automatic Persisted Query lookups."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.registered = 0
+
+    def incr(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "registered": self.registered}
+
+
+document_cache = DocumentCache(getattr(settings, "CRM_DOCUMENT_CACHE_SIZE", 500))
+persisted_query_stats = PersistedQueryStats()
+
+PERSISTED_QUERY_PREFIX = "graphql:apq:"
+
+
+def query_hash(query):
+    return hashlib.sha256(query.encode("utf-8")).hexdigest()
+
+
+class Operation:
+    """A parsed and validated request, ready to execute."""
+
+    def __init__(self, document, ast, variables, operation_name):
+        self.document = document
+        self.ast = ast
+        self.kind = ast.operation if ast is not None else None
+        self.variables = variables
+        self.operation_name = operation_name
+        self.cost = None
+        self.response_cache = None
+        self.cache_key = None
+        self.ttl = None
+
+    def store(self, result):
+        """Save a successful result in the response cache, if it is cacheable."""
+        if self.cache_key is not None and not result.errors:
+            self.response_cache.store(self.cache_key, self.ttl, result.data)
+
+
+class CRMGraphQLView(GraphQLView):
+    """
+    GraphQLView that reuses parsed and validated documents and supports
+    Automatic Persisted Queries.
+
+    Clients may send ``extensions.persistedQuery.sha256Hash`` without a
+    query. Unknown hashes get a PersistedQueryNotFound error; the client
+    then resends the hash with the full query text, which is stored in
+    Django's cache for the next request.
+
+    Queries on the root fields listed in CRM_RESPONSE_CACHE_FIELDS are
+    answered from the response cache (see crm.response_cache). Everything
+    else is costed first and rejected if it is too deep, too costly or
+    over the client's budget (see crm.query_cost).
+    """
+
+    def get_response(self, request, data, show_graphiql=False):
+        query, variables, operation_name, id = self.get_graphql_params(request, data)
+
+        execution_result = self.execute_graphql_request(
+            request, data, query, variables, operation_name, show_graphiql
+        )
+        return self.build_response(request, execution_result, id, show_graphiql)
+
+    def build_response(self, request, execution_result, id=None, show_graphiql=False):
+        """Serialise an ExecutionResult the way GraphQLView.get_response does."""
+        if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+            set_rollback()
+
+        status_code = 200
+        if execution_result:
+            response = {}
+
+            if execution_result.errors:
+                set_rollback()
+                response["errors"] = [
+                    self.format_error(e) for e in execution_result.errors
+                ]
+
+            if execution_result.errors and any(
+                not getattr(e, "path", None) for e in execution_result.errors
+            ):
+                status_code = 400
+            else:
+                response["data"] = execution_result.data
+
+            if execution_result.extensions:
+                response["extensions"] = execution_result.extensions
+
+            if self.batch:
+                response["id"] = id
+                response["status"] = status_code
+
+            result = self.json_encode(request, response, pretty=show_graphiql)
+        else:
+            result = None
+
+        return result, status_code
+
+    def execute_graphql_request(
+        self, request, data, query, variables, operation_name, show_graphiql=False
+    ):
+        operation = self.prepare_operation(
+            request, data, query, variables, operation_name, show_graphiql
+        )
+        if not isinstance(operation, Operation):
+            return operation
+        try:
+            return self.run_operation(request, operation)
+        except Exception as e:
+            return ExecutionResult(errors=[e])
+
+    def prepare_operation(
+        self, request, data, query, variables, operation_name, show_graphiql=False
+    ):
+        """
+        Resolve, parse and validate the request.
+
+        Returns an Operation to execute, or the ExecutionResult (errors or
+        a cached response) or None (render GraphiQL) to answer with.
+        """
+        try:
+            query = self.get_persisted_query(request, data, query)
+        except GraphQLError as error:
+            return ExecutionResult(data=None, errors=[error])
+
+        if not query:
+            if show_graphiql:
+                return None
+            raise HttpError(HttpResponseBadRequest("Must provide query string."))
+
+        document, errors = self.get_document(query)
+        if errors:
+            return ExecutionResult(data=None, errors=errors)
+
+        operation = Operation(document, get_operation_ast(document, operation_name), variables, operation_name)
+
+        if request.method.lower() == "get" and operation.kind not in (None, OperationType.QUERY):
+            if show_graphiql:
+                return None
+
+            raise HttpError(
+                HttpResponseNotAllowed(
+                    ["POST"],
+                    "Can only perform a {} operation from a POST request.".format(
+                        operation.kind.value
+                    ),
+                )
+            )
+
+        if operation.ast is not None:
+            try:
+                operation.cost = analyze(self.schema.graphql_schema, document, operation.ast, variables)
+                check_limits(operation.cost)
+            except GraphQLError as error:
+                return ExecutionResult(data=None, errors=[error])
+
+        if operation.kind == OperationType.QUERY:
+            operation.response_cache = ResponseCache(self.schema)
+            operation.cache_key, operation.ttl, data = operation.response_cache.lookup(
+                document, operation.ast, variables, operation_name, getattr(request, "user", None)
+            )
+            if data is not None:
+                return ExecutionResult(data=data)
+
+        # Cached responses are free; everything else draws on the budget.
+        budget = client_budget(request)
+        if budget is not None and operation.cost is not None:
+            try:
+                budget.consume(operation.cost.cost)
+            except GraphQLError as error:
+                return ExecutionResult(data=None, errors=[error])
+
+        return operation
+
+    def get_execute_options(self, request, operation):
+        execute_options = {
+            "root_value": self.get_root_value(request),
+            "context_value": self.get_context(request),
+            "variable_values": operation.variables,
+            "operation_name": operation.operation_name,
+            "middleware": self.get_middleware(request),
+        }
+        if current_trace() is not None:
+            middleware = execute_options["middleware"]
+            middleware = list(getattr(middleware, "middlewares", middleware) or [])
+            execute_options["middleware"] = middleware + [TracingMiddleware()]
+        if self.execution_context_class:
+            execute_options["execution_context_class"] = self.execution_context_class
+        return execute_options
+
+    def run_operation(self, request, operation, **options):
+        trace = self.start_trace(operation)
+        if trace is None:
+            return self.execute_operation(request, operation, **options)
+        with trace.activate():
+            result = self.execute_operation(request, operation, **options)
+        return self.finish_trace(trace, result, operation)
+
+    def execute_operation(self, request, operation, **options):
+        execute_options = self.get_execute_options(request, operation)
+        execute_options.update(options)
+        schema = self.schema.graphql_schema
+
+        if operation.kind == OperationType.MUTATION and (
+            graphene_settings.ATOMIC_MUTATIONS is True
+            or connection.settings_dict.get("ATOMIC_MUTATIONS", False) is True
+        ):
+            with transaction.atomic():
+                result = execute(schema, operation.document, **execute_options)
+                if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+                    transaction.set_rollback(True)
+            return result
+
+        result = execute(schema, operation.document, **execute_options)
+        if not inspect.isawaitable(result):
+            operation.store(result)
+        return result
+
+    def start_trace(self, operation):
+        """
+        A RequestTrace for the operation: detailed for the sampled share
+        (CRM_TRACE_SAMPLE_RATE) of operations when tracing is on, else
+        just enough for metrics, if they are on.
+        """
+        detailed = getattr(settings, "CRM_GRAPHQL_TRACING", False) and (
+            random.random() < getattr(settings, "CRM_TRACE_SAMPLE_RATE", 1.0)
+        )
+        if not (detailed or getattr(settings, "CRM_METRICS_ENABLED", False)):
+            return None
+        name = operation.operation_name
+        if name is None and operation.ast is not None and operation.ast.name is not None:
+            name = operation.ast.name.value
+        return RequestTrace(name, operation.kind.value if operation.kind is not None else None, detailed=detailed)
+
+    def finish_trace(self, trace, result, operation):
+        if trace is None:
+            return result
+        trace.finish()
+        if getattr(settings, "CRM_METRICS_ENABLED", False):
+            # Response keys are aliases the client chose; label by field name.
+            fields = {
+                (node.alias or node.name).value: node.name.value
+                for node in (operation.ast.selection_set.selections if operation.ast is not None else ())
+                if isinstance(node, FieldNode)
+            }
+            record_operation(
+                trace.operation_type, trace.operation_name, trace.duration,
+                trace=trace, data=result.data, errors=result.errors, fields=fields,
+            )
+        if trace.detailed:
+            summary = trace.log()
+            if getattr(settings, "CRM_TRACE_IN_RESPONSE", False):
+                result.extensions = dict(result.extensions or {}, tracing=summary)
+        return result
+
+    def get_document(self, query):
+        """Return (document, errors) for ``query``, parsing it at most once."""
+        key = query_hash(query)
+        entry = document_cache.get(key)
+        if entry is not None:
+            return entry
+
+        try:
+            document = parse(query)
+        except GraphQLError as error:
+            # Syntax errors are cheap to find again and not worth a slot.
+            return None, [error]
+
+        errors = validate(
+            self.schema.graphql_schema,
+            document,
+            self.validation_rules,
+            graphene_settings.MAX_VALIDATION_ERRORS,
+        )
+        entry = (document, errors or None)
+        document_cache.set(key, entry)
+        return entry
+
+    def get_persisted_query(self, request, data, query):
+        """Resolve or register an Automatic Persisted Query."""
+        extensions = request.GET.get("extensions") or data.get("extensions")
+        if not extensions:
+            return query
+        if isinstance(extensions, str):
+            try:
+                extensions = json.loads(extensions)
+            except ValueError:
+                raise HttpError(HttpResponseBadRequest("Extensions are invalid JSON."))
+        if not isinstance(extensions, dict):
+            raise HttpError(HttpResponseBadRequest("Extensions must be a JSON object."))
+        persisted = extensions.get("persistedQuery")
+        if not persisted:
+            return query
+        if not isinstance(persisted, dict):
+            raise HttpError(HttpResponseBadRequest("persistedQuery must be a JSON object."))
+
+        if persisted.get("version") != 1:
+            raise GraphQLError(
+                "Unsupported persisted query version.",
+                extensions={"code": "PERSISTED_QUERY_NOT_SUPPORTED"},
+            )
+        sha256 = persisted.get("sha256Hash")
+        if not sha256 or not isinstance(sha256, str):
+            raise HttpError(HttpResponseBadRequest("persistedQuery needs a sha256Hash."))
+        key = PERSISTED_QUERY_PREFIX + sha256
+
+        if query:
+            if query_hash(query) != sha256:
+                raise GraphQLError(
+                    "provided sha does not match query",
+                    extensions={"code": "PERSISTED_QUERY_HASH_MISMATCH"},
+                )
+            cache.set(key, query, getattr(settings, "CRM_PERSISTED_QUERY_TIMEOUT", None))
+            persisted_query_stats.incr("registered")
+            return query
+
+        query = cache.get(key)
+        if query is None:
+            persisted_query_stats.incr("misses")
+            raise GraphQLError(
+                "PersistedQueryNotFound",
+                extensions={"code": "PERSISTED_QUERY_NOT_FOUND"},
+            )
+        persisted_query_stats.incr("hits")
+        return query
+
+
+class ConcurrentExecutionContext(ExecutionContext):
+    """
+    Resolves each root query field, with everything below it, in its own
+    worker thread, so independent root fields (e.g. allCustomers and
+    allOrders) hit the database concurrently. The ORM stays synchronous
+    inside the worker; the event loop only awaits the results.
+    """
+
+    def execute_fields(self, parent_type, source_value, path, fields):
+        if path is not None:
+            return super().execute_fields(parent_type, source_value, path, fields)
+
+        run = sync_to_async(_with_connection, thread_sensitive=False, executor=graphql_executor)
+        names = list(fields)
+        pending = [
+            run(self.execute_field, parent_type, source_value, fields[name], Path(None, name, parent_type.name))
+            for name in names
+        ]
+
+        async def get_results():
+            results = await asyncio.gather(*pending)
+            return {name: result for name, result in zip(names, results) if result is not Undefined}
+
+        return get_results()
+
+
+def _with_connection(func, *args):
+    # Worker threads hold their own DB connection; apply CONN_MAX_AGE to
+    # it the way the request cycle does for the main thread.
+    close_old_connections()
+    try:
+        with trace_thread():
+            return func(*args)
+    finally:
+        close_old_connections()
+
+
+graphql_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, "CRM_ASYNC_GRAPHQL_WORKERS", 8),
+    thread_name_prefix="graphql",
+)
+
+
+class AsyncCRMGraphQLView(CRMGraphQLView):
+    """
+    CRMGraphQLView for ASGI servers.
+
+    The request does not hold a worker thread while it waits on the
+    database: queries run through graphql-core's async executor with
+    ConcurrentExecutionContext, and mutations run serially in one
+    worker thread so their transaction stays on one connection. Both use
+    the bounded pool sized by CRM_ASYNC_GRAPHQL_WORKERS. GraphiQL and
+    batched requests fall back to the synchronous view.
+    """
+
+    view_is_async = True
+
+    @method_decorator(ensure_csrf_cookie)
+    async def dispatch(self, request, *args, **kwargs):
+        if self.batch or request.method.lower() not in ("get", "post"):
+            return await sync_to_async(super().dispatch)(request, *args, **kwargs)
+
+        try:
+            data = self.parse_body(request)
+            if self.graphiql and self.can_display_graphiql(request, data):
+                return await sync_to_async(super().dispatch)(request, *args, **kwargs)
+
+            query, variables, operation_name, id = self.get_graphql_params(request, data)
+            # Budgets and the response cache look at request.user, which
+            # loads the session user from the database: not on the loop.
+            operation = await sync_to_async(self.prepare_operation)(
+                request, data, query, variables, operation_name
+            )
+            if isinstance(operation, Operation):
+                try:
+                    execution_result = await self.run_operation_async(request, operation)
+                except Exception as e:
+                    execution_result = ExecutionResult(errors=[e])
+            else:
+                execution_result = operation
+            result, status_code = self.build_response(request, execution_result, id)
+
+            return HttpResponse(
+                status=status_code, content=result, content_type="application/json"
+            )
+
+        except HttpError as e:
+            response = e.response
+            response["Content-Type"] = "application/json"
+            response.content = self.json_encode(
+                request, {"errors": [self.format_error(e)]}
+            )
+            return response
+
+    async def run_operation_async(self, request, operation):
+        if operation.kind != OperationType.QUERY:
+            run = sync_to_async(_with_connection, thread_sensitive=False, executor=graphql_executor)
+            return await run(self.run_operation, request, operation)
+
+        # Create the relation loader up front so the workers share it.
+        context_loader(self.get_context(request))
+        trace = self.start_trace(operation)
+        with trace.activate() if trace is not None else nullcontext():
+            result = self.execute_operation(
+                request, operation, execution_context_class=ConcurrentExecutionContext
+            )
+            if inspect.isawaitable(result):
+                result = await result
+                operation.store(result)
+        return self.finish_trace(trace, result, operation)
+
+
+def graphql_cache_stats(request):
+    """Document, persisted query and response cache counters (staff or DEBUG only)."""
+    user = getattr(request, "user", None)
+    if not (settings.DEBUG or (user is not None and user.is_staff)):
+        return HttpResponseForbidden()
+    return JsonResponse({
+        "documents": document_cache.stats(),
+        "persistedQueries": persisted_query_stats.stats(),
+        "responses": response_cache_stats.stats(),
+    })
+
+
+def metrics(request):
+    """Prometheus metrics, merged across processes under PROMETHEUS_MULTIPROC_DIR."""
+    body, content_type = render_metrics()
+    return HttpResponse(body, content_type=content_type)
+
+
+def healthz(request):
+    """Liveness: the process is serving requests. Touches no dependencies."""
+    return JsonResponse({"status": "ok"})
+
+
+def readyz(request):
+    """Readiness: the database and cache answer; 503 otherwise."""
+    ready, checks = check_readiness()
+    return JsonResponse(
+        {"status": "ok" if ready else "unavailable", "checks": checks},
+        status=200 if ready else 503,
+    )
+
+
+def export(request, name, fmt):
+    """
+    Stream a filtered export as CSV or NDJSON, e.g.
+    ``/export/orders.csv?totalAmount_Gte=100&orderBy=-order_date``.
+
+    Takes the same filters as allCustomers, allProducts and allOrders.
+    Rows are read from a database cursor and written out in chunks, so
+    memory stays flat however many there are; clients that accept gzip
+    get the stream compressed on the fly. Only logged-in users with view
+    permission on the exported models (PERMISSIONS) may download.
+    """
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+    user = getattr(request, "user", None)
+    if user is None or not user.is_authenticated or not user.has_perms(PERMISSIONS.get(name, ())):
+        return HttpResponseForbidden()
+    if fmt not in CONTENT_TYPES:
+        return HttpResponseBadRequest(f"Unknown format '{fmt}'; use csv or ndjson.")
+    try:
+        columns, rows = export_rows(name, request.GET.dict(), request)
+    except ValidationError as exc:
+        return HttpResponseBadRequest("; ".join(exc.messages))
+
+    chunks = encode(columns, rows, fmt)
+    gzip = "gzip" in request.headers.get("Accept-Encoding", "")
+    if gzip:
+        chunks = compress_sequence(chunks)
+    if isinstance(request, ASGIRequest):
+        chunks = _async_chunks(chunks)
+
+    response = StreamingHttpResponse(chunks, content_type=CONTENT_TYPES[fmt])
+    response["Content-Disposition"] = f'attachment; filename="{name}.{fmt}"'
+    response["Vary"] = "Accept-Encoding"
+    if gzip:
+        response["Content-Encoding"] = "gzip"
+    return response
+
+
+async def _async_chunks(chunks):
+    # Under ASGI a sync iterator would be read into memory before sending;
+    # pull each chunk on the thread that owns the database cursor instead.
+    pull = sync_to_async(next, thread_sensitive=True)
+    done = object()
+    while (chunk := await pull(chunks, done)) is not done:
+        yield chunk
@@ -0,0 +1,111 @@
+import os
+import sys
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "alx_backend_graphql_crm.settings")
+django.setup()
+
+from django.core.management import call_command
+from django.db import connection
+from django.utils import timezone
+
+from crm.models import Customer, Product, Order
+
+# Migration before and after the filter indexes
+BEFORE = "0002_product_restock_target"
+AFTER = "0003_filter_indexes"
+
+
+def hot_path_queries():
+    """The filter and ordering querysets the API and cron jobs run most."""
+    now = timezone.now()
+    week_ago = now - timedelta(days=7)
+    customer_id = Customer.objects.order_by("id").values_list("id", flat=True).first()
+    return {
+        "reminders: orderDate_Gte last week": Order.objects.filter(order_date__gte=week_ago),
+        "orders page: orderBy -order_date": Order.objects.order_by("-order_date", "-id")[:50],
+        "customer orders by date": Order.objects.filter(customer_id=customer_id).order_by("-order_date"),
+        "orders: totalAmount_Gte": Order.objects.filter(total_amount__gte=Decimal("900")).order_by("total_amount"),
+        "cleanup: inactive customers": Customer.objects.filter(
+            orders__isnull=True, created_at__lt=now - timedelta(days=365)
+        ),
+        "customers: createdAt_Gte": Customer.objects.filter(created_at__gte=now - timedelta(days=30)),
+        "customers: phonePattern": Customer.objects.filter(phone__startswith="+23320"),
+        "products: lowStock": Product.objects.filter(stock__lt=10),
+        "products: price range": Product.objects.filter(price__gte=100, price__lte=200).order_by("price"),
+    }
+
+
+def seed(customers, orders):
+    """Bulk insert synthetic rows spread over two years."""
+    now = timezone.now()
+    Customer.objects.bulk_create(
+        Customer(name=f"Customer {i}", email=f"bench{i}@example.com", phone=f"+233{random.randint(200000000, 599999999)}")
+        for i in range(customers)
+    )
+    Customer.objects.update(created_at=now - timedelta(days=730))
+    Product.objects.bulk_create(
+        Product(name=f"Product {i}", price=Decimal(random.randint(100, 99999)) / 100, stock=random.randint(0, 100))
+        for i in range(max(customers // 10, 1))
+    )
+    customer_ids = list(Customer.objects.values_list("id", flat=True))
+    # One month per 1/24th of the orders, newest first
+    Order.objects.bulk_create(
+        (
+            Order(
+                customer_id=random.choice(customer_ids),
+                total_amount=Decimal(random.randint(100, 99999)) / 100,
+                order_date=now - timedelta(days=i * 24 // orders * 30),
+            )
+            for i in range(orders)
+        ),
+        batch_size=1000,
+    )
+
+
+def measure(queryset, repeat=5):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        list(queryset.all())
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def report(label):
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+    results = {}
+    print(f"\n===== {label} =====")
+    for name, queryset in hot_path_queries().items():
+        results[name] = measure(queryset)
+        print(f"\n-- {name} ({results[name]:.2f} ms)")
+        print(queryset.explain())
+    return results
+
+
+def run(customers=20000, orders=100000):
+    print(f"\n🚀 Seeding {customers} customers and {orders} orders into a test database...\n")
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0)
+    try:
+        seed(customers, orders)
+
+        call_command("migrate", "crm", BEFORE, verbosity=0)
+        before = report("BEFORE (no filter indexes)")
+        call_command("migrate", "crm", AFTER, verbosity=0)
+        after = report("AFTER (0003_filter_indexes)")
+
+        print("\n===== Summary (ms per query) =====")
+        print(f"{'query':<40} {'before':>9} {'after':>9}")
+        for name in before:
+            print(f"{name:<40} {before[name]:>9.2f} {after[name]:>9.2f}")
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == "__main__":
+    run(*(int(arg) for arg in sys.argv[1:3]))
@@ -0,0 +1,88 @@
+from decimal import Decimal
+from django.db.models import Avg, Count, Max, Min, Sum
+from django.db.models.functions import TruncDate
+from .models import Customer, Product, Order, OrderItem
+from .orders import line_total
+
+
+class OrderStats:
+    """
+    Aggregates over a filtered Order queryset, computed in the database.
+
+    The queryset is reduced to a primary-key subquery first so joins added
+    by filters (e.g. ``productName``) cannot double count orders.
+    """
+
+    def __init__(self, queryset):
+        self.queryset = Order.objects.filter(pk__in=queryset.values("pk"))
+        self._totals = None
+
+    @property
+    def totals(self):
+        if self._totals is None:
+            self._totals = _to_money(self.queryset.aggregate(**_order_aggregates()))
+        return self._totals
+
+    def by_day(self):
+        rows = (
+            self.queryset.annotate(day=TruncDate("order_date"))
+            .values("day")
+            .annotate(**_order_aggregates())
+            .order_by("day")
+        )
+        return [_to_money(row) for row in rows]
+
+    def by_customer(self, first=None):
+        rows = (
+            self.queryset.values("customer_id")
+            .annotate(**_order_aggregates())
+            .order_by("-revenue", "customer_id")
+        )
+        rows = [_to_money(row) for row in (rows[:first] if first else rows)]
+        customers = Customer.objects.in_bulk([row["customer_id"] for row in rows])
+        for row in rows:
+            row["customer"] = customers.get(row["customer_id"])
+        return rows
+
+    def by_product(self, first=None):
+        # Revenue per product is the sum of its lines at the prices they
+        # were sold at, not of the totals of every order it appears in,
+        # and never joins the live Product.price.
+        lines = OrderItem.objects.filter(order__in=self.queryset.values("pk"))
+        rows = (
+            lines.values("product_id")
+            .annotate(
+                count=Count("order_id", distinct=True),
+                revenue=Sum(line_total()),
+                # Named apart from the column so line_total() still reads it
+                units=Sum("quantity"),
+                avg=Avg("unit_price"),
+                min=Min("unit_price"),
+                max=Max("unit_price"),
+            )
+            .order_by("-revenue", "product_id")
+        )
+        rows = [_to_money(row) for row in (rows[:first] if first else rows)]
+        products = Product.objects.in_bulk([row["product_id"] for row in rows])
+        for row in rows:
+            row["product"] = products.get(row["product_id"])
+            row["quantity"] = row.pop("units")
+        return rows
+
+
+def _order_aggregates():
+    return {
+        "count": Count("id"),
+        "revenue": Sum("total_amount"),
+        "avg": Avg("total_amount"),
+        "min": Min("total_amount"),
+        "max": Max("total_amount"),
+    }
+
+
+def _to_money(row):
+    # SQLite returns bare numerics for decimal aggregates; keep cents.
+    for key in ("revenue", "avg", "min", "max"):
+        if row.get(key) is not None:
+            row[key] = Decimal(row[key]).quantize(Decimal("0.01"))
+    return row
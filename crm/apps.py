@@ -1,6 +1,28 @@
 from django.apps import AppConfig
+from django.db.models.signals import m2m_changed, post_delete, post_migrate, post_save, pre_save
 
 
 class CrmConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'crm'
+
+    def ready(self):
+        from .customer_stats import customer_created, order_deleted, order_saved
+        from .models import Customer, Order, OrderItem
+        from .response_cache import TAGGED_MODELS, invalidate_on_save
+        from .rollups import order_changed, order_saving
+        from .search import install_search
+
+        post_migrate.connect(install_search, sender=self)
+        for model in TAGGED_MODELS:
+            post_save.connect(invalidate_on_save, sender=model)
+            post_delete.connect(invalidate_on_save, sender=model)
+        m2m_changed.connect(invalidate_on_save, sender=Order.products.through)
+        post_save.connect(invalidate_on_save, sender=OrderItem)
+        post_delete.connect(invalidate_on_save, sender=OrderItem)
+        post_save.connect(customer_created, sender=Customer)
+        post_save.connect(order_saved, sender=Order)
+        post_delete.connect(order_deleted, sender=Order)
+        pre_save.connect(order_saving, sender=Order)
+        post_save.connect(order_changed, sender=Order)
+        post_delete.connect(order_changed, sender=Order)
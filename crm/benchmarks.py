@@ -0,0 +1,300 @@
+import contextlib
+import io
+import math
+import statistics
+import time
+import tracemalloc
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from .graphql_client import GraphQLClientError, JobContext
+from .models import Customer, Product
+
+# Median latency and peak memory are compared against the baseline with
+# these relative tolerances (the tail percentiles are recorded but too
+# noisy to gate on); query counts must not grow at all.
+LATENCY_TOLERANCE = 0.5
+MEMORY_TOLERANCE = 0.25
+# Differences below these are noise, whatever the ratio
+MIN_LATENCY_MS = 2.0
+MIN_MEMORY_KB = 64
+
+CUSTOMERS_PAGE = """
+{
+  allCustomers(first: 50, orderBy: "-stats__lifetime_value") {
+    totalCount
+    edges { node { id name email orderCount lifetimeValue lastOrderDate } }
+  }
+}
+"""
+
+CUSTOMERS_WITH_ORDERS = """
+{
+  allCustomers(first: 20, hasOrders: true, orderBy: "name") {
+    edges {
+      node {
+        name
+        orders(first: 5) { edges { node { totalAmount orderDate } } }
+      }
+    }
+  }
+}
+"""
+
+ORDERS_WITH_LINES = """
+{
+  allOrders(first: 50, orderBy: "-order_date", totalAmount_Gte: 20) {
+    edges {
+      node {
+        totalAmount
+        customer { name email }
+        items { edges { node { quantity unitPrice lineTotal product { name price } } } }
+      }
+    }
+  }
+}
+"""
+
+# Computed fields only, so their columns must come from the optimizer
+ORDER_LINE_TOTALS = """
+{
+  allOrders(first: 50, orderBy: "-order_date") {
+    edges { node { id items { edges { node { lineTotal } } } } }
+  }
+}
+"""
+
+PRODUCT_SEARCH = """
+{
+  allProducts(first: 20, search: "wireless", orderBy: "-price") {
+    edges { node { name price stock } }
+  }
+}
+"""
+
+DEEP_OFFSET = """
+query ($offset: Int) {
+  allOrders(first: 50, offset: $offset, orderBy: "-order_date") {
+    edges { node { id orderDate totalAmount } }
+  }
+}
+"""
+
+DEEP_KEYSET = """
+query ($after: String) {
+  allOrders(first: 50, after: $after, keyset: true, orderBy: "-order_date") {
+    pageInfo { endCursor }
+    edges { node { id orderDate totalAmount } }
+  }
+}
+"""
+
+ORDER_STATS = """
+{
+  orderStats(orderDate_Gte: "2000-01-01T00:00:00+00:00") {
+    count revenue avg
+    byProduct(first: 10) { product { name } count quantity revenue }
+    byCustomer(first: 10) { customer { name } count revenue }
+  }
+}
+"""
+
+SALES_TIMESERIES = """
+{
+  salesTimeseries(granularity: WEEK) { period orderCount customerCount revenue }
+}
+"""
+
+CREATE_CUSTOMER = """
+mutation ($email: String!) {
+  createCustomer(input: {name: "Bench Customer", email: $email, phone: "+233201234567"}) {
+    customer { id } errors
+  }
+}
+"""
+
+BULK_CREATE_CUSTOMERS = """
+mutation ($input: [BulkCustomerInput!]!) {
+  bulkCreateCustomers(input: $input) { customers { id } errors }
+}
+"""
+
+CREATE_PRODUCT = """
+mutation {
+  createProduct(input: {name: "Bench Product", price: 19.99, stock: 5}) { product { id } errors }
+}
+"""
+
+CREATE_ORDER = """
+mutation ($customer: ID!, $products: [ID!]!) {
+  createOrder(input: {customerId: $customer, productIds: $products}) { order { id totalAmount } errors }
+}
+"""
+
+BULK_CREATE_ORDERS = """
+mutation ($input: [BulkOrderInput!]!) {
+  bulkCreateOrders(input: $input) { orders { id } errors }
+}
+"""
+
+UPDATE_LOW_STOCK = """
+mutation {
+  updateLowStockProducts(increment: 10) { success updatedProducts { id stock } }
+}
+"""
+
+
+def execute(query, variables=None):
+    """Run ``query`` against the schema in-process, raising on errors."""
+    # Imported here like graphql_client: the schema imports every model
+    from alx_backend_graphql_crm.schema import schema
+
+    result = schema.execute(query, variable_values=variables, context_value=JobContext())
+    if result.errors:
+        raise GraphQLClientError([{"message": str(error)} for error in result.errors])
+    for payload in (result.data or {}).values():
+        # Mutations report failures in their errors field
+        if isinstance(payload, dict) and payload.get("errors"):
+            raise GraphQLClientError([{"message": message} for message in payload["errors"]])
+    return result.data
+
+
+def rolled_back(func):
+    """Run ``func`` in a transaction that is rolled back, so every run sees the same data."""
+
+    def run():
+        with transaction.atomic():
+            func()
+            transaction.set_rollback(True)
+
+    return run
+
+
+def scenarios():
+    """
+    {name: callable} for the representative operations, bound to rows of
+    the current database (reads need generated data to be meaningful).
+    """
+    customers = list(Customer.objects.order_by("pk").values_list("pk", flat=True)[:50])
+    products = list(Product.objects.filter(stock__gte=50).order_by("pk").values_list("pk", flat=True)[:3])
+    if not customers or not products:
+        raise ValueError("The database needs customers and products with stock; run generate_data first.")
+    products = [str(pk) for pk in products]
+
+    # A cursor 5,000 orders deep, found once outside the measurements
+    after = None
+    for _ in range(100):
+        page = execute(DEEP_KEYSET, {"after": after})["allOrders"]
+        after = page["pageInfo"]["endCursor"] or after
+
+    def bulk_customers():
+        execute(BULK_CREATE_CUSTOMERS, {"input": [
+            {"name": f"Bench {n}", "email": f"bench.bulk.{n}@example.com", "phone": "+233201234567"}
+            for n in range(50)
+        ]})
+
+    def bulk_orders():
+        execute(BULK_CREATE_ORDERS, {"input": [
+            {"customerId": str(pk), "productIds": products[: 1 + n % len(products)]}
+            for n, pk in enumerate(customers)
+        ]})
+
+    def report():
+        from .tasks import generate_crm_report
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            generate_crm_report()
+
+    return {
+        "customers_page": lambda: execute(CUSTOMERS_PAGE),
+        "customers_with_orders": lambda: execute(CUSTOMERS_WITH_ORDERS),
+        "orders_with_lines": lambda: execute(ORDERS_WITH_LINES),
+        "order_line_totals": lambda: execute(ORDER_LINE_TOTALS),
+        "product_search": lambda: execute(PRODUCT_SEARCH),
+        "deep_page_offset": lambda: execute(DEEP_OFFSET, {"offset": 5000}),
+        "deep_page_keyset": lambda: execute(DEEP_KEYSET, {"after": after}),
+        "order_stats": lambda: execute(ORDER_STATS),
+        "sales_timeseries": lambda: execute(SALES_TIMESERIES),
+        "create_customer": rolled_back(lambda: execute(CREATE_CUSTOMER, {"email": "bench.one@example.com"})),
+        "bulk_create_customers": rolled_back(bulk_customers),
+        "create_product": rolled_back(lambda: execute(CREATE_PRODUCT)),
+        "create_order": rolled_back(
+            lambda: execute(CREATE_ORDER, {"customer": str(customers[0]), "products": products})
+        ),
+        "bulk_create_orders": rolled_back(bulk_orders),
+        "update_low_stock": rolled_back(lambda: execute(UPDATE_LOW_STOCK)),
+        "crm_report": rolled_back(report),
+    }
+
+
+def _percentile(ordered, fraction):
+    """Nearest-rank percentile of a sorted list."""
+    return ordered[max(math.ceil(fraction * len(ordered)) - 1, 0)]
+
+
+def measure(func, iterations=20, warmup=2):
+    """
+    Latency percentiles (ms) over ``iterations`` runs after ``warmup``,
+    the SQL queries of one run, and the peak memory (KB) allocated by a
+    separate run under tracemalloc, which would otherwise skew timings.
+    """
+    for _ in range(warmup):
+        func()
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    with CaptureQueriesContext(connection) as queries:
+        func()
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    timings.sort()
+    return {
+        "p50_ms": round(_percentile(timings, 0.50), 3),
+        "p95_ms": round(_percentile(timings, 0.95), 3),
+        "p99_ms": round(_percentile(timings, 0.99), 3),
+        "mean_ms": round(statistics.fmean(timings), 3),
+        "queries": len(queries),
+        "peak_kb": round(peak / 1024, 1),
+    }
+
+
+def run(iterations=20, warmup=2, only=None, progress=None):
+    """measure() every scenario (or those named in ``only``); returns {name: result}."""
+    results = {}
+    for name, func in scenarios().items():
+        if only and name not in only:
+            continue
+        results[name] = measure(func, iterations=iterations, warmup=warmup)
+        if progress is not None:
+            progress(name, results[name])
+    return results
+
+
+def compare(results, baseline, latency_tolerance=LATENCY_TOLERANCE, memory_tolerance=MEMORY_TOLERANCE):
+    """
+    Regressions of ``results`` against ``baseline`` (both {name: result})
+    as readable messages. Scenarios missing from the baseline are new and
+    not compared.
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if result["queries"] > base["queries"]:
+            regressions.append(f"{name}: {result['queries']} queries, baseline {base['queries']}")
+        p50, base_p50 = result["p50_ms"], base["p50_ms"]
+        if p50 > base_p50 * (1 + latency_tolerance) and p50 - base_p50 > MIN_LATENCY_MS:
+            regressions.append(f"{name}: p50 {p50:.1f} ms, baseline {base_p50:.1f} ms")
+        if (
+            result["peak_kb"] > base["peak_kb"] * (1 + memory_tolerance)
+            and result["peak_kb"] - base["peak_kb"] > MIN_MEMORY_KB
+        ):
+            regressions.append(f"{name}: peak {result['peak_kb']:.0f} KB, baseline {base['peak_kb']:.0f} KB")
+    return regressions
@@ -1,5 +1,6 @@
 import os
 from celery import Celery
+from celery.signals import worker_process_shutdown
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'alx_backend_graphql_crm.settings')
 
@@ -8,3 +9,10 @@ app = Celery('crm')
 app.config_from_object('django.conf:settings', namespace='CELERY')
 
 app.autodiscover_tasks()
+
+
+@worker_process_shutdown.connect
+def close_smtp_connections(**kwargs):
+    from crm.mail import close_pooled_connections
+
+    close_pooled_connections()
@@ -0,0 +1,95 @@
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+from .metrics import JOB_ITEMS
+from .models import Customer, JobCheckpoint, Order
+
+CHECKPOINT_NAME = "inactive_customer_cleanup"
+
+
+def inactive_customers(cutoff):
+    """Customers created before ``cutoff`` who have never ordered."""
+    return Customer.objects.filter(created_at__lt=cutoff).exclude(
+        Exists(Order.objects.filter(customer=OuterRef("pk")))
+    )
+
+
+def cleanup_candidates(cutoff):
+    """
+    Customers created before ``cutoff`` whose CustomerStats show no orders,
+    or who have no stats row yet. This reads the stats table instead of
+    anti-joining Order; the delete re-checks with inactive_customers().
+    """
+    return Customer.objects.filter(
+        Q(stats__order_count=0) | Q(stats__isnull=True), created_at__lt=cutoff
+    )
+
+
+def delete_inactive_customers(days=365, batch_size=None, pause=None, dry_run=False, progress=None):
+    """
+    Delete customers older than ``days`` days without orders, in
+    primary-key batches.
+
+    Each batch selects up to ``batch_size`` (CRM_CLEANUP_BATCH_SIZE) ids
+    after the last one handled and deletes them in its own short
+    transaction, re-checking the conditions so a customer who ordered in
+    the meantime is kept. The run sleeps ``pause`` seconds
+    (CRM_CLEANUP_PAUSE) between batches to leave the table to live
+    traffic. Progress is saved in a JobCheckpoint, so an interrupted run
+    resumes after the last finished batch with the same cutoff.
+
+    With ``dry_run`` nothing is deleted or checkpointed; the batches are
+    only counted. ``progress(batch_number, handled, total)`` is called
+    after each batch. Returns (customers deleted or matched, whether an
+    interrupted run was resumed).
+    """
+    batch_size = batch_size or getattr(settings, "CRM_CLEANUP_BATCH_SIZE", 500)
+    pause = getattr(settings, "CRM_CLEANUP_PAUSE", 0.5) if pause is None else pause
+    cutoff = timezone.now() - timedelta(days=days)
+
+    if dry_run:
+        checkpoint, resumed = None, False
+        position, total = 0, 0
+    else:
+        # window_end is the cutoff; window_start is unused for this job.
+        checkpoint, resumed = JobCheckpoint.start(CHECKPOINT_NAME, cutoff, cutoff)
+        cutoff = checkpoint.window_end
+        position, total = checkpoint.position, checkpoint.processed
+
+    batch_number = 0
+    while True:
+        ids = list(
+            cleanup_candidates(cutoff)
+            .filter(pk__gt=position)
+            .order_by("pk")
+            .values_list("pk", flat=True)[:batch_size]
+        )
+        if not ids:
+            break
+        batch_number += 1
+        position = ids[-1]
+
+        if dry_run:
+            handled = len(ids)
+            JOB_ITEMS.labels("clean_inactive_customers", "matched").inc(handled)
+        else:
+            with transaction.atomic():
+                _, deleted = inactive_customers(cutoff).filter(pk__in=ids).delete()
+                handled = deleted.get(Customer._meta.label, 0)
+                checkpoint.advance(position, handled)
+            JOB_ITEMS.labels("clean_inactive_customers", "deleted").inc(handled)
+        total += handled
+        if progress is not None:
+            progress(batch_number, handled, total)
+
+        if len(ids) < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+
+    if checkpoint is not None:
+        checkpoint.finish()
+    return total, resumed
@@ -1,24 +1,35 @@
 import os
 from datetime import datetime 
-import requests
+from crm import graphql_client
+from crm.health import check_readiness
+from crm.metrics import track_job
 
 def log_crm_heartbeat():
-    
-    timestamp = datetime.now().strftime("%d/%m/%Y-%H:%M:%S")
-    log_message = f"{timestamp} CRM is alive\n"
+    """Runs every 5 minutes — logs whether the database and cache answer."""
+    with track_job("crm_heartbeat") as job:
+        ready, checks = check_readiness()
+        timestamp = datetime.now().strftime("%d/%m/%Y-%H:%M:%S")
+        if ready:
+            log_message = f"{timestamp} CRM is alive\n"
+        else:
+            job.fail()
+            failed = ", ".join(
+                f"{name}: {result['error']}" for name, result in checks.items() if not result["ok"]
+            )
+            log_message = f"{timestamp} CRM is NOT ready ({failed})\n"
 
-    tmp_dir = "/tmp" if os.name != "nt" else os.path.join(os.getcwd(), "crm", "logs")
-    os.makedirs(tmp_dir, exist_ok=True)
+        tmp_dir = "/tmp" if os.name != "nt" else os.path.join(os.getcwd(), "crm", "logs")
+        os.makedirs(tmp_dir, exist_ok=True)
 
-    log_path = os.path.join(tmp_dir, "crm_heartbeat_log.txt")
+        log_path = os.path.join(tmp_dir, "crm_heartbeat_log.txt")
 
-    with open(log_path, "a", encoding="utf-8") as f:
-        f.write(log_message)
+        with open(log_path, "a", encoding="utf-8") as f:
+            f.write(log_message)
 
     
 
 def update_low_stock():
-    """Runs every 12 hours — restocks products via GraphQL mutation."""
+    """Runs every 12 hours — restocks products via GraphQL mutation, run in-process."""
     mutation = """
     mutation {
       updateLowStockProducts {
@@ -32,28 +43,25 @@ def update_low_stock():
     }
     """
 
-    try:
-        response = requests.post(
-            "http://localhost:8000/graphql",
-            json={"query": mutation},
-            timeout=10
-        )
-        data = response.json()
-        result = data.get("data", {}).get("updateLowStockProducts", {})
+    with track_job("update_low_stock") as job:
+        try:
+            data = graphql_client.query(mutation)
+            result = data.get("updateLowStockProducts") or {}
 
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        tmp_dir = "/tmp" if os.name != "nt" else os.path.join(os.getcwd(), "crm", "logs")
-        os.makedirs(tmp_dir, exist_ok=True)
-        log_path = os.path.join(tmp_dir, "low_stock_updates_log.txt")
+            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            tmp_dir = "/tmp" if os.name != "nt" else os.path.join(os.getcwd(), "crm", "logs")
+            os.makedirs(tmp_dir, exist_ok=True)
+            log_path = os.path.join(tmp_dir, "low_stock_updates_log.txt")
 
-        with open(log_path, "a", encoding="utf-8") as f:
-            f.write(f"\n{timestamp} — {result.get('message')}\n")
-            for prod in result.get("updatedProducts", []):
-                f.write(f"   {prod['name']}: new stock = {prod['stock']}\n")
+            with open(log_path, "a", encoding="utf-8") as f:
+                f.write(f"\n{timestamp} — {result.get('message')}\n")
+                for prod in result.get("updatedProducts", []):
+                    f.write(f"   {prod['name']}: new stock = {prod['stock']}\n")
 
-        print("Low-stock update completed")
+            print("Low-stock update completed")
 
-    except Exception as e:
-        with open("/tmp/low_stock_updates_log.txt", "a", encoding="utf-8") as f:
-            f.write(f"{datetime.now()} — Error: {e}\n")
-        print("Error updating low-stock products:", e)
+        except Exception as e:
+            job.fail()
+            with open("/tmp/low_stock_updates_log.txt", "a", encoding="utf-8") as f:
+                f.write(f"{datetime.now()} — Error: {e}\n")
+            print("Error updating low-stock products:", e)
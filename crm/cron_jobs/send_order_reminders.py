@@ -1,59 +1,27 @@
 #!/usr/bin/env python3
+"""
+Send this week's order reminders from cron. Celery Beat runs the same
+pipeline as crm.tasks.send_order_reminders; use one or the other.
+"""
 import os
-from datetime import datetime, timedelta
-from gql import gql, Client
-from gql.transport.requests import RequestsHTTPTransport
+import sys
 
-GRAPHQL_URL = "http://localhost:8000/graphql"
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "alx_backend_graphql_crm.settings")
 
-today = datetime.now()
-week_ago = today - timedelta(days=7)
+import django
 
-query = gql("""
-query GetRecentOrders($afterDate: DateTime!) {
-  allOrders(orderDate_Gte: $afterDate) {
-    edges {
-      node {
-        id
-        customer {
-          email
-        }
-        orderDate
-      }
-    }
-  }
-}
-""")
+django.setup()
 
-
-transport = RequestsHTTPTransport(
-    url=GRAPHQL_URL,
-    verify=False,
-    retries=3,
-)
-client = Client(transport=transport, fetch_schema_from_transport=False)
-
-project_root = os.path.join(os.getcwd(), "crm", "cron_jobs")
-os.makedirs(project_root, exist_ok=True)
-log_path = os.path.join(project_root, "order_reminders_log.txt")
+from crm.metrics import track_job
+from crm.reminders import send_order_reminders
 
 try:
-    variables = {"afterDate": week_ago.isoformat()}
-    response = client.execute(query, variable_values=variables)
-
-    orders = response.get("allOrders", {}).get("edges", [])
-
-    with open(log_path, "a", encoding="utf-8") as f:
-        f.write(f"\n{datetime.now()} - Found {len(orders)} orders in the last week\n")
-        for order in orders:
-            node = order["node"]
-            order_id = node["id"]
-            email = node["customer"]["email"]
-            f.write(f"   - Order ID: {order_id}, Email: {email}\n")
-
-    print("Order reminders processed!")
+    with track_job("send_order_reminders"):
+        sent, resumed = send_order_reminders()
+    print(f"Order reminders sent to {sent} customers{' (resumed)' if resumed else ''}!")
 
 except Exception as e:
-    with open(log_path, "a", encoding="utf-8") as f:
-        f.write(f"\n{datetime.now()} - Error: {e}\n")
+    # The checkpoint is kept; the next run resumes where this one stopped.
     print("Error occurred while processing order reminders:", e)
+    sys.exit(1)
@@ -0,0 +1,179 @@
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Case, Count, F, Max, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Greatest
+from .models import Customer, CustomerStats, Order
+from .response_cache import invalidate
+from .utils import chunked
+
+# Every customer has a CustomerStats row: created with the customer,
+# backfilled by migration 0005 and restored by reconcile_stats().
+
+STATS_FIELDS = ("order_count", "lifetime_value", "last_order_date")
+
+# Customers per set-based UPDATE; bounds the size of its CASE expressions
+UPDATE_BATCH_SIZE = 200
+
+
+def ensure_stats(customer_ids):
+    """Create empty stats rows for customers that have none."""
+    CustomerStats.objects.bulk_create(
+        [CustomerStats(customer_id=pk) for pk in customer_ids], ignore_conflicts=True
+    )
+
+
+def _per_customer(values, field):
+    """
+    An expression evaluating to ``values[customer_id]`` for each row of an
+    UPDATE limited to those customers: a CASE, or a constant for one.
+    """
+    output_field = CustomerStats._meta.get_field(field)
+    if len(values) == 1:
+        return Value(next(iter(values.values())), output_field=output_field)
+    return Case(
+        *(When(customer_id=pk, then=Value(value, output_field=output_field)) for pk, value in values.items()),
+        output_field=output_field,
+    )
+
+
+def record_orders(orders):
+    """
+    Add new orders to their customers' stats, incrementing every customer
+    in one UPDATE (per UPDATE_BATCH_SIZE customers).
+    """
+    totals = {}
+    for order in orders:
+        count, revenue, last = totals.get(order.customer_id, (0, Decimal("0.00"), order.order_date))
+        totals[order.customer_id] = (count + 1, revenue + order.total_amount, max(last, order.order_date))
+    if not totals:
+        return
+    ensure_stats(totals)
+    for batch in chunked(totals.items(), UPDATE_BATCH_SIZE):
+        counts = {pk: count for pk, (count, _, _) in batch}
+        revenues = {pk: revenue for pk, (_, revenue, _) in batch}
+        last = _per_customer({pk: last for pk, (_, _, last) in batch}, "last_order_date")
+        CustomerStats.objects.filter(customer_id__in=counts).update(
+            order_count=F("order_count") + _per_customer(counts, "order_count"),
+            lifetime_value=F("lifetime_value") + _per_customer(revenues, "lifetime_value"),
+            last_order_date=Greatest(Coalesce("last_order_date", last), last),
+        )
+    invalidate(Customer)
+
+
+def add_revenue(deltas):
+    """Add {customer pk: amount} to lifetime values (e.g. when order totals change)."""
+    deltas = {pk: delta for pk, delta in deltas.items() if delta}
+    for batch in chunked(deltas.items(), UPDATE_BATCH_SIZE):
+        batch = dict(batch)
+        CustomerStats.objects.filter(customer_id__in=batch).update(
+            lifetime_value=F("lifetime_value") + _per_customer(batch, "lifetime_value")
+        )
+    if deltas:
+        invalidate(Customer)
+
+
+def refresh_stats(customer_ids):
+    """
+    Recompute the stats of ``customer_ids`` from Order in one UPDATE of
+    correlated subqueries; cheaper than record_orders() when many
+    customers got orders at once (imports).
+    """
+    ids = list(customer_ids)
+    if not ids:
+        return
+    orders = Order.objects.filter(customer_id=OuterRef("customer_id")).order_by().values("customer_id")
+    CustomerStats.objects.filter(customer_id__in=ids).update(
+        order_count=Coalesce(Subquery(orders.annotate(n=Count("id")).values("n")), 0),
+        lifetime_value=Coalesce(Subquery(orders.annotate(total=Sum("total_amount")).values("total")), Decimal("0.00")),
+        last_order_date=Subquery(orders.annotate(last=Max("order_date")).values("last")),
+    )
+    invalidate(Customer)
+
+
+def forget_orders(orders):
+    """Take deleted orders out of their customers' stats."""
+    totals = {}
+    for order in orders:
+        count, revenue = totals.get(order.customer_id, (0, Decimal("0.00")))
+        totals[order.customer_id] = (count + 1, revenue + order.total_amount)
+    if not totals:
+        return
+    latest = Order.objects.filter(customer_id=OuterRef("customer_id")).order_by("-order_date").values("order_date")[:1]
+    for customer_id, (count, revenue) in totals.items():
+        CustomerStats.objects.filter(customer_id=customer_id).update(
+            order_count=F("order_count") - count,
+            lifetime_value=F("lifetime_value") - revenue,
+            last_order_date=Subquery(latest),
+        )
+    invalidate(Customer)
+
+
+def customer_created(sender, instance, created, raw=False, **kwargs):
+    """post_save receiver for Customer."""
+    if created and not raw:
+        ensure_stats([instance.pk])
+
+
+def order_saved(sender, instance, created, raw=False, **kwargs):
+    """post_save receiver for Order; edits to existing orders are left to reconcile_stats()."""
+    if created and not raw:
+        record_orders([instance])
+
+
+def order_deleted(sender, instance, **kwargs):
+    """post_delete receiver for Order."""
+    forget_orders([instance])
+
+
+def reconcile_stats(batch_size=1000, dry_run=False):
+    """
+    Recompute stats from Order for every customer, in primary-key batches,
+    creating missing rows and correcting drifted ones (bulk_create or raw
+    SQL writes, edited orders). Returns (rows created, rows corrected).
+    """
+    created = corrected = 0
+    position = 0
+    while True:
+        ids = list(
+            Customer.objects.filter(pk__gt=position).order_by("pk").values_list("pk", flat=True)[:batch_size]
+        )
+        if not ids:
+            break
+        position = ids[-1]
+        with transaction.atomic():
+            actual = {
+                row["customer_id"]: row
+                for row in Order.objects.filter(customer_id__in=ids)
+                .values("customer_id")
+                .annotate(
+                    order_count=Count("id"),
+                    lifetime_value=Sum("total_amount"),
+                    last_order_date=Max("order_date"),
+                )
+                .order_by()
+            }
+            stored = CustomerStats.objects.select_for_update().in_bulk(ids)
+            missing, stale = [], []
+            for pk in ids:
+                row = actual.get(pk, {})
+                values = {
+                    "order_count": row.get("order_count", 0),
+                    # SQLite sums decimals as floats
+                    "lifetime_value": Decimal(row.get("lifetime_value") or 0).quantize(Decimal("0.01")),
+                    "last_order_date": row.get("last_order_date"),
+                }
+                stats = stored.get(pk)
+                if stats is None:
+                    missing.append(CustomerStats(customer_id=pk, **values))
+                elif any(getattr(stats, field) != value for field, value in values.items()):
+                    for field, value in values.items():
+                        setattr(stats, field, value)
+                    stale.append(stats)
+            if not dry_run:
+                CustomerStats.objects.bulk_create(missing, ignore_conflicts=True)
+                CustomerStats.objects.bulk_update(stale, STATS_FIELDS)
+                if missing or stale:
+                    invalidate(Customer)
+        created += len(missing)
+        corrected += len(stale)
+    return created, corrected
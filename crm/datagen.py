@@ -0,0 +1,176 @@
+import datetime
+import itertools
+import random
+from bisect import bisect
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from .customer_stats import ensure_stats, reconcile_stats
+from .models import Customer, Order, OrderItem, Product
+from .response_cache import invalidate
+from .rollups import rebuild_rollups
+
+FIRST_NAMES = (
+    "Ama", "Kofi", "Akosua", "Kwame", "Abena", "Yaw", "Efua", "Kojo", "Adwoa", "Kwesi",
+    "Alice", "Bob", "Carol", "David", "Erin", "Frank", "Grace", "Henry", "Ivy", "James",
+    "Fatima", "Ibrahim", "Zainab", "Musa", "Chen", "Li", "Priya", "Ravi", "Sofia", "Mateo",
+)
+LAST_NAMES = (
+    "Mensah", "Owusu", "Boateng", "Asante", "Osei", "Addo", "Appiah", "Darko", "Agyeman", "Ofori",
+    "Johnson", "Smith", "Brown", "Miller", "Davis", "Garcia", "Wilson", "Taylor", "Clark", "Lewis",
+)
+PRODUCT_WORDS = (
+    ("Wireless", "Smart", "Portable", "Compact", "Pro", "Ultra", "Classic", "Eco", "Mini", "Max"),
+    ("Headphones", "Speaker", "Laptop", "Phone", "Tablet", "Watch", "Camera", "Charger", "Keyboard", "Monitor",
+     "Kettle", "Blender", "Backpack", "Lamp", "Router"),
+)
+
+
+def _cumulative(weights):
+    return list(itertools.accumulate(weights))
+
+
+class Generator:
+    """
+    Seeded synthetic data with skewed, roughly realistic shapes:
+
+    - product prices are log-normal and product popularity is Zipfian,
+      so a few products take most of the sales;
+    - customer activity is Pareto-distributed (a fifth of the customers
+      place most orders, many place none);
+    - order volume grows over the ``days`` before ``end`` and peaks at
+      weekends;
+    - most orders have one or two lines and most lines one unit; lines
+      are priced at the product price, sometimes discounted.
+
+    The same seed against the same empty database gives the same rows.
+    """
+
+    def __init__(self, seed=42, days=730, end=None, batch_size=5000, progress=None):
+        self.rng = random.Random(seed)
+        self.days = days
+        self.end = end or timezone.localdate()
+        self.batch_size = batch_size
+        self.progress = progress
+
+    def _report(self, what, done, total):
+        if self.progress is not None:
+            self.progress(what, done, total)
+
+    def products(self, count):
+        rng = self.rng
+        created = []
+        for start in range(0, count, self.batch_size):
+            batch = []
+            for n in range(start, min(start + self.batch_size, count)):
+                price = Decimal(min(max(rng.lognormvariate(3.5, 1.0), 1), 5000)).quantize(Decimal("0.01"))
+                batch.append(Product(
+                    name=f"{rng.choice(PRODUCT_WORDS[0])} {rng.choice(PRODUCT_WORDS[1])} {n + 1}",
+                    price=price,
+                    # About one product in ten is low on stock
+                    stock=rng.randint(0, 9) if rng.random() < 0.1 else rng.randint(10, 500),
+                    restock_target=rng.choice((50, 100, 200)) if rng.random() < 0.2 else None,
+                ))
+            created.extend(Product.objects.bulk_create(batch))
+            self._report("products", len(created), count)
+        invalidate(Product)
+        return created
+
+    def customers(self, count):
+        rng = self.rng
+        # Unique emails even when the table already has generated rows
+        offset = (Customer.objects.aggregate(last=Max("pk"))["last"] or 0) + 1
+        ids = []
+        for start in range(0, count, self.batch_size):
+            batch = []
+            for n in range(offset + start, offset + min(start + self.batch_size, count)):
+                first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+                roll = rng.random()
+                if roll < 0.15:
+                    phone = None
+                elif roll < 0.6:
+                    phone = f"+233{rng.randint(200000000, 599999999)}"
+                else:
+                    phone = f"{rng.randint(200, 999)}-{rng.randint(200, 999)}-{rng.randint(0, 9999):04d}"
+                batch.append(Customer(
+                    name=f"{first} {last}", email=f"{first}.{last}.{n}@example.com".lower(), phone=phone
+                ))
+            with transaction.atomic():
+                batch = Customer.objects.bulk_create(batch)
+                ensure_stats([customer.pk for customer in batch])
+            ids.extend(customer.pk for customer in batch)
+            self._report("customers", len(ids), count)
+        invalidate(Customer)
+        return ids
+
+    def orders(self, count, customer_ids, products):
+        rng = self.rng
+        if not count or not customer_ids or not products:
+            return 0
+
+        customer_weights = _cumulative(rng.paretovariate(1.16) for _ in customer_ids)
+        ranked = list(products)
+        rng.shuffle(ranked)
+        product_weights = _cumulative(1 / (rank ** 1.1) for rank in range(1, len(ranked) + 1))
+
+        first_day = self.end - datetime.timedelta(days=self.days - 1)
+        days = [first_day + datetime.timedelta(days=n) for n in range(self.days)]
+        day_weights = _cumulative(
+            (1 + 2 * n / self.days) * (1.3 if day.weekday() >= 5 else 1.0) for n, day in enumerate(days)
+        )
+        tz = timezone.get_current_timezone()
+
+        def pick(population, cumulative):
+            return population[bisect(cumulative, rng.random() * cumulative[-1])]
+
+        done = 0
+        while done < count:
+            orders, lines = [], []
+            for _ in range(min(self.batch_size, count - done)):
+                day = pick(days, day_weights)
+                moment = datetime.datetime.combine(day, datetime.time()) + datetime.timedelta(
+                    seconds=rng.randrange(86400)
+                )
+                items = {}
+                for _ in range(min(1 + int(rng.expovariate(1.2)), 8)):
+                    product = pick(ranked, product_weights)
+                    roll = rng.random()
+                    quantity = 1 if roll < 0.7 else 2 if roll < 0.9 else rng.randint(3, 5)
+                    price = product.price
+                    if rng.random() < 0.1:
+                        price = (price * Decimal("0.9")).quantize(Decimal("0.01"))
+                    items[product.pk] = (quantity, price)
+                total = sum((quantity * price for quantity, price in items.values()), Decimal("0.00"))
+                orders.append(Order(
+                    customer_id=pick(customer_ids, customer_weights),
+                    total_amount=total,
+                    order_date=timezone.make_aware(moment, tz),
+                ))
+                lines.append(items)
+
+            with transaction.atomic():
+                orders = Order.objects.bulk_create(orders)
+                OrderItem.objects.bulk_create([
+                    OrderItem(order_id=order.pk, product_id=pid, quantity=quantity, unit_price=price)
+                    for order, items in zip(orders, lines)
+                    for pid, (quantity, price) in items.items()
+                ])
+            done += len(orders)
+            self._report("orders", done, count)
+        invalidate(Order)
+        return done
+
+
+def generate(customers=1000, products=100, orders=5000, seed=42, days=730, end=None, batch_size=5000, progress=None):
+    """
+    Add generated products, customers and orders, then bring CustomerStats
+    and the sales rollups up to date. Returns the generator used.
+    """
+    generator = Generator(seed=seed, days=days, end=end, batch_size=batch_size, progress=progress)
+    catalogue = generator.products(products) if products else list(Product.objects.all())
+    customer_ids = generator.customers(customers)
+    generator.orders(orders, customer_ids or list(Customer.objects.values_list("pk", flat=True)), catalogue)
+    reconcile_stats(batch_size=batch_size)
+    rebuild_rollups(end=max(generator.end, timezone.localdate()) + datetime.timedelta(days=1))
+    return generator
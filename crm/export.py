@@ -0,0 +1,123 @@
+import csv
+import datetime
+import io
+import json
+from decimal import Decimal
+from django.conf import settings
+from django.core.exceptions import FieldError, ValidationError
+from graphene.utils.str_converters import to_snake_case
+from .filters import CustomerFilter, OrderFilter, ProductFilter
+
+# name -> (filterset, [(column, lookup)])
+EXPORTS = {
+    "customers": (CustomerFilter, [
+        ("id", "id"),
+        ("name", "name"),
+        ("email", "email"),
+        ("phone", "phone"),
+        ("created_at", "created_at"),
+        ("order_count", "stats__order_count"),
+        ("lifetime_value", "stats__lifetime_value"),
+        ("last_order_date", "stats__last_order_date"),
+    ]),
+    "products": (ProductFilter, [
+        ("id", "id"),
+        ("name", "name"),
+        ("price", "price"),
+        ("stock", "stock"),
+    ]),
+    "orders": (OrderFilter, [
+        ("id", "id"),
+        ("customer_id", "customer_id"),
+        ("customer_name", "customer__name"),
+        ("customer_email", "customer__email"),
+        ("order_date", "order_date"),
+        ("total_amount", "total_amount"),
+    ]),
+}
+
+# Permissions a user needs for each export; orders carry customer details
+PERMISSIONS = {
+    "customers": ("crm.view_customer",),
+    "products": ("crm.view_product",),
+    "orders": ("crm.view_order", "crm.view_customer"),
+}
+
+CONTENT_TYPES = {"csv": "text/csv; charset=utf-8", "ndjson": "application/x-ndjson"}
+
+
+def export_rows(name, params, request=None):
+    """
+    (columns, rows) for export ``name`` filtered by ``params``, a mapping
+    of the filterset's arguments under either their Python or GraphQL
+    names (``total_amount__gte`` or ``totalAmount_Gte``), plus an optional
+    comma-separated ``orderBy``. Rows are tuples read from the database
+    CRM_EXPORT_CHUNK_SIZE at a time. Raises ValidationError for unknown
+    exports or invalid arguments.
+    """
+    if name not in EXPORTS:
+        raise ValidationError(f"Unknown export '{name}'; choose one of {', '.join(EXPORTS)}.")
+    filterset_class, columns = EXPORTS[name]
+
+    data = {to_snake_case(key): value for key, value in params.items() if key != "orderBy"}
+    unknown = set(data) - set(filterset_class.base_filters)
+    if unknown:
+        raise ValidationError(f"Unknown filters: {', '.join(sorted(unknown))}.")
+    filterset = filterset_class(data=data, queryset=filterset_class._meta.model.objects.all(), request=request)
+    if not filterset.is_valid():
+        raise ValidationError(filterset.form.errors.as_json())
+
+    order = params.get("orderBy")
+    try:
+        # A stable order, so a retried download gets the same file
+        qs = filterset.qs.order_by(*(order.split(",") if order else ()), "pk")
+    except FieldError as exc:
+        raise ValidationError(str(exc))
+
+    chunk_size = getattr(settings, "CRM_EXPORT_CHUNK_SIZE", 2000)
+    rows = qs.values_list(*(lookup for _, lookup in columns)).iterator(chunk_size=chunk_size)
+    return [column for column, _ in columns], rows
+
+
+def _plain(value):
+    # Full precision in both formats: DjangoJSONEncoder would cut
+    # datetimes to milliseconds and str() drops the T separator.
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def encode(columns, rows, fmt, batch_size=None):
+    """
+    Serialise ``rows`` as CSV (with a header row) or NDJSON, yielding
+    UTF-8 bytes ``batch_size`` rows at a time. Datetimes are written in
+    ISO 8601 with microseconds and decimals as strings.
+    """
+    batch_size = batch_size or getattr(settings, "CRM_EXPORT_CHUNK_SIZE", 2000)
+    buffer = io.StringIO()
+    if fmt == "csv":
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+
+        def write(row):
+            writer.writerow([_plain(value) for value in row])
+    else:
+        dumps = json.JSONEncoder(separators=(",", ":")).encode
+
+        def write(row):
+            buffer.write(dumps({column: _plain(value) for column, value in zip(columns, row)}))
+            buffer.write("\n")
+
+    pending = 0
+    for row in rows:
+        write(row)
+        pending += 1
+        if pending == batch_size:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
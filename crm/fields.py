@@ -0,0 +1,98 @@
+from functools import partial
+
+import graphene
+from django.db.models import QuerySet
+from graphene.relay.connection import connection_adapter, page_info_adapter
+from graphene_django.filter import DjangoFilterConnectionField
+from graphene_django.utils import maybe_queryset
+from graphql import GraphQLError
+from graphql_relay import connection_from_array_slice, cursor_to_offset, get_offset_with_default, offset_to_cursor
+
+from .loaders import get_loader
+from .pagination import is_keyset_cursor, keyset_connection
+
+
+class BatchedConnectionField(DjangoFilterConnectionField):
+    """
+    Filter connection field that registers the returned page with the
+    request's RelationLoader, so nested relations are batched per page.
+
+    Pages never run COUNT(*) unless ``totalCount`` is selected (or ``last``
+    is used in offset mode). Passing ``keyset: true``, or a cursor from a
+    keyset page, switches to keyset pagination on the ``orderBy`` key.
+    """
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault("keyset", graphene.Boolean(
+            default_value=False,
+            description="Paginate by seeking on the sort key instead of by offset.",
+        ))
+        super().__init__(*args, **kwargs)
+        # DjangoFilterConnectionField consumes an ``order_by`` kwarg itself,
+        # so the argument is added after initialisation.
+        self._base_args["order_by"] = graphene.Argument(
+            graphene.String,
+            description="Comma-separated model fields, prefixed with - for descending.",
+        )
+
+    @classmethod
+    def connection_resolver(cls, resolver, connection, default_manager, queryset_resolver,
+                            max_limit, enforce_first_or_last, root, info, **args):
+        keyset = args.pop("keyset", False)
+        if keyset or is_keyset_cursor(args.get("after")) or is_keyset_cursor(args.get("before")):
+            for name in ("first", "last"):
+                if max_limit and (args.get(name) or 0) > max_limit:
+                    raise GraphQLError(
+                        f"Requesting {args[name]} records on the `{info.field_name}` "
+                        f"connection exceeds the `{name}` limit of {max_limit} records."
+                    )
+            iterable = resolver(root, info, **args)
+            if iterable is None:
+                iterable = default_manager
+            queryset = maybe_queryset(queryset_resolver(connection, iterable, info, args))
+            result = keyset_connection(connection, queryset, args, max_limit=max_limit)
+        else:
+            result = super().connection_resolver(
+                resolver, connection, default_manager, queryset_resolver,
+                max_limit, enforce_first_or_last, root, info, **args
+            )
+        get_loader(info).register(edge.node for edge in result.edges)
+        return result
+
+    @classmethod
+    def resolve_connection(cls, connection, args, iterable, max_limit=None):
+        iterable = maybe_queryset(iterable)
+        # ``last`` counts back from the end, so it still needs the length.
+        if not isinstance(iterable, QuerySet) or args.get("last") is not None:
+            return super().resolve_connection(connection, args, iterable, max_limit=max_limit)
+
+        # Remove the offset parameter and convert it to an after cursor.
+        offset = args.pop("offset", None)
+        after = args.get("after")
+        if offset:
+            if after:
+                offset += cursor_to_offset(after) + 1
+            args["after"] = offset_to_cursor(offset - 1)
+        if max_limit is not None and args.get("first") is None:
+            args["first"] = max_limit
+
+        # Fetch one extra row to learn whether there is a next page.
+        slice_start = get_offset_with_default(args.get("after"), -1) + 1
+        first = args.get("first")
+        end = slice_start + first + 1 if first is not None else None
+        page = list(iterable[slice_start:end])
+
+        result = connection_from_array_slice(
+            page,
+            args,
+            slice_start=slice_start,
+            array_length=slice_start + len(page),
+            array_slice_length=len(page),
+            connection_type=partial(connection_adapter, connection),
+            edge_type=connection.Edge,
+            page_info_type=page_info_adapter,
+        )
+        result.iterable = iterable
+        result.length = None
+        return result
+
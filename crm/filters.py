@@ -1,6 +1,8 @@
 import django_filters
 from django.db.models import Q
-from .models import Customer, Product, Order
+from .models import Customer, Product, Order, OrderItem
+from .search import search
+from .stock import low_stock
 
 
 class CustomerFilter(django_filters.FilterSet):
@@ -10,13 +12,35 @@ class CustomerFilter(django_filters.FilterSet):
     created_at__lte = django_filters.DateFilter(field_name='created_at', lookup_expr='lte')
 
     phone_pattern = django_filters.CharFilter(method='filter_phone_pattern')
+    search = django_filters.CharFilter(method='filter_search')
+
+    # Denormalised order stats (CustomerStats); no join on Order
+    order_count__gte = django_filters.NumberFilter(field_name='stats__order_count', lookup_expr='gte')
+    order_count__lte = django_filters.NumberFilter(field_name='stats__order_count', lookup_expr='lte')
+    lifetime_value__gte = django_filters.NumberFilter(field_name='stats__lifetime_value', lookup_expr='gte')
+    lifetime_value__lte = django_filters.NumberFilter(field_name='stats__lifetime_value', lookup_expr='lte')
+    last_order_date__gte = django_filters.DateTimeFilter(field_name='stats__last_order_date', lookup_expr='gte')
+    last_order_date__lte = django_filters.DateTimeFilter(field_name='stats__last_order_date', lookup_expr='lte')
+    has_orders = django_filters.BooleanFilter(method='filter_has_orders')
+
+    def filter_search(self, queryset, name, value):
+        return search(queryset, value)
 
     def filter_phone_pattern(self, queryset, name, value):
         return queryset.filter(phone__startswith=value)
 
+    def filter_has_orders(self, queryset, name, value):
+        if value:
+            return queryset.filter(stats__order_count__gt=0)
+        return queryset.filter(stats__order_count=0)
+
     class Meta:
         model = Customer
-        fields = ['name', 'email', 'created_at__gte', 'created_at__lte', 'phone_pattern']
+        fields = [
+            'name', 'email', 'created_at__gte', 'created_at__lte', 'phone_pattern', 'search',
+            'order_count__gte', 'order_count__lte', 'lifetime_value__gte', 'lifetime_value__lte',
+            'last_order_date__gte', 'last_order_date__lte', 'has_orders',
+        ]
 
 
 class ProductFilter(django_filters.FilterSet):
@@ -28,10 +52,19 @@ class ProductFilter(django_filters.FilterSet):
 
     
     low_stock = django_filters.BooleanFilter(method='filter_low_stock')
+    low_stock_threshold = django_filters.NumberFilter(method='filter_low_stock_threshold')
+    search = django_filters.CharFilter(method='filter_search')
+
+    def filter_search(self, queryset, name, value):
+        return search(queryset, value)
 
     def filter_low_stock(self, queryset, name, value):
         if value:
-            return queryset.filter(stock__lt=10)
+            return low_stock(queryset, self.form.cleaned_data.get('low_stock_threshold'))
+        return queryset
+
+    def filter_low_stock_threshold(self, queryset, name, value):
+        # Only read by filter_low_stock
         return queryset
 
     class Meta:
@@ -49,6 +82,15 @@ class OrderFilter(django_filters.FilterSet):
     customer_name = django_filters.CharFilter(method='filter_customer_name')
     product_name = django_filters.CharFilter(method='filter_product_name')
     product_id = django_filters.NumberFilter(method='filter_product_id')
+    item_quantity__gte = django_filters.NumberFilter(method='filter_item_quantity')
+    search = django_filters.CharFilter(method='filter_search')
+
+    def filter_search(self, queryset, name, value):
+        # Orders whose customer (name, email) or any product name matches
+        customers = search(Customer.objects.all(), value)
+        products = search(Product.objects.all(), value)
+        lines = OrderItem.objects.filter(product__in=products)
+        return queryset.filter(Q(customer__in=customers) | Q(pk__in=lines.values('order_id')))
 
     def filter_customer_name(self, queryset, name, value):
         return queryset.filter(customer__name__icontains=value)
@@ -59,10 +101,15 @@ class OrderFilter(django_filters.FilterSet):
     def filter_product_id(self, queryset, name, value):
         return queryset.filter(products__id=value).distinct()
 
+    def filter_item_quantity(self, queryset, name, value):
+        # Orders with at least one line of ``value`` or more units
+        lines = OrderItem.objects.filter(quantity__gte=value)
+        return queryset.filter(pk__in=lines.values('order_id'))
+
     class Meta:
         model = Order
         fields = [
             'total_amount__gte', 'total_amount__lte',
             'order_date__gte', 'order_date__lte',
-            'customer_name', 'product_name', 'product_id'
+            'customer_name', 'product_name', 'product_id', 'item_quantity__gte', 'search'
         ]
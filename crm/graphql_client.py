@@ -0,0 +1,77 @@
+import requests
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from graphene_django.views import GraphQLView
+
+
+class GraphQLClientError(Exception):
+    """The operation returned errors."""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__("; ".join(error.get("message", str(error)) for error in errors))
+
+
+class JobContext:
+    """Stands in for the HTTP request as ``info.context`` in scheduled jobs."""
+
+    def __init__(self):
+        self.user = AnonymousUser()
+        self.META = {}
+
+
+def execute(query, variables=None, operation_name=None):
+    """
+    Run a GraphQL operation and return the response body as a dict
+    ({"data": ..., "errors": [...]}), as /graphql would.
+
+    Runs against the schema in this process unless CRM_JOBS_GRAPHQL_URL
+    is set, in which case it is POSTed there (for jobs on hosts without
+    the database). Only jobs whose work is done entirely through GraphQL
+    can run that way; the reminder and cleanup pipelines read and
+    checkpoint through the ORM.
+    """
+    url = getattr(settings, "CRM_JOBS_GRAPHQL_URL", None)
+    if url:
+        return _execute_remote(url, query, variables, operation_name)
+
+    # Imported here: the schema pulls in every model and the cron and
+    # Celery modules must import cleanly before apps are ready.
+    from alx_backend_graphql_crm.schema import schema
+
+    result = schema.execute(
+        query,
+        variable_values=variables,
+        operation_name=operation_name,
+        context_value=JobContext(),
+    )
+    response = {"data": result.data}
+    if result.errors:
+        response["errors"] = [GraphQLView.format_error(error) for error in result.errors]
+    return response
+
+
+def query(query, variables=None, operation_name=None):
+    """Like ``execute`` but return only the data, raising GraphQLClientError on errors."""
+    response = execute(query, variables, operation_name)
+    if response.get("errors"):
+        raise GraphQLClientError(response["errors"])
+    return response["data"]
+
+
+def _execute_remote(url, query, variables, operation_name):
+    headers = {}
+    api_key = getattr(settings, "CRM_JOBS_GRAPHQL_API_KEY", None)
+    if api_key:
+        headers["X-API-Key"] = api_key
+    response = requests.post(
+        url,
+        json={"query": query, "variables": variables, "operationName": operation_name},
+        headers=headers,
+        timeout=getattr(settings, "CRM_JOBS_GRAPHQL_TIMEOUT", 30),
+    )
+    try:
+        return response.json()
+    except ValueError:
+        response.raise_for_status()
+        raise
@@ -0,0 +1,48 @@
+import time
+import uuid
+from django.core.cache import cache
+from django.db import connection
+
+HEALTH_KEY = "crm:health:"
+
+
+def _check_database():
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1")
+        cursor.fetchone()
+
+
+def _check_cache():
+    # Round-trip a unique value; a cache that drops writes is not ready.
+    key = HEALTH_KEY + uuid.uuid4().hex
+    cache.set(key, 1, 10)
+    try:
+        if cache.get(key) != 1:
+            raise RuntimeError("cache did not return the value just written")
+    finally:
+        cache.delete(key)
+
+
+CHECKS = {
+    "database": _check_database,
+    "cache": _check_cache,
+}
+
+
+def check_readiness():
+    """
+    Run every dependency check; return (ready, {name: result}).
+
+    Each result is {"ok": bool, "ms": float} plus "error" when it failed.
+    """
+    results = {}
+    for name, check in CHECKS.items():
+        start = time.perf_counter()
+        try:
+            check()
+        except Exception as exc:
+            results[name] = {"ok": False, "error": str(exc)}
+        else:
+            results[name] = {"ok": True}
+        results[name]["ms"] = round((time.perf_counter() - start) * 1000, 2)
+    return all(result["ok"] for result in results.values()), results
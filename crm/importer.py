@@ -0,0 +1,441 @@
+import csv
+import datetime
+import gzip
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+import django
+from django.core.exceptions import ValidationError
+from django.core.management.color import no_style
+from django.core.validators import validate_email
+from django.db import connection, reset_queries, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from .customer_stats import ensure_stats, refresh_stats
+from .metrics import JOB_ITEMS
+from .models import Customer, Order, OrderItem, Product
+from .orders import apply_totals
+from .response_cache import invalidate
+from .rollups import mark_orders
+from .utils import to_decimal, validate_phone
+
+KINDS = ("customers", "products", "orders")
+
+
+class RowError(ValueError):
+    pass
+
+
+class ImportStats:
+    def __init__(self):
+        self.started = time.monotonic()
+        self.read = self.imported = self.skipped = self.rejected = 0
+        self.rejects_path = None
+
+    @property
+    def rate(self):
+        """Rows read per second so far."""
+        return self.read / max(time.monotonic() - self.started, 1e-9)
+
+    def __str__(self):
+        return (
+            f"{self.read} rows: {self.imported} imported, {self.skipped} skipped, "
+            f"{self.rejected} rejected ({self.rate:,.0f} rows/s)"
+        )
+
+
+# Parsing and validation. These run in worker processes and must not
+# touch the database; checks that need it happen in the writers below.
+
+def _text(record, field, required=False, max_length=None):
+    value = record.get(field)
+    value = str(value).strip() if value is not None else ""
+    if required and not value:
+        raise RowError(f"{field} is required.")
+    if max_length and len(value) > max_length:
+        raise RowError(f"{field} is longer than {max_length} characters.")
+    return value or None
+
+
+def _int(record, field, minimum=0):
+    value = record.get(field)
+    if value in (None, ""):
+        return None
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise RowError(f"{field} must be a whole number.")
+    if value < minimum:
+        raise RowError(f"{field} must be at least {minimum}.")
+    return value
+
+
+def _customer(record):
+    email = _text(record, "email", required=True).lower()
+    try:
+        validate_email(email)
+    except ValidationError:
+        raise RowError(f"Invalid email '{email}'.")
+    phone = _text(record, "phone")
+    validate_phone(phone)
+    return {"name": _text(record, "name", required=True, max_length=100), "email": email, "phone": phone}
+
+
+def _product(record):
+    price = to_decimal(_text(record, "price", required=True))
+    if price <= Decimal("0"):
+        raise RowError("Price must be a positive number.")
+    stock = _int(record, "stock")
+    return {
+        "id": _int(record, "id", minimum=1),
+        "name": _text(record, "name", required=True, max_length=100),
+        "price": price,
+        "stock": stock if stock is not None else 0,
+        "restock_target": _int(record, "restock_target"),
+    }
+
+
+def _order_items(value):
+    """
+    Lines as a list of {product_id, quantity, unit_price} (NDJSON) or a
+    "product_id:quantity@unit_price;..." string (CSV), where quantity and
+    unit_price are optional. Repeated products are merged.
+    """
+    if isinstance(value, str):
+        lines = []
+        for part in filter(None, (p.strip() for p in value.split(";"))):
+            part, _, price = part.partition("@")
+            pid, _, quantity = part.partition(":")
+            lines.append({"product_id": pid, "quantity": quantity or 1, "unit_price": price or None})
+    elif isinstance(value, list):
+        lines = [line if isinstance(line, dict) else {"product_id": line} for line in value]
+    else:
+        lines = []
+    if not lines:
+        raise RowError("At least one product must be provided.")
+
+    items = {}
+    for line in lines:
+        pid = _int(line, "product_id", minimum=1)
+        quantity = _int(line, "quantity", minimum=1)
+        if pid is None:
+            raise RowError("Every item needs a product_id.")
+        price = line.get("unit_price")
+        price = to_decimal(price) if price not in (None, "") else None
+        if price is not None and price < 0:
+            raise RowError("unit_price cannot be negative.")
+        quantity = quantity if quantity is not None else 1
+        if pid in items:
+            items[pid] = (items[pid][0] + quantity, items[pid][1])
+        else:
+            items[pid] = (quantity, price)
+    return items
+
+
+def _order_date(value):
+    if value in (None, ""):
+        return None
+    parsed = parse_datetime(str(value))
+    if parsed is None:
+        day = parse_date(str(value))
+        if day is None:
+            raise RowError(f"Invalid order_date '{value}'.")
+        parsed = datetime.datetime.combine(day, datetime.time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def _order(record):
+    customer_id = _int(record, "customer_id", minimum=1)
+    email = _text(record, "customer_email")
+    if customer_id is None and email is None:
+        raise RowError("customer_id or customer_email is required.")
+    return {
+        "id": _int(record, "id", minimum=1),
+        "customer_id": customer_id,
+        "customer_email": email.lower() if email else None,
+        "order_date": _order_date(record.get("order_date")),
+        "items": _order_items(record.get("items")),
+    }
+
+
+VALIDATORS = {"customers": _customer, "products": _product, "orders": _order}
+
+
+def validate_batch(kind, batch):
+    """
+    Parse and validate ``batch``, a list of (line, record) where record is
+    a dict (CSV) or a JSON line (NDJSON). Returns (valid, rejected):
+    lists of (line, cleaned dict) and (line, record, error).
+    """
+    clean = VALIDATORS[kind]
+    valid, rejected = [], []
+    for line, record in batch:
+        try:
+            if isinstance(record, str):
+                try:
+                    record = json.loads(record)
+                except ValueError as exc:
+                    raise RowError(f"Invalid JSON: {exc}")
+                if not isinstance(record, dict):
+                    raise RowError("Each line must be a JSON object.")
+            valid.append((line, clean(record)))
+        except (RowError, ValueError) as exc:
+            rejected.append((line, record, str(exc)))
+    return valid, rejected
+
+
+# Reading
+
+def detect_format(path):
+    name = path[:-3] if path.endswith(".gz") else path
+    return "csv" if name.endswith(".csv") else "ndjson"
+
+
+def _open(path, mode="rt"):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode, encoding="utf-8", newline="")
+    return open(path, mode, encoding="utf-8-sig" if "r" in mode else "utf-8", newline="")
+
+
+def read_batches(handle, fmt, batch_size):
+    """
+    Yield lists of up to ``batch_size`` (line, record). CSV rows are
+    split by the csv module here (quoted fields may span lines); NDJSON
+    lines are passed on undecoded for the workers to parse.
+    """
+    if fmt == "csv":
+        reader = csv.DictReader(handle)
+        records = ((reader.line_num, row) for row in reader)
+    else:
+        records = ((number, line) for number, line in enumerate(handle, start=1) if line.strip())
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _validated(kind, batches, workers):
+    """
+    (batch, valid, rejected) for each of ``batches``, in order, validated
+    in a pool of ``workers`` processes with at most two batches per
+    worker waiting, so a large file is never read far ahead.
+    """
+    if workers <= 1:
+        for batch in batches:
+            yield (batch, *validate_batch(kind, batch))
+        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as pool:
+        pending = deque()
+        for batch in batches:
+            pending.append((batch, pool.submit(validate_batch, kind, batch)))
+            if len(pending) >= workers * 2:
+                batch, future = pending.popleft()
+                yield (batch, *future.result())
+        while pending:
+            batch, future = pending.popleft()
+            yield (batch, *future.result())
+
+
+class RejectWriter:
+    """
+    Bad rows in the input's format with ``_line`` and ``_error`` added,
+    so the file can be corrected and imported again. Opened on the first
+    reject.
+    """
+
+    def __init__(self, path, fmt):
+        self.path, self.fmt = path, fmt
+        self.handle = self.writer = None
+
+    def write(self, line, record, error):
+        if self.fmt == "csv":
+            if self.writer is None:
+                self.handle = _open(self.path, "wt")
+                self.writer = csv.DictWriter(
+                    self.handle, fieldnames=[*record, "_line", "_error"], extrasaction="ignore"
+                )
+                self.writer.writeheader()
+            self.writer.writerow({**record, "_line": line, "_error": error})
+        else:
+            if self.handle is None:
+                self.handle = _open(self.path, "wt")
+            if isinstance(record, str):
+                try:
+                    record = json.loads(record)
+                except ValueError:
+                    pass
+            row = record if isinstance(record, dict) else {"_raw": record.rstrip("\r\n")}
+            self.handle.write(json.dumps({**row, "_line": line, "_error": error}, default=str) + "\n")
+
+    def close(self):
+        if self.handle is not None:
+            self.handle.close()
+
+
+# Writing. Each runs in its own transaction and returns (imported,
+# skipped, rejected) where rejected is a list of (line, error).
+
+def _write_customers(rows):
+    latest = {}
+    for line, row in rows:
+        latest[row["email"]] = row  # the last row for an email wins
+    customers = Customer.objects.bulk_create(
+        [Customer(**row) for row in latest.values()],
+        update_conflicts=True,
+        unique_fields=["email"],
+        update_fields=["name", "phone"],
+    )
+    ensure_stats([customer.pk for customer in customers])
+    invalidate(Customer)
+    return len(customers), len(rows) - len(customers), []
+
+
+def _write_products(rows):
+    latest = {}
+    for line, row in rows:
+        latest[row["id"] or ("line", line)] = row
+    products = Product.objects.bulk_create(
+        [Product(**row) for row in latest.values()],
+        update_conflicts=True,
+        unique_fields=["id"],
+        update_fields=["name", "price", "stock", "restock_target"],
+    )
+    invalidate(Product)
+    return len(products), len(rows) - len(products), []
+
+
+def _write_orders(rows):
+    emails = {row["customer_email"] for _, row in rows if row["customer_id"] is None}
+    by_email = dict(Customer.objects.filter(email__in=emails).values_list("email", "pk"))
+    customer_ids = set(
+        Customer.objects.filter(pk__in={row["customer_id"] for _, row in rows} - {None}).values_list("pk", flat=True)
+    )
+    prices = dict(
+        Product.objects.filter(pk__in={pid for _, row in rows for pid in row["items"]}).values_list("pk", "price")
+    )
+    existing = set(
+        Order.objects.filter(pk__in={row["id"] for _, row in rows} - {None}).values_list("pk", flat=True)
+    )
+
+    rejected, skipped, pending = [], 0, []
+    seen = set()
+    for line, row in rows:
+        if row["id"] in existing or row["id"] in seen:
+            # Imported before; order history is not rewritten
+            skipped += 1
+            continue
+        customer_id = row["customer_id"] or by_email.get(row["customer_email"])
+        if row["customer_id"] is not None and customer_id not in customer_ids:
+            rejected.append((line, f"Customer with id '{row['customer_id']}' does not exist."))
+            continue
+        if customer_id is None:
+            rejected.append((line, f"No customer with email '{row['customer_email']}'."))
+            continue
+        missing = [pid for pid in row["items"] if pid not in prices]
+        if missing:
+            rejected.append((line, f"Invalid product IDs: {missing}"))
+            continue
+        if row["id"] is not None:
+            seen.add(row["id"])
+        order = Order(id=row["id"], customer_id=customer_id, total_amount=Decimal("0.00"))
+        if row["order_date"] is not None:
+            order.order_date = row["order_date"]
+        pending.append((order, row["items"]))
+
+    orders = Order.objects.bulk_create([order for order, _ in pending])
+    OrderItem.objects.bulk_create([
+        OrderItem(
+            order_id=order.pk,
+            product_id=pid,
+            quantity=quantity,
+            # Historical lines keep the price they were sold at
+            unit_price=price if price is not None else prices[pid],
+        )
+        for order, items in pending
+        for pid, (quantity, price) in items.items()
+    ])
+    if orders:
+        apply_totals(orders, stats=False)
+        refresh_stats({order.customer_id for order in orders})
+        mark_orders(orders)
+    return len(orders), skipped, rejected
+
+
+WRITERS = {"customers": _write_customers, "products": _write_products, "orders": _write_orders}
+MODELS = {"customers": Customer, "products": Product, "orders": Order}
+
+
+def import_file(kind, path, fmt=None, batch_size=2000, workers=None, rejects_path=None, progress=None):
+    """
+    Stream ``path`` (CSV or NDJSON, optionally gzipped) into ``kind``.
+
+    Rows are read in batches of ``batch_size``, validated in a pool of
+    ``workers`` processes (1 validates in-process) while earlier batches
+    are written, and each batch is upserted with bulk_create in its own
+    transaction: customers on email, products on id (rows without one
+    are inserted). Orders are only inserted; an id that already exists
+    is skipped, so a failed import can be run again. Bad rows go to
+    ``rejects_path``. ``progress(stats)`` is called after every batch.
+    Returns an ImportStats.
+    """
+    if kind not in KINDS:
+        raise ValueError(f"Unknown kind '{kind}'; choose one of {', '.join(KINDS)}.")
+    fmt = fmt or detect_format(path)
+    if workers is None:
+        workers = min(4, os.cpu_count() or 1)
+    if rejects_path is None:
+        root, ext = os.path.splitext(path[:-3] if path.endswith(".gz") else path)
+        rejects_path = f"{root}.rejects{ext}"
+
+    stats = ImportStats()
+    stats.rejects_path = rejects_path
+    rejects = RejectWriter(rejects_path, fmt)
+    explicit_ids = False
+    with _open(path) as handle:
+        try:
+            for batch, valid, bad in _validated(kind, read_batches(handle, fmt, batch_size), workers):
+                imported = skipped = 0
+                if valid:
+                    with transaction.atomic():
+                        imported, skipped, refused = WRITERS[kind](valid)
+                    if refused:
+                        records = dict(batch)
+                        bad += [(line, records[line], error) for line, error in refused]
+                    explicit_ids = explicit_ids or any(row.get("id") for _, row in valid)
+                for line, record, error in sorted(bad, key=lambda reject: reject[0]):
+                    rejects.write(line, record, error)
+
+                stats.read += len(batch)
+                stats.imported += imported
+                stats.skipped += skipped
+                stats.rejected += len(bad)
+                for action, count in (("imported", imported), ("skipped", skipped), ("rejected", len(bad))):
+                    JOB_ITEMS.labels("crm_import", action).inc(count)
+                if progress is not None:
+                    progress(stats)
+                # Under DEBUG every INSERT would stay in connection.queries
+                reset_queries()
+        finally:
+            rejects.close()
+
+    if explicit_ids:
+        _reset_sequences(MODELS[kind])
+    return stats
+
+
+def _reset_sequences(model):
+    # Inserting explicit ids leaves PostgreSQL's id sequence behind
+    statements = connection.ops.sequence_reset_sql(no_style(), [model])
+    if statements:
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
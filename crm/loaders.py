@@ -0,0 +1,91 @@
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import prefetch_related_objects
+
+
+class RelationLoader:
+    """
+    Per-request loader that batches relation lookups across sibling instances.
+
+    Instances resolved together (a connection page, or everything fetched by
+    one batch) are registered as a group. The first time a relation is read
+    on any member, it is prefetched for the whole group in one query and the
+    fetched objects become the next group, so each nesting level costs a
+    single query instead of one per parent.
+    """
+
+    def __init__(self):
+        self._groups = {}
+        # Keep every group alive so id(group) is never reused within a request.
+        self._all_groups = []
+        self._loaded = set()
+
+    def register(self, instances):
+        group = []
+        seen = set()
+        for obj in instances:
+            # Objects already in a group (e.g. a parent re-attached by a
+            # reverse prefetch) keep their original siblings.
+            if obj is None or id(obj) in seen or id(obj) in self._groups:
+                continue
+            seen.add(id(obj))
+            group.append(obj)
+            self._groups[id(obj)] = group
+        self._all_groups.append(group)
+        return group
+
+    def load(self, instance, relation):
+        group = self._groups.get(id(instance))
+        if group is None:
+            group = self.register([instance])
+
+        key = (id(group), relation)
+        if key not in self._loaded:
+            self._loaded.add(key)
+            # Skip instances whose relation is already cached (e.g. by
+            # select_related/prefetch_related on the root queryset).
+            pending = [obj for obj in group if not _is_cached(obj, relation)]
+            if pending:
+                prefetch_related_objects(pending, relation)
+            related = []
+            for obj in group:
+                try:
+                    value = getattr(obj, relation)
+                except ObjectDoesNotExist:
+                    # A reverse one-to-one with no row
+                    continue
+                if hasattr(value, "all"):
+                    related.extend(value.all())
+                else:
+                    related.append(value)
+            self.register(related)
+
+        return getattr(instance, relation)
+
+
+def _is_cached(instance, relation):
+    descriptor = getattr(type(instance), relation)
+    if hasattr(descriptor, "is_cached"):
+        return descriptor.is_cached(instance)
+    # Reverse managers cache under their query name (``order`` for
+    # ``order_set``), which prefetch_related_objects does not check.
+    manager = getattr(instance, relation)
+    cache_name = getattr(manager, "prefetch_cache_name", None) or manager.field.remote_field.cache_name
+    return cache_name in getattr(instance, "_prefetched_objects_cache", {})
+
+
+def get_loader(info):
+    """Return the RelationLoader bound to the current request context."""
+    return context_loader(info.context)
+
+
+def context_loader(context):
+    if context is None:
+        return RelationLoader()
+    if isinstance(context, dict):
+        return context.setdefault("crm_loader", RelationLoader())
+
+    loader = getattr(context, "crm_loader", None)
+    if loader is None:
+        loader = RelationLoader()
+        context.crm_loader = loader
+    return loader
@@ -0,0 +1,68 @@
+import smtplib
+import threading
+from django.core.mail.backends import smtp
+
+_pool = threading.local()
+
+
+class PooledEmailBackend(smtp.EmailBackend):
+    """
+    SMTP backend that keeps its connection open between uses.
+
+    ``close()`` parks the connection in a per-thread pool instead of
+    quitting, and the next backend with the same server settings picks it
+    up (after a NOOP to check it is still alive). A Celery worker then
+    logs in to the SMTP server once, not once per task or batch.
+    """
+
+    def _key(self):
+        return (self.host, self.port, self.username, self.use_tls, self.use_ssl)
+
+    def open(self):
+        if self.connection is None:
+            connection = _connections().pop(self._key(), None)
+            if connection is not None and _is_alive(connection):
+                self.connection = connection
+                # True, so send_messages() calls close() and hands it back.
+                return True
+            if connection is not None:
+                connection.close()
+        return super().open()
+
+    def close(self):
+        if self.connection is None:
+            return
+        connection, self.connection = self.connection, None
+        displaced = _connections().get(self._key())
+        _connections()[self._key()] = connection
+        if displaced is not None and displaced is not connection:
+            _quit(displaced)
+
+
+def close_pooled_connections(**kwargs):
+    """Quit every pooled connection of this thread (e.g. on worker shutdown)."""
+    connections = _connections()
+    while connections:
+        _, connection = connections.popitem()
+        _quit(connection)
+
+
+def _connections():
+    connections = getattr(_pool, "connections", None)
+    if connections is None:
+        connections = _pool.connections = {}
+    return connections
+
+
+def _is_alive(connection):
+    try:
+        return connection.noop()[0] == 250
+    except (smtplib.SMTPException, OSError):
+        return False
+
+
+def _quit(connection):
+    try:
+        connection.quit()
+    except (smtplib.SMTPException, OSError):
+        connection.close()
@@ -0,0 +1,126 @@
+import json
+import os
+import platform
+from datetime import date
+from django import get_version
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils import timezone
+from crm import benchmarks
+from crm.datagen import generate
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the GraphQL benchmark suite in-process against seeded data in a throwaway test "
+        "database, write the results as JSON and fail on regressions against the baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--customers", type=int, default=2000)
+        parser.add_argument("--products", type=int, default=200)
+        parser.add_argument("--orders", type=int, default=20000)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--end", type=date.fromisoformat, default=date(2025, 12, 31),
+                            help="Last generated order day; fixed so runs see the same data.")
+        parser.add_argument("--iterations", type=int, default=20)
+        parser.add_argument("--warmup", type=int, default=2)
+        parser.add_argument("--only", action="append", help="Run only this scenario (repeatable).")
+        parser.add_argument("--current-db", action="store_true",
+                            help="Benchmark the configured database as it is (e.g. after generate_data) "
+                                 "instead of generating a test database. Mutations are rolled back.")
+        parser.add_argument("--output", default=str(settings.BASE_DIR / "benchmarks" / "results.json"))
+        parser.add_argument("--baseline", default=str(settings.BASE_DIR / "benchmarks" / "baseline.json"))
+        parser.add_argument("--update-baseline", action="store_true", help="Store these results as the baseline.")
+        parser.add_argument("--latency-tolerance", type=float, default=benchmarks.LATENCY_TOLERANCE)
+        parser.add_argument("--memory-tolerance", type=float, default=benchmarks.MEMORY_TOLERANCE)
+
+    def handle(self, *args, **options):
+        dataset = {key: options[key] for key in ("customers", "products", "orders", "seed")}
+        dataset["end"] = options["end"].isoformat()
+        if options["current_db"]:
+            dataset = {"database": str(connection.settings_dict["NAME"])}
+
+        def progress(name, result):
+            self.stdout.write(
+                f"{name:<24} p50 {result['p50_ms']:>9.2f} ms  p95 {result['p95_ms']:>9.2f} ms  "
+                f"{result['queries']:>4} queries  {result['peak_kb']:>9.1f} KB"
+            )
+
+        if options["current_db"]:
+            results = self._run(options, progress)
+        else:
+            setup_test_environment()
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                self.stdout.write("Generating data...")
+                generate(
+                    customers=options["customers"],
+                    products=options["products"],
+                    orders=options["orders"],
+                    seed=options["seed"],
+                    end=options["end"],
+                )
+                results = self._run(options, progress)
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+                teardown_test_environment()
+
+        report = {
+            "meta": {
+                "dataset": dataset,
+                "iterations": options["iterations"],
+                "database": connection.vendor,
+                "python": platform.python_version(),
+                "django": get_version(),
+                "recorded_at": timezone.now().isoformat(),
+            },
+            "results": results,
+        }
+        _write(options["output"], report)
+        self.stdout.write(f"Results written to {options['output']}")
+        if options["update_baseline"]:
+            _write(options["baseline"], report)
+            self.stdout.write(self.style.SUCCESS(f"Baseline updated: {options['baseline']}"))
+            return
+
+        try:
+            with open(options["baseline"], encoding="utf-8") as f:
+                baseline = json.load(f)
+        except FileNotFoundError:
+            self.stdout.write(self.style.WARNING("No baseline to compare with; pass --update-baseline to store one."))
+            return
+        if baseline["meta"]["dataset"] != dataset:
+            raise CommandError(
+                f"The baseline was recorded on a different dataset ({baseline['meta']['dataset']}); "
+                "run with the same options or pass --update-baseline."
+            )
+        regressions = benchmarks.compare(
+            results,
+            baseline["results"],
+            latency_tolerance=options["latency_tolerance"],
+            memory_tolerance=options["memory_tolerance"],
+        )
+        if regressions:
+            raise CommandError("Regressions against the baseline:\n  " + "\n  ".join(regressions))
+        self.stdout.write(self.style.SUCCESS("No regressions against the baseline"))
+
+    def _run(self, options, progress):
+        try:
+            return benchmarks.run(
+                iterations=options["iterations"],
+                warmup=options["warmup"],
+                only=options["only"],
+                progress=progress,
+            )
+        except (ValueError, benchmarks.GraphQLClientError) as exc:
+            raise CommandError(str(exc))
+
+
+def _write(path, report):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+        f.write("\n")
@@ -0,0 +1,46 @@
+import os
+from datetime import datetime
+from django.core.management.base import BaseCommand
+from crm.cleanup import delete_inactive_customers
+from crm.metrics import track_job
+
+
+class Command(BaseCommand):
+    help = "Delete customers with no orders created more than --days ago, in throttled batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=365, help="Minimum customer age in days.")
+        parser.add_argument("--batch-size", type=int, help="Customers per batch (CRM_CLEANUP_BATCH_SIZE).")
+        parser.add_argument("--pause", type=float, help="Seconds to sleep between batches (CRM_CLEANUP_PAUSE).")
+        parser.add_argument("--dry-run", action="store_true", help="Count matching customers without deleting.")
+
+    def handle(self, *args, **options):
+        dry_run = options["dry_run"]
+
+        def progress(batch_number, handled, total):
+            verb = "would delete" if dry_run else "deleted"
+            self.stdout.write(f"batch {batch_number}: {verb} {handled} ({total} so far)")
+
+        with track_job("clean_inactive_customers"):
+            total, resumed = delete_inactive_customers(
+                days=options["days"],
+                batch_size=options["batch_size"],
+                pause=options["pause"],
+                dry_run=dry_run,
+                progress=progress if options["verbosity"] >= 1 else None,
+            )
+
+        if dry_run:
+            message = f"Would delete {total} inactive customers"
+        else:
+            message = f"Deleted {total} inactive customers{' (resumed)' if resumed else ''}"
+            _log(message)
+        self.stdout.write(self.style.SUCCESS(message))
+
+
+def _log(message):
+    project_root = os.path.join(os.getcwd(), "crm", "cron_jobs")
+    os.makedirs(project_root, exist_ok=True)
+    log_path = os.path.join(project_root, "customer_cleanup_log.txt")
+    with open(log_path, "a", encoding="utf-8") as f:
+        f.write(f"{datetime.now()} - {message}\n")
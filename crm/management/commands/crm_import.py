@@ -0,0 +1,47 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from crm.importer import KINDS, import_file
+from crm.metrics import track_job
+
+
+class Command(BaseCommand):
+    help = "Import customers, products or orders from a CSV or NDJSON file (optionally .gz)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=KINDS)
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=("csv", "ndjson"), help="Defaults to the file extension.")
+        parser.add_argument("--batch-size", type=int, help="Rows per validated and written batch (CRM_IMPORT_BATCH_SIZE).")
+        parser.add_argument("--workers", type=int, help="Validation processes; 1 validates in this process.")
+        parser.add_argument("--rejects", help="Where to write bad rows (default: <path>.rejects.<ext>).")
+        parser.add_argument("--progress-every", type=float, default=5, help="Seconds between progress lines.")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"] or getattr(settings, "CRM_IMPORT_BATCH_SIZE", 2000)
+        if batch_size < 1:
+            raise CommandError("--batch-size must be a positive number.")
+        last = [time.monotonic()]
+
+        def progress(stats):
+            if time.monotonic() - last[0] >= options["progress_every"]:
+                last[0] = time.monotonic()
+                self.stdout.write(str(stats))
+
+        try:
+            with track_job("crm_import"):
+                stats = import_file(
+                    options["kind"],
+                    options["path"],
+                    fmt=options["format"],
+                    batch_size=batch_size,
+                    workers=options["workers"],
+                    rejects_path=options["rejects"],
+                    progress=progress if options["verbosity"] >= 1 else None,
+                )
+        except FileNotFoundError as exc:
+            raise CommandError(str(exc))
+
+        self.stdout.write(self.style.SUCCESS(f"Imported {options['kind']}: {stats}"))
+        if stats.rejected:
+            self.stdout.write(self.style.WARNING(f"Rejected rows were written to {stats.rejects_path}"))
@@ -0,0 +1,52 @@
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from crm.datagen import generate
+
+
+def count(value):
+    """Accept 1000, 1e6 or 1_000_000."""
+    try:
+        number = float(value.replace("_", ""))
+    except ValueError:
+        raise CommandError(f"Invalid count '{value}'.")
+    if number < 0 or number != int(number):
+        raise CommandError(f"Invalid count '{value}'.")
+    return int(number)
+
+
+class Command(BaseCommand):
+    help = "Add seeded synthetic customers, products and orders for load and benchmark work."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--customers", type=count, default=1000)
+        parser.add_argument("--products", type=count, default=100)
+        parser.add_argument("--orders", type=count, default=5000)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--days", type=int, default=730, help="Spread orders over this many days.")
+        parser.add_argument("--end", type=date.fromisoformat, help="Last order day (YYYY-MM-DD); defaults to today.")
+        parser.add_argument("--batch-size", type=int, default=5000, help="Rows per INSERT transaction.")
+
+    def handle(self, *args, **options):
+        reported = {}
+
+        def progress(what, done, total):
+            # About ten lines per table
+            step = max(total // 10, 1)
+            if done // step != reported.get(what) or done == total:
+                reported[what] = done // step
+                self.stdout.write(f"{what}: {done}/{total}")
+
+        generate(
+            customers=options["customers"],
+            products=options["products"],
+            orders=options["orders"],
+            seed=options["seed"],
+            days=options["days"],
+            end=options["end"],
+            batch_size=options["batch_size"],
+            progress=progress if options["verbosity"] >= 1 else None,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {options['customers']} customers, {options['products']} products "
+            f"and {options['orders']} orders (seed {options['seed']})"
+        ))
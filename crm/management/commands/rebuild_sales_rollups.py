@@ -0,0 +1,25 @@
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from crm.metrics import track_job
+from crm.rollups import DAY, rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute the daily, weekly and monthly sales rollups from orders."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--from", dest="start", type=date.fromisoformat, help="First day (YYYY-MM-DD); defaults to the first order.")
+        parser.add_argument("--to", dest="end", type=date.fromisoformat, help="Last day, inclusive; defaults to today.")
+
+    def handle(self, *args, **options):
+        start, end = options["start"], options["end"]
+        if start and end and start > end:
+            raise CommandError("--from must not be after --to.")
+
+        def progress(granularity, period, stop):
+            if granularity == DAY:
+                self.stdout.write(f"Days {period} to {stop - timedelta(days=1)} rebuilt")
+
+        with track_job("rebuild_sales_rollups"):
+            rebuild_rollups(start, end + timedelta(days=1) if end else None, progress=progress)
+        self.stdout.write(self.style.SUCCESS("Sales rollups rebuilt"))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from crm.customer_stats import reconcile_stats
+from crm.metrics import track_job
+
+
+class Command(BaseCommand):
+    help = "Recompute CustomerStats from orders, creating missing rows and fixing drifted ones."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="Customers per batch.")
+        parser.add_argument("--dry-run", action="store_true", help="Report differences without writing.")
+
+    def handle(self, *args, **options):
+        with track_job("reconcile_customer_stats"):
+            created, corrected = reconcile_stats(batch_size=options["batch_size"], dry_run=options["dry_run"])
+        verb = "Would create" if options["dry_run"] else "Created"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {created} and {'would correct' if options['dry_run'] else 'corrected'} {corrected} customer stats rows"))
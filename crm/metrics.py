@@ -0,0 +1,131 @@
+import os
+import time
+from contextlib import contextmanager
+from django.conf import settings
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+# With PROMETHEUS_MULTIPROC_DIR set (gunicorn workers, Celery workers),
+# every process writes its samples there and /metrics merges them.
+MULTIPROCESS = bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+GRAPHQL_OPERATION_SECONDS = Histogram(
+    "crm_graphql_operation_seconds",
+    "GraphQL operation latency.",
+    ["operation_type", "operation"],
+)
+GRAPHQL_FIELD_SECONDS = Histogram(
+    "crm_graphql_field_seconds",
+    "Time spent in root field resolvers.",
+    ["field"],
+)
+GRAPHQL_DB_QUERIES = Histogram(
+    "crm_graphql_db_queries",
+    "SQL queries issued per GraphQL operation.",
+    ["operation_type"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500),
+)
+GRAPHQL_MUTATIONS = Counter(
+    "crm_graphql_mutations_total",
+    "Mutations by outcome; error covers GraphQL errors and non-empty errors fields.",
+    ["mutation", "outcome"],
+)
+JOB_SECONDS = Histogram(
+    "crm_job_duration_seconds",
+    "Duration of scheduled jobs and Celery tasks.",
+    ["job"],
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600),
+)
+JOB_RUNS = Counter(
+    "crm_job_runs_total",
+    "Scheduled job and Celery task runs by outcome.",
+    ["job", "outcome"],
+)
+JOB_ITEMS = Counter(
+    "crm_job_items_total",
+    "Rows handled by batch jobs, by what was done to them.",
+    ["job", "action"],
+)
+JOB_LAST_SUCCESS = Gauge(
+    "crm_job_last_success_timestamp_seconds",
+    "Unix time of the last successful run.",
+    ["job"],
+    multiprocess_mode="max",
+)
+
+
+def operation_label(operation_name):
+    """
+    The operation label for ``operation_name``. Clients choose operation
+    names, so only those in CRM_METRICS_OPERATIONS get their own series;
+    the rest share "other" and unnamed operations "anonymous".
+    """
+    if not operation_name:
+        return "anonymous"
+    if operation_name in getattr(settings, "CRM_METRICS_OPERATIONS", ()):
+        return operation_name
+    return "other"
+
+
+def record_operation(operation_type, operation_name, duration, trace=None, data=None, errors=None, fields=None):
+    """
+    Record one executed GraphQL operation. ``fields`` maps its root
+    response keys (aliases, if the client set them) to field names.
+    """
+    operation_type = operation_type or "unknown"
+    GRAPHQL_OPERATION_SECONDS.labels(operation_type, operation_label(operation_name)).observe(duration)
+    if trace is not None:
+        GRAPHQL_DB_QUERIES.labels(operation_type).observe(trace.query_count)
+        for path, stats in list(trace.resolvers.items()):
+            if "." not in path:
+                GRAPHQL_FIELD_SECONDS.labels((fields or {}).get(path, "other")).observe(stats["ms"] / 1000)
+    if operation_type == "mutation":
+        for key, payload in (data or {}).items():
+            failed = bool(errors) or payload is None or bool(
+                isinstance(payload, dict) and payload.get("errors")
+            )
+            GRAPHQL_MUTATIONS.labels((fields or {}).get(key, "other"), "error" if failed else "ok").inc()
+
+
+class JobRun:
+    def __init__(self):
+        self.failed = False
+
+    def fail(self):
+        """Mark the run failed when the job handles its own exception."""
+        self.failed = True
+
+
+@contextmanager
+def track_job(name):
+    """Time a scheduled job and count its outcome."""
+    run = JobRun()
+    start = time.perf_counter()
+    try:
+        yield run
+    except BaseException:
+        run.failed = True
+        raise
+    finally:
+        JOB_SECONDS.labels(name).observe(time.perf_counter() - start)
+        JOB_RUNS.labels(name, "error" if run.failed else "ok").inc()
+        if not run.failed:
+            JOB_LAST_SUCCESS.labels(name).set(time.time())
+
+
+def render_metrics():
+    """Return (body, content type) for the /metrics endpoint."""
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
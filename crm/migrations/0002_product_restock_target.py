@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 06:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='restock_target',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.8 on 2026-10-18 06:40
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, Max, Sum
+
+
+def backfill_stats(apps, schema_editor):
+    Customer = apps.get_model('crm', 'Customer')
+    CustomerStats = apps.get_model('crm', 'CustomerStats')
+    Order = apps.get_model('crm', 'Order')
+    position = 0
+    while True:
+        ids = list(Customer.objects.filter(pk__gt=position).order_by('pk').values_list('pk', flat=True)[:1000])
+        if not ids:
+            break
+        position = ids[-1]
+        totals = {
+            row['customer_id']: row
+            for row in Order.objects.filter(customer_id__in=ids)
+            .values('customer_id')
+            .annotate(order_count=Count('id'), lifetime_value=Sum('total_amount'), last_order_date=Max('order_date'))
+            .order_by()
+        }
+        CustomerStats.objects.bulk_create([
+            CustomerStats(
+                customer_id=pk,
+                order_count=totals.get(pk, {}).get('order_count', 0),
+                lifetime_value=totals.get(pk, {}).get('lifetime_value') or Decimal('0.00'),
+                last_order_date=totals.get(pk, {}).get('last_order_date'),
+            )
+            for pk in ids
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0004_jobcheckpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerStats',
+            fields=[
+                ('customer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='crm.customer')),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('lifetime_value', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('last_order_date', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['lifetime_value', 'customer'], name='crm_stats_value_idx'), models.Index(fields=['order_count', 'customer'], name='crm_stats_count_idx'), models.Index(fields=['last_order_date', 'customer'], name='crm_stats_last_order_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_stats, migrations.RunPython.noop),
+    ]
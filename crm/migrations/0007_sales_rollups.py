@@ -0,0 +1,62 @@
+# Generated by Django 5.2.8 on 2026-10-18 06:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def mark_order_days(apps, schema_editor):
+    # Queue every day with orders; the next refresh_sales_rollups builds them
+    Order = apps.get_model('crm', 'Order')
+    DirtySalesDay = apps.get_model('crm', 'DirtySalesDay')
+    days = Order.objects.annotate(day=TruncDate('order_date')).values_list('day', flat=True).distinct().order_by()
+    now = timezone.now()
+    DirtySalesDay.objects.bulk_create([DirtySalesDay(day=day, marked_at=now) for day in days], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0006_orderitem'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DirtySalesDay',
+            fields=[
+                ('day', models.DateField(primary_key=True, serialize=False)),
+                ('marked_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('day', 'Day'), ('week', 'Week'), ('month', 'Month')], max_length=5)),
+                ('period', models.DateField()),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('customer_count', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'unique_together': {('granularity', 'period')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductSalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales_rollups', to='crm.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', 'day'], name='crm_product_sales_day_idx')],
+                'unique_together': {('day', 'product')},
+            },
+        ),
+        migrations.RunPython(mark_order_days, migrations.RunPython.noop),
+    ]
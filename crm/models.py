@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 class Customer(models.Model):
     name = models.CharField(max_length=100)
@@ -6,6 +7,14 @@ class Customer(models.Model):
     phone = models.CharField(max_length=20, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # createdAt filters/sorts and the inactive-customer cleanup
+            models.Index(fields=['created_at', 'id'], name='crm_customer_created_id_idx'),
+            # phonePattern (startswith); the opclass is applied on PostgreSQL only
+            models.Index(fields=['phone'], name='crm_customer_phone_idx', opclasses=['varchar_pattern_ops']),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -14,6 +23,13 @@ class Product(models.Model):
     name = models.CharField(max_length=100)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     stock = models.PositiveIntegerField(default=0)
+    restock_target = models.PositiveIntegerField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['stock', 'id'], name='crm_product_stock_id_idx'),
+            models.Index(fields=['price', 'id'], name='crm_product_price_id_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -21,9 +37,159 @@ class Product(models.Model):
 
 class Order(models.Model):
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='orders')
-    products = models.ManyToManyField(Product)
+    products = models.ManyToManyField(Product, through='OrderItem')
     total_amount = models.DecimalField(max_digits=10, decimal_places=2)
-    order_date = models.DateTimeField(auto_now_add=True)
+    order_date = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # orderDate range filters and keyset pages ordered by order_date
+            models.Index(fields=['order_date', 'id'], name='crm_order_date_id_idx'),
+            # a customer's orders by date
+            models.Index(fields=['customer', 'order_date'], name='crm_order_customer_date_idx'),
+            models.Index(fields=['total_amount', 'id'], name='crm_order_total_id_idx'),
+        ]
 
     def __str__(self):
         return f"Order {self.id} for {self.customer.name}"
+
+
+class OrderItem(models.Model):
+    """
+    One product line of an order, with the price it was sold at, so
+    totals and revenue reports never depend on the current Product.price.
+    """
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='order_items')
+    quantity = models.PositiveIntegerField(default=1)
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2)
+
+    class Meta:
+        unique_together = [('order', 'product')]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} in order {self.order_id}"
+
+
+class CustomerStats(models.Model):
+    """
+    Per-customer order totals, kept up to date as orders are created and
+    deleted (see crm.customer_stats) so listing, filtering and sorting
+    customers by them never aggregates Order.
+    """
+    customer = models.OneToOneField(Customer, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    order_count = models.PositiveIntegerField(default=0)
+    lifetime_value = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    last_order_date = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            # top customers by value or orders; inactive customers
+            models.Index(fields=['lifetime_value', 'customer'], name='crm_stats_value_idx'),
+            models.Index(fields=['order_count', 'customer'], name='crm_stats_count_idx'),
+            models.Index(fields=['last_order_date', 'customer'], name='crm_stats_last_order_idx'),
+        ]
+
+    def __str__(self):
+        return f"Stats for customer {self.customer_id}"
+
+
+class SalesRollup(models.Model):
+    """
+    Order totals for one day, week (starting Monday) or month, refreshed
+    from Order by crm.rollups. Weeks and months are stored rather than
+    summed from days because distinct customers do not add up.
+    """
+    DAY = 'day'
+    WEEK = 'week'
+    MONTH = 'month'
+    GRANULARITIES = [(DAY, 'Day'), (WEEK, 'Week'), (MONTH, 'Month')]
+
+    granularity = models.CharField(max_length=5, choices=GRANULARITIES)
+    period = models.DateField()
+    order_count = models.PositiveIntegerField(default=0)
+    customer_count = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = [('granularity', 'period')]
+
+    def __str__(self):
+        return f"{self.granularity} {self.period}"
+
+
+class ProductSalesRollup(models.Model):
+    """Units, revenue and orders of one product on one day, from OrderItem."""
+    day = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='sales_rollups')
+    units = models.PositiveIntegerField(default=0)
+    order_count = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = [('day', 'product')]
+        indexes = [
+            models.Index(fields=['product', 'day'], name='crm_product_sales_day_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} on {self.day}"
+
+
+class DirtySalesDay(models.Model):
+    """A day whose rollups are stale; marked on order writes, cleared on refresh."""
+    day = models.DateField(primary_key=True)
+    marked_at = models.DateTimeField()
+
+    def __str__(self):
+        return str(self.day)
+
+
+class JobCheckpoint(models.Model):
+    """
+    Progress of the latest run of a resumable job: the window it covers
+    and the last key it finished, so a crashed run picks up after it.
+    """
+    name = models.CharField(max_length=100, unique=True)
+    window_start = models.DateTimeField()
+    window_end = models.DateTimeField()
+    position = models.BigIntegerField(default=0)
+    processed = models.PositiveIntegerField(default=0)
+    started_at = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"{self.name} at {self.position}"
+
+    @classmethod
+    def start(cls, name, window_start, window_end):
+        """
+        Return (checkpoint, resumed): the unfinished run of ``name`` if
+        there is one (keeping its window), else a fresh run over the given
+        window starting at position 0.
+        """
+        checkpoint = cls.objects.filter(name=name, finished_at__isnull=True).first()
+        if checkpoint is not None:
+            return checkpoint, True
+        checkpoint, _ = cls.objects.update_or_create(
+            name=name,
+            defaults={
+                "window_start": window_start,
+                "window_end": window_end,
+                "position": 0,
+                "processed": 0,
+                "started_at": timezone.now(),
+                "finished_at": None,
+            },
+        )
+        return checkpoint, False
+
+    def advance(self, position, processed):
+        self.position = position
+        self.processed += processed
+        self.save(update_fields=["position", "processed", "updated_at"])
+
+    def finish(self):
+        self.finished_at = timezone.now()
+        self.save(update_fields=["finished_at", "updated_at"])
@@ -0,0 +1,124 @@
+from django.db.models import Prefetch
+from graphene.utils.str_converters import to_snake_case
+from graphql.language import FieldNode, FragmentSpreadNode, InlineFragmentNode
+
+
+# Fields computed from model columns rather than mapped to one, by model
+# label: {field name: columns its resolver reads}
+COMPUTED_FIELDS = {
+    "crm.OrderItem": {"line_total": ("quantity", "unit_price")},
+}
+
+
+def optimize_queryset(queryset, info):
+    """
+    Narrow a connection queryset to the fields the client selected.
+
+    Walks ``info.field_nodes`` (fragments included) and applies ``only()``
+    for scalar columns and the columns of COMPUTED_FIELDS,
+    ``select_related()`` for foreign keys and ``Prefetch()`` objects with
+    their own narrowed querysets for nested connections. Relations that
+    are not selected are never joined or prefetched.
+    """
+    fields = _node_fields(info.field_nodes, info)
+    only, select, prefetch = _plan(queryset.model, fields, info)
+    queryset = queryset.only(*only)
+    if select:
+        queryset = queryset.select_related(*select)
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    return queryset
+
+
+def _model_fields(model):
+    """Map attribute names as graphene-django exposes them to model fields."""
+    fields = {}
+    for field in model._meta.get_fields():
+        if field.auto_created and not field.concrete:
+            fields[field.get_accessor_name()] = field
+        else:
+            fields[field.name] = field
+    return fields
+
+
+def _collect(selection_set, info, fields=None):
+    """Group the FieldNodes of a selection set by name, expanding fragments."""
+    if fields is None:
+        fields = {}
+    if selection_set is None:
+        return fields
+    for selection in selection_set.selections:
+        if isinstance(selection, FieldNode):
+            fields.setdefault(selection.name.value, []).append(selection)
+        elif isinstance(selection, InlineFragmentNode):
+            _collect(selection.selection_set, info, fields)
+        elif isinstance(selection, FragmentSpreadNode):
+            fragment = info.fragments.get(selection.name.value)
+            if fragment is not None:
+                _collect(fragment.selection_set, info, fields)
+    return fields
+
+
+def _node_fields(connection_nodes, info):
+    """Return the fields selected under ``edges { node { ... } }``."""
+    node_fields = {}
+    for connection in connection_nodes:
+        for edges in _collect(connection.selection_set, info).get("edges", []):
+            for node in _collect(edges.selection_set, info).get("node", []):
+                _collect(node.selection_set, info, node_fields)
+    return node_fields
+
+
+def _object_fields(object_nodes, info):
+    fields = {}
+    for node in object_nodes:
+        _collect(node.selection_set, info, fields)
+    return fields
+
+
+def _plan(model, fields, info, prefix=""):
+    """Return (only, select_related, prefetch) lookups for a model selection."""
+    model_fields = _model_fields(model)
+    computed = COMPUTED_FIELDS.get(model._meta.label, {})
+    only = [prefix + model._meta.pk.name]
+    select = []
+    prefetch = []
+
+    for name, nodes in fields.items():
+        field = model_fields.get(to_snake_case(name))
+        if field is None:
+            only.extend(prefix + column for column in computed.get(to_snake_case(name), ()))
+            continue
+
+        if field.many_to_many or field.one_to_many:
+            related = field.related_model
+            related_only, related_select, related_prefetch = _plan(
+                related, _node_fields(nodes, info), info
+            )
+            if field.one_to_many:
+                # The reverse FK column is needed to attach rows to parents.
+                related_only.append(field.field.name)
+            queryset = related._default_manager.only(*related_only)
+            if related_select:
+                queryset = queryset.select_related(*related_select)
+            if related_prefetch:
+                queryset = queryset.prefetch_related(*related_prefetch)
+            lookup = field.get_accessor_name() if field.auto_created else field.name
+            prefetch.append(Prefetch(prefix + lookup, queryset=queryset))
+
+        elif field.many_to_one or field.one_to_one:
+            path = prefix + field.name
+            if field.concrete:
+                only.append(path)
+            select.append(path)
+            nested_only, nested_select, nested_prefetch = _plan(
+                field.related_model, _object_fields(nodes, info), info, prefix=path + "__"
+            )
+            only.extend(nested_only)
+            select.extend(nested_select)
+            prefetch.extend(nested_prefetch)
+
+        elif field.concrete:
+            only.append(prefix + field.name)
+
+    return only, select, prefetch
@@ -0,0 +1,60 @@
+from decimal import Decimal
+from django.db.models import DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from .customer_stats import add_revenue
+from .models import Order, OrderItem
+from .response_cache import invalidate
+
+MONEY = DecimalField(max_digits=12, decimal_places=2)
+
+
+def line_total(prefix=""):
+    """quantity * unit_price of an OrderItem (``prefix`` to reach it through a relation)."""
+    return ExpressionWrapper(F(prefix + "quantity") * F(prefix + "unit_price"), output_field=MONEY)
+
+
+def create_items(lines, prices, batch_size=None):
+    """
+    Insert the OrderItems for ``lines``, a list of (order, {product pk:
+    quantity}), pricing every line at ``prices[product pk]``, the price
+    it is being sold at now.
+    """
+    return OrderItem.objects.bulk_create(
+        [
+            OrderItem(order_id=order.pk, product_id=pid, quantity=quantity, unit_price=prices[pid])
+            for order, quantities in lines
+            for pid, quantity in quantities.items()
+        ],
+        batch_size=batch_size,
+    )
+
+
+def apply_totals(orders, stats=True):
+    """
+    Set total_amount of ``orders`` to the sum of their lines, computed by
+    the database in one UPDATE, and move the difference into the
+    customers' lifetime value (unless ``stats`` is False, for callers that
+    recompute the stats themselves).
+    """
+    if not orders:
+        return
+    line_sum = (
+        OrderItem.objects.filter(order=OuterRef("pk"))
+        .values("order")
+        .annotate(total=Sum(line_total()))
+        .values("total")
+    )
+    ids = [order.pk for order in orders]
+    Order.objects.filter(pk__in=ids).update(
+        total_amount=Coalesce(Subquery(line_sum, output_field=MONEY), Value(Decimal("0.00")), output_field=MONEY)
+    )
+    totals = dict(Order.objects.filter(pk__in=ids).values_list("pk", "total_amount"))
+    invalidate(Order)
+
+    deltas = {}
+    for order in orders:
+        total = totals[order.pk]
+        deltas[order.customer_id] = deltas.get(order.customer_id, Decimal("0.00")) + total - order.total_amount
+        order.total_amount = total
+    if stats:
+        add_revenue(deltas)
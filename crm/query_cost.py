@@ -0,0 +1,201 @@
+import hashlib
+import math
+import threading
+import time
+from django.conf import settings
+from django.core.cache import cache
+from graphene_django.settings import graphene_settings
+from graphql import GraphQLError, get_named_type, is_composite_type
+from graphql.execution.values import get_argument_values
+from graphql.language import FieldNode, FragmentSpreadNode, InlineFragmentNode
+
+# Relay plumbing is neither a fetch nor a level of nesting
+TRANSPARENT_FIELDS = {"edges", "node", "pageInfo"}
+
+BUDGET_PREFIX = "graphql:budget:"
+
+
+class QueryCost:
+    """Static cost and depth of one operation."""
+
+    def __init__(self, cost, depth):
+        self.cost = cost
+        self.depth = depth
+
+
+def analyze(schema, document, operation_ast, variables=None):
+    """
+    Compute the cost and depth of ``operation_ast`` before executing it.
+
+    Every object or connection field costs one fetch for each parent row it
+    is resolved on, and a connection multiplies the rows below it by its
+    ``first``/``last`` (RELAY_CONNECTION_MAX_LIMIT when neither is given).
+    ``allCustomers(first: 100) { orders(first: 100) { products } }`` is
+    therefore 1 + 100 + 100 * 100. Scalars and introspection are free.
+    """
+    fragments = {
+        definition.name.value: definition
+        for definition in document.definitions
+        if definition.kind == "fragment_definition"
+    }
+    root_type = schema.get_root_type(operation_ast.operation)
+    cost, depth = _walk(schema, fragments, variables or {}, operation_ast.selection_set, root_type, 1, ())
+    return QueryCost(cost, depth)
+
+
+def _walk(schema, fragments, variables, selection_set, parent_type, rows, seen):
+    cost = 0
+    depth = 0
+    for node, node_type in _fields(schema, fragments, selection_set, parent_type, seen):
+        name = node.name.value
+        if name.startswith("__"):
+            continue
+        field = node_type.fields.get(name)
+        if field is None:
+            continue
+        named_type = get_named_type(field.type)
+        if not is_composite_type(named_type):
+            depth = max(depth, 1)
+            continue
+
+        field_rows = rows * _page_size(field, node, variables, named_type)
+        if name not in TRANSPARENT_FIELDS:
+            cost += rows
+        child_cost, child_depth = _walk(
+            schema, fragments, variables, node.selection_set, named_type, field_rows, seen
+        )
+        cost += child_cost
+        depth = max(depth, child_depth + (0 if name in TRANSPARENT_FIELDS else 1))
+    return cost, depth
+
+
+def _fields(schema, fragments, selection_set, parent_type, seen):
+    """Yield (FieldNode, parent type) pairs, expanding fragments."""
+    if selection_set is None:
+        return
+    for selection in selection_set.selections:
+        if isinstance(selection, FieldNode):
+            yield selection, parent_type
+        elif isinstance(selection, InlineFragmentNode):
+            fragment_type = parent_type
+            if selection.type_condition is not None:
+                fragment_type = schema.get_type(selection.type_condition.name.value) or parent_type
+            yield from _fields(schema, fragments, selection.selection_set, fragment_type, seen)
+        elif isinstance(selection, FragmentSpreadNode):
+            name = selection.name.value
+            fragment = fragments.get(name)
+            # Cyclic spreads are rejected by validation; never recurse forever.
+            if fragment is None or name in seen:
+                continue
+            fragment_type = schema.get_type(fragment.type_condition.name.value) or parent_type
+            yield from _fields(schema, fragments, fragment.selection_set, fragment_type, seen + (name,))
+
+
+def _page_size(field, node, variables, named_type):
+    try:
+        args = get_argument_values(field, node, variables)
+    except GraphQLError:
+        args = {}
+    size = args.get("first") if args.get("first") is not None else args.get("last")
+    if size is not None:
+        return max(size, 0)
+    if "edges" in getattr(named_type, "fields", {}) and "pageInfo" in named_type.fields:
+        return graphene_settings.RELAY_CONNECTION_MAX_LIMIT or 1
+    return 1
+
+
+def check_limits(query_cost):
+    """Raise a GraphQLError if the operation is too deep or too costly."""
+    max_depth = getattr(settings, "CRM_QUERY_MAX_DEPTH", None)
+    if max_depth is not None and query_cost.depth > max_depth:
+        raise GraphQLError(
+            f"Query depth {query_cost.depth} exceeds the maximum of {max_depth}.",
+            extensions={
+                "code": "QUERY_TOO_DEEP",
+                "depth": query_cost.depth,
+                "maxDepth": max_depth,
+                "cost": query_cost.cost,
+            },
+        )
+    max_cost = getattr(settings, "CRM_QUERY_MAX_COST", None)
+    if max_cost is not None and query_cost.cost > max_cost:
+        raise GraphQLError(
+            f"Query cost {query_cost.cost} exceeds the maximum of {max_cost}.",
+            extensions={
+                "code": "QUERY_TOO_COSTLY",
+                "cost": query_cost.cost,
+                "maxCost": max_cost,
+                "depth": query_cost.depth,
+            },
+        )
+
+
+class TokenBucket:
+    """
+    Per-client query budget: ``capacity`` points, refilled at ``rate``
+    points per second, stored in Django's cache so every worker process
+    draws from the same bucket. Reads and writes are not atomic across
+    processes, so concurrent requests can overspend slightly.
+    """
+
+    _lock = threading.Lock()
+
+    def __init__(self, client, capacity, rate):
+        self.key = BUDGET_PREFIX + client
+        self.capacity = capacity
+        self.rate = rate
+
+    def consume(self, cost):
+        """Take ``cost`` points, or raise a GraphQLError saying when to retry."""
+        with self._lock:
+            now = time.time()
+            tokens, updated = cache.get(self.key) or (self.capacity, now)
+            tokens = min(self.capacity, tokens + (now - updated) * self.rate)
+            if cost > tokens:
+                cache.set(self.key, (tokens, now), self._ttl())
+                retry_after = math.ceil((cost - tokens) / self.rate) if self.rate else None
+                raise GraphQLError(
+                    f"Query cost {cost} exceeds the remaining budget of {int(tokens)}.",
+                    extensions={
+                        "code": "BUDGET_EXCEEDED",
+                        "cost": cost,
+                        "remaining": int(tokens),
+                        "capacity": self.capacity,
+                        "retryAfter": retry_after,
+                    },
+                )
+            cache.set(self.key, (tokens - cost, now), self._ttl())
+            return tokens - cost
+
+    def _ttl(self):
+        # A bucket left alone long enough is full again; let it expire.
+        return math.ceil(self.capacity / self.rate) + 1 if self.rate else None
+
+
+def client_budget(request):
+    """
+    The TokenBucket for the caller, or None when budgets are off.
+
+    CRM_QUERY_BUDGETS maps API keys (sent as X-API-Key) to
+    {"capacity", "rate"}; everyone else gets the "default" budget per
+    user, or per address when anonymous.
+    """
+    budgets = getattr(settings, "CRM_QUERY_BUDGETS", None)
+    if not budgets:
+        return None
+    api_key = request.headers.get("X-API-Key")
+    user = getattr(request, "user", None)
+    # Unknown keys share the caller's default bucket, so rotating keys
+    # cannot mint fresh budgets.
+    if api_key and api_key != "default" and api_key in budgets:
+        budget = budgets[api_key]
+        client = "key:" + hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+    else:
+        budget = budgets.get("default")
+        if user is not None and user.is_authenticated:
+            client = f"user:{user.pk}"
+        else:
+            client = f"ip:{request.META.get('REMOTE_ADDR', '')}"
+    if not budget:
+        return None
+    return TokenBucket(client, budget["capacity"], budget["rate"])
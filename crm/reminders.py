@@ -0,0 +1,74 @@
+import os
+from datetime import timedelta
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import Count, Max
+from django.utils import timezone
+from .models import JobCheckpoint, Order
+
+CHECKPOINT_NAME = "order_reminders"
+
+
+def send_order_reminders(chunk_size=None, days=7):
+    """
+    Email every customer who ordered in the last ``days`` days, once.
+
+    Customers are read in pages of ``chunk_size`` (CRM_REMINDER_BATCH_SIZE),
+    keyset-paginated on customer id with their orders aggregated in SQL,
+    so memory is bounded by one page however many orders there are. Each
+    page goes out over one SMTP connection and then advances the
+    JobCheckpoint; a run that crashes resumes from the last finished
+    page over the same window. A page interrupted mid-send is sent
+    again, so delivery is at-least-once.
+
+    Returns (customers emailed, whether an interrupted run was resumed).
+    """
+    chunk_size = chunk_size or getattr(settings, "CRM_REMINDER_BATCH_SIZE", 200)
+    now = timezone.now()
+    checkpoint, resumed = JobCheckpoint.start(CHECKPOINT_NAME, now - timedelta(days=days), now)
+
+    with get_connection() as connection:
+        while True:
+            page = list(
+                Order.objects.filter(
+                    order_date__gte=checkpoint.window_start,
+                    order_date__lt=checkpoint.window_end,
+                    customer_id__gt=checkpoint.position,
+                )
+                .values("customer_id", "customer__name", "customer__email")
+                .annotate(order_count=Count("id"), last_order=Max("order_date"))
+                .order_by("customer_id")[:chunk_size]
+            )
+            if not page:
+                break
+            connection.send_messages([_reminder(row) for row in page])
+            checkpoint.advance(page[-1]["customer_id"], len(page))
+
+    checkpoint.finish()
+    _log(checkpoint, resumed)
+    return checkpoint.processed, resumed
+
+
+def _reminder(row):
+    orders = row["order_count"]
+    return EmailMessage(
+        subject="Thanks for your recent order" + ("s" if orders > 1 else ""),
+        body=(
+            f"Hi {row['customer__name']},\n\n"
+            f"You placed {orders} order{'s' if orders > 1 else ''} with us this week, "
+            f"most recently on {row['last_order']:%Y-%m-%d}.\n"
+        ),
+        to=[row["customer__email"]],
+    )
+
+
+def _log(checkpoint, resumed):
+    project_root = os.path.join(os.getcwd(), "crm", "cron_jobs")
+    os.makedirs(project_root, exist_ok=True)
+    log_path = os.path.join(project_root, "order_reminders_log.txt")
+    with open(log_path, "a", encoding="utf-8") as f:
+        f.write(
+            f"\n{timezone.now()} - Sent reminders to {checkpoint.processed} customers "
+            f"with orders since {checkpoint.window_start:%Y-%m-%d %H:%M}"
+            f"{' (resumed)' if resumed else ''}\n"
+        )
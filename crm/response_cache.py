@@ -0,0 +1,174 @@
+import hashlib
+import json
+import threading
+import time
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from graphene.relay import Connection, PageInfo
+from graphene_django import DjangoObjectType
+from graphql import OperationType, TypeInfo, TypeInfoVisitor, Visitor, get_named_type, print_ast, visit
+from .models import Customer, Product, Order, OrderItem
+
+# Models whose writes invalidate cached responses
+TAGGED_MODELS = (Customer, Product, Order)
+
+TAG_PREFIX = "graphql:tag:"
+RESPONSE_PREFIX = "graphql:response:"
+
+
+class ResponseCacheStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def incr(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "invalidations": self.invalidations}
+
+
+response_cache_stats = ResponseCacheStats()
+
+
+def _cache():
+    return caches[getattr(settings, "CRM_RESPONSE_CACHE_ALIAS", "default")]
+
+
+def _tag(model):
+    return TAG_PREFIX + model._meta.label_lower
+
+
+class ResponseCache:
+    """
+    Opt-in cache of query results, keyed on the normalised document, the
+    variables, the operation name and the user.
+
+    Only queries whose root fields all appear in CRM_RESPONSE_CACHE_FIELDS
+    ({field name: ttl seconds}) are cached, for the shortest of their TTLs.
+    Each entry is tagged with the models its selection can reach; the
+    key embeds the current version of every tag, so bumping a model's
+    version (see ``invalidate``) orphans only the entries that read it.
+    """
+
+    def __init__(self, schema):
+        self.schema = schema
+
+    def lookup(self, document, operation_ast, variables, operation_name, user):
+        """Return (key, ttl, cached data or None); key is None if uncacheable."""
+        ttl = self.ttl(operation_ast)
+        if ttl is None:
+            return None, None, None
+        tags = sorted(_tag(model) for model in self.models(document, operation_ast))
+        cache = _cache()
+        versions = cache.get_many(tags)
+        # A fresh base version, so entries from before an eviction of the
+        # tag can never match again.
+        missing = {tag: time.time_ns() for tag in tags if tag not in versions}
+        if missing:
+            cache.set_many(missing, None)
+            versions.update(missing)
+
+        payload = json.dumps(
+            [
+                print_ast(document),
+                operation_name,
+                variables or {},
+                _user_key(user),
+                [(tag, versions[tag]) for tag in tags],
+            ],
+            sort_keys=True,
+            default=str,
+        )
+        key = RESPONSE_PREFIX + hashlib.sha256(payload.encode("utf-8")).hexdigest()
+        data = cache.get(key)
+        response_cache_stats.incr("misses" if data is None else "hits")
+        return key, ttl, data
+
+    def store(self, key, ttl, data):
+        _cache().set(key, data, ttl)
+
+    def ttl(self, operation_ast):
+        if operation_ast is None or operation_ast.operation != OperationType.QUERY:
+            return None
+        ttls = getattr(settings, "CRM_RESPONSE_CACHE_FIELDS", {})
+        fields = [
+            selection.name.value
+            for selection in operation_ast.selection_set.selections
+            if hasattr(selection, "name")
+        ]
+        # Fragments at the root are rare; treat them as uncacheable.
+        if not fields or len(fields) != len(operation_ast.selection_set.selections):
+            return None
+        if any(field not in ttls and field != "__typename" for field in fields):
+            return None
+        return min((ttls[field] for field in fields if field in ttls), default=None)
+
+    def models(self, document, operation_ast):
+        """Models reachable from the operation's selection (fragments included)."""
+        type_info = TypeInfo(self.schema.graphql_schema)
+        collector = _ModelCollector(type_info)
+        visit(document, TypeInfoVisitor(type_info, collector))
+        return collector.models & set(TAGGED_MODELS) or set(TAGGED_MODELS)
+
+
+class _ModelCollector(Visitor):
+    def __init__(self, type_info):
+        super().__init__()
+        self.type_info = type_info
+        self.models = set()
+
+    def enter_field(self, node, *args):
+        named = get_named_type(self.type_info.get_type())
+        graphene_type = getattr(named, "graphene_type", None)
+        if not isinstance(graphene_type, type):
+            return
+        if issubclass(graphene_type, DjangoObjectType):
+            self.models.add(graphene_type._meta.model)
+        elif hasattr(named, "fields") and not _is_relay_type(graphene_type):
+            # Computed object types (e.g. orderStats) may read anything.
+            self.models.update(TAGGED_MODELS)
+
+
+def _is_relay_type(graphene_type):
+    """Connections, their edges and PageInfo only wrap the node type."""
+    if issubclass(graphene_type, (Connection, PageInfo)):
+        return True
+    fields = getattr(getattr(graphene_type, "_meta", None), "fields", None) or {}
+    return set(fields) == {"node", "cursor"}
+
+
+def invalidate(*models):
+    """Bump the cache version of ``models`` once the transaction commits."""
+    def bump():
+        cache = _cache()
+        for model in models:
+            tag = _tag(model)
+            try:
+                cache.incr(tag)
+            except ValueError:
+                cache.set(tag, time.time_ns(), None)
+        response_cache_stats.incr("invalidations")
+
+    transaction.on_commit(bump)
+
+
+def invalidate_on_save(sender, **kwargs):
+    """post_save/post_delete/m2m_changed receiver."""
+    if not kwargs.get("action", "post_").startswith("post_"):
+        return
+    if sender is OrderItem:
+        invalidate(Order, Product)
+    else:
+        invalidate(sender)
+
+
+def _user_key(user):
+    if user is None or not getattr(user, "is_authenticated", False):
+        return None
+    return user.pk
@@ -0,0 +1,233 @@
+import datetime
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Count, DateField, Sum
+from django.db.models.functions import TruncDate, TruncMonth, TruncWeek
+from django.utils import timezone
+from graphql import GraphQLError
+from .models import DirtySalesDay, Order, OrderItem, ProductSalesRollup, SalesRollup
+from .orders import line_total
+from .response_cache import invalidate
+
+DAY, WEEK, MONTH = SalesRollup.DAY, SalesRollup.WEEK, SalesRollup.MONTH
+
+TRUNCATE = {DAY: TruncDate, WEEK: TruncWeek, MONTH: TruncMonth}
+
+# Ten years of days
+MAX_BUCKETS = 3660
+
+
+def period_start(day, granularity):
+    """The first day of the day, week (Monday) or month containing ``day``."""
+    if granularity == WEEK:
+        return day - datetime.timedelta(days=day.weekday())
+    if granularity == MONTH:
+        return day.replace(day=1)
+    return day
+
+
+def next_period(start, granularity):
+    if granularity == WEEK:
+        return start + datetime.timedelta(days=7)
+    if granularity == MONTH:
+        return (start.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+    return start + datetime.timedelta(days=1)
+
+
+def _bounds(start, end):
+    """Aware datetimes for local midnight of ``start`` and ``end``."""
+    tz = timezone.get_current_timezone()
+    return tuple(
+        timezone.make_aware(datetime.datetime.combine(day, datetime.time.min), tz) for day in (start, end)
+    )
+
+
+def _money(value):
+    return Decimal(value or 0).quantize(Decimal("0.01"))
+
+
+def mark_dirty(days):
+    """
+    Queue ``days`` for the next refresh_rollups(), once the current
+    transaction commits: a refresh already running then either sees the
+    new orders or leaves the newer mark for the next run.
+    """
+    days = set(days)
+    if not days:
+        return
+
+    def mark():
+        now = timezone.now()
+        DirtySalesDay.objects.bulk_create(
+            [DirtySalesDay(day=day, marked_at=now) for day in days],
+            update_conflicts=True,
+            unique_fields=["day"],
+            update_fields=["marked_at"],
+        )
+
+    transaction.on_commit(mark)
+
+
+def mark_orders(orders):
+    mark_dirty(timezone.localdate(order.order_date) for order in orders if order.order_date)
+
+
+def order_saving(sender, instance, raw=False, update_fields=None, **kwargs):
+    """pre_save receiver for Order: an order moved to another day leaves its old day dirty too."""
+    if raw or instance.pk is None or (update_fields is not None and "order_date" not in update_fields):
+        return
+    previous = Order.objects.filter(pk=instance.pk).values_list("order_date", flat=True).first()
+    if previous is not None and previous != instance.order_date:
+        mark_dirty([timezone.localdate(previous)])
+
+
+def order_changed(sender, instance, raw=False, **kwargs):
+    """post_save/post_delete receiver for Order."""
+    if not raw:
+        mark_orders([instance])
+
+
+def refresh_rollups():
+    """
+    Recompute the rollups of every dirty day, and of the weeks and months
+    containing them, then clear the days. A day marked again while this
+    runs keeps its newer mark and is picked up next time. Returns the
+    refreshed days.
+    """
+    started = timezone.now()
+    days = sorted(DirtySalesDay.objects.filter(marked_at__lte=started).values_list("day", flat=True))
+    if not days:
+        return []
+    for granularity in (DAY, WEEK, MONTH):
+        for start in sorted({period_start(day, granularity) for day in days}):
+            _refresh_periods(granularity, start, next_period(start, granularity))
+    for day in days:
+        _refresh_products(day, next_period(day, DAY))
+    DirtySalesDay.objects.filter(day__in=days, marked_at__lte=started).delete()
+    invalidate(Order)
+    return days
+
+
+def rebuild_rollups(start=None, end=None, progress=None):
+    """
+    Recompute all rollups for days in [start, end), by default from the
+    first order to today, a month of days (or a few weeks) per query.
+    """
+    if start is None:
+        first = Order.objects.order_by("order_date").values_list("order_date", flat=True).first()
+        if first is None:
+            return
+        start = timezone.localdate(first)
+    if end is None:
+        end = timezone.localdate() + datetime.timedelta(days=1)
+
+    started = timezone.now()
+    for granularity, chunk in ((DAY, 31), (WEEK, 5), (MONTH, 1)):
+        period = period_start(start, granularity)
+        while period < end:
+            stop = period
+            for _ in range(chunk):
+                stop = next_period(stop, granularity)
+            _refresh_periods(granularity, period, stop)
+            if granularity == DAY:
+                _refresh_products(period, stop)
+            if progress is not None:
+                progress(granularity, period, stop)
+            period = stop
+    DirtySalesDay.objects.filter(day__gte=start, day__lt=end, marked_at__lte=started).delete()
+    invalidate(Order)
+
+
+@transaction.atomic
+def _refresh_periods(granularity, start, end):
+    """Replace the ``granularity`` rows for periods starting in [start, end)."""
+    low, high = _bounds(start, end)
+    rows = (
+        Order.objects.filter(order_date__gte=low, order_date__lt=high)
+        .annotate(period=TRUNCATE[granularity]("order_date", output_field=DateField()))
+        .values("period")
+        .annotate(order_count=Count("id"), customer_count=Count("customer_id", distinct=True), revenue=Sum("total_amount"))
+        .order_by()
+    )
+    SalesRollup.objects.filter(granularity=granularity, period__gte=start, period__lt=end).delete()
+    SalesRollup.objects.bulk_create(
+        SalesRollup(
+            granularity=granularity,
+            period=row["period"],
+            order_count=row["order_count"],
+            customer_count=row["customer_count"],
+            revenue=_money(row["revenue"]),
+        )
+        for row in rows
+    )
+
+
+@transaction.atomic
+def _refresh_products(start, end):
+    low, high = _bounds(start, end)
+    rows = (
+        OrderItem.objects.filter(order__order_date__gte=low, order__order_date__lt=high)
+        .annotate(day=TruncDate("order__order_date"))
+        .values("day", "product_id")
+        .annotate(units=Sum("quantity"), order_count=Count("order_id", distinct=True), revenue=Sum(line_total()))
+        .order_by()
+    )
+    ProductSalesRollup.objects.filter(day__gte=start, day__lt=end).delete()
+    ProductSalesRollup.objects.bulk_create(
+        ProductSalesRollup(
+            day=row["day"],
+            product_id=row["product_id"],
+            units=row["units"],
+            order_count=row["order_count"],
+            revenue=_money(row["revenue"]),
+        )
+        for row in rows
+    )
+
+
+def sales_timeseries(start=None, end=None, granularity=DAY, product_id=None):
+    """
+    One bucket per period from ``start`` to ``end`` (inclusive), read from
+    the rollups; periods without orders are zero. With ``product_id`` the
+    buckets hold that product's units and revenue, rolled up from days.
+    """
+    end = end or timezone.localdate()
+    if start is None:
+        first = SalesRollup.objects.filter(granularity=DAY).order_by("period").values_list("period", flat=True).first()
+        start = first or end
+    start, end = period_start(start, granularity), period_start(end, granularity)
+    if start > end:
+        raise GraphQLError("`from` must not be after `to`.")
+
+    periods = [start]
+    while periods[-1] < end:
+        periods.append(next_period(periods[-1], granularity))
+        if len(periods) > MAX_BUCKETS:
+            raise GraphQLError(f"At most {MAX_BUCKETS} buckets can be requested; use a coarser granularity.")
+
+    high = next_period(end, granularity)
+    if product_id is not None:
+        rows = (
+            ProductSalesRollup.objects.filter(product_id=product_id, day__gte=start, day__lt=high)
+            .annotate(period=TRUNCATE[granularity]("day", output_field=DateField()))
+            .values("period")
+            .annotate(units=Sum("units"), order_count=Sum("order_count"), revenue=Sum("revenue"))
+            .order_by()
+        )
+    else:
+        rows = SalesRollup.objects.filter(granularity=granularity, period__gte=start, period__lt=high).values(
+            "period", "order_count", "customer_count", "revenue"
+        )
+    found = {row["period"]: row for row in rows}
+
+    buckets = []
+    for period in periods:
+        row = found.get(period, {})
+        buckets.append({
+            "period": period,
+            "order_count": row.get("order_count") or 0,
+            "customer_count": None if product_id is not None else row.get("customer_count") or 0,
+            "units": row.get("units") or 0 if product_id is not None else None,
+            "revenue": _money(row.get("revenue")),
+        })
+    return buckets
@@ -1,13 +1,24 @@
 import graphene
-from graphene_django.filter import DjangoFilterConnectionField
-from django.db import transaction
+from graphene_django.filter.utils import get_filtering_args_from_filterset
+from django.core.exceptions import ValidationError
+from django.conf import settings
+from django.db import IntegrityError, transaction
 from django.utils import timezone
 from decimal import Decimal
-from .schema_inputs import CreateCustomerInput, CreateOrderInput, CreateProductInput, BulkCustomerInput
+from .schema_inputs import CreateCustomerInput, CreateOrderInput, CreateProductInput, BulkCustomerInput, BulkOrderInput
 from .filters import CustomerFilter, ProductFilter, OrderFilter
 from .models import Customer, Product, Order
-from .schema_types import CustomerType, ProductType, OrderType
-from .utils import validate_phone, to_decimal
+from .schema_types import CustomerType, ProductType, OrderType, OrderStatsType, SalesBucketType, SalesGranularity
+from .fields import BatchedConnectionField
+from .loaders import get_loader
+from .optimizer import optimize_queryset
+from .aggregates import OrderStats
+from .customer_stats import ensure_stats, record_orders
+from .orders import apply_totals, create_items
+from .response_cache import invalidate
+from .rollups import mark_orders, refresh_rollups, sales_timeseries
+from .stock import InsufficientStock, allocate_stock, reserve_stock, restock_low_stock
+from .utils import PHONE_ERROR, chunked, invalid_phones, validate_phone, to_decimal
 
 
 
@@ -36,33 +47,79 @@ class CreateCustomer(graphene.Mutation):
             return CreateCustomer(customer=None, message="Failed to create customer.", errors=[str(exc)])
 
 
+def _row_errors(errors):
+    """Format (row, message) pairs as 'Row N: ...' in input order."""
+    return [f"Row {idx}: {message}" for idx, message in sorted(errors)]
+
+
 class BulkCreateCustomers(graphene.Mutation):
     class Arguments:
         input = graphene.List(graphene.NonNull(BulkCustomerInput), required=True)
+        batch_size = graphene.Int(required=False)
+        all_or_nothing = graphene.Boolean(required=False, default_value=False)
 
     customers = graphene.List(CustomerType)
     errors = graphene.List(graphene.String)
 
     @transaction.atomic
-    def mutate(self, info, input):
-        created_customers = []
+    def mutate(self, info, input, batch_size=None, all_or_nothing=False):
+        if batch_size is None:
+            batch_size = settings.CRM_BULK_BATCH_SIZE
+        if batch_size < 1:
+            return BulkCreateCustomers(customers=[], errors=["Batch size must be a positive number."])
+
+        rows = [
+            (idx, (record.name or "").strip(), (record.email or "").strip().lower(), record.phone or None)
+            for idx, record in enumerate(input, start=1)
+        ]
         errors = []
 
-        for idx, record in enumerate(input, start=1):
-            try:
-                name = (record.name or "").strip()
-                email = (record.email or "").strip().lower()
-                phone = (record.phone or None)
-                if Customer.objects.filter(email=email).exists():
-                    errors.append(f"Row {idx}: Email '{email}' already exists.")
-                    continue
-                validate_phone(phone)
-                customer = Customer.objects.create(name=name, email=email, phone=phone)
-                created_customers.append(customer)
-            except Exception as exc:
-                errors.append(f"Row {idx}: {str(exc)}")
+        # Look up every existing email up front instead of once per row
+        existing = set()
+        for emails in chunked({email for _, _, email, _ in rows}, batch_size):
+            existing.update(Customer.objects.filter(email__in=emails).values_list("email", flat=True))
+
+        bad_phones = invalid_phones([phone for _, _, _, phone in rows])
+        row_for_email = {}
+        pending = []
+        for pos, (idx, name, email, phone) in enumerate(rows):
+            if email in existing or email in row_for_email:
+                errors.append((idx, f"Email '{email}' already exists."))
+            elif pos in bad_phones:
+                errors.append((idx, PHONE_ERROR))
+            else:
+                row_for_email[email] = idx
+                pending.append(Customer(name=name, email=email, phone=phone))
+
+        if errors and all_or_nothing:
+            return BulkCreateCustomers(customers=[], errors=_row_errors(errors))
 
-        return BulkCreateCustomers(customers=created_customers, errors=errors)
+        created_customers = []
+        for batch in chunked(pending, batch_size):
+            try:
+                with transaction.atomic():
+                    created_customers.extend(Customer.objects.bulk_create(batch))
+            except IntegrityError as exc:
+                # Another request inserted one of these emails since the lookup
+                if all_or_nothing:
+                    transaction.set_rollback(True)
+                    return BulkCreateCustomers(customers=[], errors=[str(exc)])
+                taken = set(
+                    Customer.objects.filter(email__in=[c.email for c in batch]).values_list("email", flat=True)
+                )
+                for customer in batch:
+                    if customer.email in taken:
+                        errors.append((row_for_email[customer.email], f"Email '{customer.email}' already exists."))
+                created_customers.extend(
+                    Customer.objects.bulk_create([c for c in batch if c.email not in taken])
+                )
+
+        # bulk_create sends no post_save signals
+        if created_customers:
+            ensure_stats([customer.pk for customer in created_customers])
+            invalidate(Customer)
+        get_loader(info).register(created_customers)
+        return BulkCreateCustomers(customers=created_customers, errors=_row_errors(errors))
 
 
 class CreateProduct(graphene.Mutation):
@@ -81,8 +138,12 @@ class CreateProduct(graphene.Mutation):
             stock = input.stock if input.stock is not None else 0
             if stock < 0:
                 return CreateProduct(product=None, errors=["Stock cannot be negative."])
+            if input.restock_target is not None and input.restock_target < 0:
+                return CreateProduct(product=None, errors=["Restock target cannot be negative."])
 
-            product = Product.objects.create(name=input.name.strip(), price=price, stock=stock)
+            product = Product.objects.create(
+                name=input.name.strip(), price=price, stock=stock, restock_target=input.restock_target
+            )
             return CreateProduct(product=product, errors=[])
         except Exception as exc:
             return CreateProduct(product=None, errors=[str(exc)])
@@ -97,84 +158,211 @@ class CreateOrder(graphene.Mutation):
 
     def mutate(self, info, input):
         try:
-            # Validate customer
-            try:
-                customer = Customer.objects.get(id=input.customer_id)
-            except Customer.DoesNotExist:
-                return CreateOrder(order=None, errors=[f"Customer with id '{input.customer_id}' does not exist."])
-
-            # Validate product IDs list
-            product_ids = list(input.product_ids) if input.product_ids else []
-            if not product_ids:
-                return CreateOrder(order=None, errors=["At least one product must be provided."])
-
-            # Fetch products
-            products_qs = Product.objects.filter(id__in=product_ids)
-            found_ids = {str(p.id) for p in products_qs}
-            missing_ids = [pid for pid in product_ids if str(pid) not in found_ids]
-            if missing_ids:
-                return CreateOrder(order=None, errors=[f"Invalid product IDs: {missing_ids}"])
-
-            # Compute total_amount using Decimal arithmetic
-            total_amount = sum((p.price for p in products_qs), Decimal("0.00"))
-
-            # Create order
-            order = Order.objects.create(
-                customer=customer,
-                total_amount=total_amount,
-                order_date=input.order_date or timezone.now()
-            )
-            order.products.set(products_qs)
-            order.save()
+            with transaction.atomic():
+                # Validate customer
+                try:
+                    customer = Customer.objects.get(id=input.customer_id)
+                except Customer.DoesNotExist:
+                    return CreateOrder(order=None, errors=[f"Customer with id '{input.customer_id}' does not exist."])
+
+                # Validate product IDs and quantities
+                raw_ids, quantities, error = _order_lines(input)
+                if error:
+                    return CreateOrder(order=None, errors=[error])
+
+                # Fetch products
+                products = list(Product.objects.filter(id__in=quantities))
+                found_ids = {p.id for p in products}
+                missing_ids = [pid for pid in raw_ids if _to_pk(pid) not in found_ids]
+                if missing_ids:
+                    return CreateOrder(order=None, errors=[f"Invalid product IDs: {missing_ids}"])
+
+                # Take every line out of stock in one conditional UPDATE
+                reserve_stock(quantities)
+
+                # Create order with its lines priced as of now; the total
+                # is summed from the lines by the database
+                order = Order.objects.create(
+                    customer=customer,
+                    total_amount=Decimal("0.00"),
+                    order_date=input.order_date or timezone.now()
+                )
+                create_items([(order, quantities)], {p.id: p.price for p in products})
+                apply_totals([order])
 
             return CreateOrder(order=order, errors=[])
         except Exception as exc:
             return CreateOrder(order=None, errors=[str(exc)])
 
+class BulkCreateOrders(graphene.Mutation):
+    class Arguments:
+        input = graphene.List(graphene.NonNull(BulkOrderInput), required=True)
+        batch_size = graphene.Int(required=False)
+        all_or_nothing = graphene.Boolean(required=False, default_value=False)
+
+    orders = graphene.List(OrderType)
+    errors = graphene.List(graphene.String)
+
+    @transaction.atomic
+    def mutate(self, info, input, batch_size=None, all_or_nothing=False):
+        if batch_size is None:
+            batch_size = settings.CRM_BULK_BATCH_SIZE
+        if batch_size < 1:
+            return BulkCreateOrders(orders=[], errors=["Batch size must be a positive number."])
+
+        lines = [_order_lines(record) for record in input]
+
+        # Resolve every customer and product referenced by the batch at once
+        customer_ids = {_to_pk(record.customer_id) for record in input} - {None}
+        product_ids = {pid for _, quantities, _ in lines for pid in quantities}
+        customers = Customer.objects.only("id").in_bulk(customer_ids)
+        prices = dict(Product.objects.filter(id__in=product_ids).values_list("id", "price"))
+
+        errors = []
+        pending = []
+        for idx, (record, (raw_ids, quantities, error)) in enumerate(zip(input, lines), start=1):
+            customer_id = _to_pk(record.customer_id)
+            if customer_id not in customers:
+                errors.append((idx, f"Customer with id '{record.customer_id}' does not exist."))
+                continue
+            if error:
+                errors.append((idx, error))
+                continue
+            missing_ids = [pid for pid in raw_ids if _to_pk(pid) not in prices]
+            if missing_ids:
+                errors.append((idx, f"Invalid product IDs: {missing_ids}"))
+                continue
+
+            order = Order(
+                customer_id=customer_id,
+                total_amount=Decimal("0.00"),
+                order_date=record.order_date or timezone.now(),
+            )
+            pending.append((idx, order, quantities))
+
+        # Reserve stock for the whole batch; rows that no longer fit fail
+        try:
+            short = allocate_stock([quantities for _, _, quantities in pending])
+        except InsufficientStock as exc:
+            transaction.set_rollback(True)
+            return BulkCreateOrders(orders=[], errors=[str(exc)])
+        errors.extend((pending[pos][0], str(exc)) for pos, exc in short.items())
+        pending = [row for pos, row in enumerate(pending) if pos not in short]
+
+        if errors and all_or_nothing:
+            transaction.set_rollback(True)
+            return BulkCreateOrders(orders=[], errors=_row_errors(errors))
+
+        orders = Order.objects.bulk_create([order for _, order, _ in pending], batch_size=batch_size)
+        create_items([(order, quantities) for _, order, quantities in pending], prices, batch_size=batch_size)
+        if orders:
+            # Totals are summed from the stored lines in one UPDATE, then
+            # added to the customers' stats in one more
+            apply_totals(orders, stats=False)
+            record_orders(orders)
+            mark_orders(orders)
+            invalidate(Order, Product)
+        get_loader(info).register(orders)
+        return BulkCreateOrders(orders=orders, errors=_row_errors(errors))
+
+
+def _to_pk(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _order_lines(record):
+    """
+    Return (raw product ids, {product pk: quantity}, error) for an order input.
+
+    Each entry of productIds counts once; items add their quantity.
+    """
+    items = record.items or []
+    raw_ids = list(record.product_ids or []) + [item.product_id for item in items]
+    if not raw_ids:
+        return raw_ids, {}, "At least one product must be provided."
+
+    quantities = dict.fromkeys({_to_pk(pid) for pid in record.product_ids or []} - {None}, 1)
+    for item in items:
+        if item.quantity is None or item.quantity < 1:
+            return raw_ids, {}, "Quantity must be a positive number."
+        pid = _to_pk(item.product_id)
+        if pid is not None:
+            quantities[pid] = quantities.get(pid, 0) + item.quantity
+    return raw_ids, quantities, None
+
+
 class Query(graphene.ObjectType):
-    all_customers = DjangoFilterConnectionField(CustomerType, filterset_class=CustomerFilter)
-    all_products = DjangoFilterConnectionField(ProductType, filterset_class=ProductFilter)
-    all_orders = DjangoFilterConnectionField(OrderType, filterset_class=OrderFilter)
+    all_customers = BatchedConnectionField(CustomerType, filterset_class=CustomerFilter)
+    all_products = BatchedConnectionField(ProductType, filterset_class=ProductFilter)
+    all_orders = BatchedConnectionField(OrderType, filterset_class=OrderFilter)
+    order_stats = graphene.Field(
+        OrderStatsType, **get_filtering_args_from_filterset(OrderFilter, OrderType)
+    )
+    sales_timeseries = graphene.List(
+        graphene.NonNull(SalesBucketType),
+        from_=graphene.Date(name="from", description="Defaults to the first day with orders."),
+        to=graphene.Date(description="Inclusive; defaults to today."),
+        granularity=SalesGranularity(default_value="day"),
+        product_id=graphene.ID(),
+        description="Sales per period from the rollup tables, refreshed every few minutes.",
+    )
 
     def resolve_all_customers(self, info, order_by=None, **kwargs):
-        qs = Customer.objects.all()
-        order = info.variable_values.get("orderBy")  
+        qs = optimize_queryset(Customer.objects.all(), info)
+        order = order_by or info.variable_values.get("orderBy")
         
         if order:
-            qs = qs.order_by(order)
+            qs = qs.order_by(*order.split(","))
+            if "stats__" in order:
+                # Every customer has a stats row; the inner join lets the
+                # database walk the stats index instead of sorting.
+                qs = qs.filter(stats__isnull=False)
         return qs
 
     def resolve_all_products(self, info, order_by=None, **kwargs):
-        qs = Product.objects.all()
-        order = info.variable_values.get("orderBy")
+        qs = optimize_queryset(Product.objects.all(), info)
+        order = order_by or info.variable_values.get("orderBy")
         if order:
-            qs = qs.order_by(order)
+            qs = qs.order_by(*order.split(","))
         return qs
 
     def resolve_all_orders(self, info, order_by=None, **kwargs):
-        qs = Order.objects.select_related("customer").prefetch_related("products").all()
-        order = info.variable_values.get("orderBy")
+        qs = optimize_queryset(Order.objects.all(), info)
+        order = order_by or info.variable_values.get("orderBy")
         if order:
-            qs = qs.order_by(order)
+            qs = qs.order_by(*order.split(","))
         return qs
 
+    def resolve_order_stats(self, info, **kwargs):
+        # Same arguments as allOrders, aggregated in SQL instead of paged.
+        filterset = OrderFilter(data=kwargs, queryset=Order.objects.all(), request=info.context)
+        if not filterset.is_valid():
+            raise ValidationError(filterset.form.errors.as_json())
+        return OrderStats(filterset.qs)
+
+    def resolve_sales_timeseries(self, info, from_=None, to=None, granularity="day", product_id=None):
+        if product_id is not None:
+            product_id = _to_pk(product_id)
+            if product_id is None:
+                raise ValidationError("productId must be a product id.")
+        return sales_timeseries(from_, to, getattr(granularity, "value", granularity), product_id)
+
 
 class UpdateLowStockProducts(graphene.Mutation):
     class Arguments:
         increment = graphene.Int(required=False, default_value=10)
+        threshold = graphene.Int(required=False)
+        restock_to_target = graphene.Boolean(required=False, default_value=False)
 
     success = graphene.Boolean()
     message = graphene.String()
     updated_products = graphene.List(ProductType)
 
-    def mutate(self, info, increment):
-        low_stock_products = Product.objects.filter(stock__lt=10)
-        updated = []
-
-        for product in low_stock_products:
-            product.stock += increment
-            product.save()
-            updated.append(product)
+    def mutate(self, info, increment, threshold=None, restock_to_target=False):
+        updated = restock_low_stock(threshold=threshold, increment=increment, to_target=restock_to_target)
 
         if updated:
             msg = f"{len(updated)} products restocked successfully."
@@ -186,9 +374,20 @@ class UpdateLowStockProducts(graphene.Mutation):
                 success=False, message="No low-stock products found.", updated_products=[]
             )
 
+class RefreshSalesRollups(graphene.Mutation):
+    """Recompute the sales rollups of days with changed orders (see crm.rollups)."""
+
+    refreshed_days = graphene.List(graphene.Date)
+
+    def mutate(self, info):
+        return RefreshSalesRollups(refreshed_days=refresh_rollups())
+
+
 class Mutation(graphene.ObjectType):
     create_customer = CreateCustomer.Field()
     bulk_create_customers = BulkCreateCustomers.Field()
     create_product = CreateProduct.Field()
     create_order = CreateOrder.Field()
+    bulk_create_orders = BulkCreateOrders.Field()
     update_low_stock_products = UpdateLowStockProducts.Field()
+    refresh_sales_rollups = RefreshSalesRollups.Field()
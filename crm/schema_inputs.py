@@ -16,9 +16,23 @@ class CreateProductInput(graphene.InputObjectType):
     name = graphene.String(required=True)
     price = graphene.Float(required=True)  
     stock = graphene.Int(required=False, default_value=0)
+    restock_target = graphene.Int(required=False)
+
+
+class OrderItemInput(graphene.InputObjectType):
+    product_id = graphene.ID(required=True)
+    quantity = graphene.Int(required=False, default_value=1)
 
 
 class CreateOrderInput(graphene.InputObjectType):
     customer_id = graphene.ID(required=True)
-    product_ids = graphene.List(graphene.NonNull(graphene.ID), required=True)
+    product_ids = graphene.List(graphene.NonNull(graphene.ID), required=False)
+    items = graphene.List(graphene.NonNull(OrderItemInput), required=False)
+    order_date = graphene.DateTime(required=False)
+
+
+class BulkOrderInput(graphene.InputObjectType):
+    customer_id = graphene.ID(required=True)
+    product_ids = graphene.List(graphene.NonNull(graphene.ID), required=False)
+    items = graphene.List(graphene.NonNull(OrderItemInput), required=False)
     order_date = graphene.DateTime(required=False)
\ No newline at end of file
@@ -1,12 +1,59 @@
 import graphene
+from decimal import Decimal
 from graphene_django import DjangoObjectType
-from .models import Customer, Product, Order
+from .models import Customer, CustomerStats, Product, Order, OrderItem
+from .loaders import get_loader
+from .pagination import estimate_count
+
+class CountableConnection(graphene.relay.Connection):
+    class Meta:
+        abstract = True
+
+    total_count = graphene.Int(
+        estimated=graphene.Boolean(default_value=False),
+        description="Counted only when selected; `estimated` uses planner statistics where available.",
+    )
+
+    def resolve_total_count(self, info, estimated=False):
+        if self.length is not None:
+            return self.length
+        if estimated:
+            return estimate_count(self.iterable)
+        return self.iterable.count()
+
 
 class CustomerType(DjangoObjectType):
     class Meta:
         model = Customer
         fields = "__all__"
         interfaces = (graphene.relay.Node,)
+        connection_class = CountableConnection
+
+    order_count = graphene.Int()
+    lifetime_value = graphene.Decimal()
+    last_order_date = graphene.DateTime()
+
+    def resolve_orders(self, info, **kwargs):
+        return get_loader(info).load(self, "orders")
+
+    def resolve_order_count(self, info):
+        stats = _customer_stats(self, info)
+        return stats.order_count if stats else 0
+
+    def resolve_lifetime_value(self, info):
+        stats = _customer_stats(self, info)
+        return stats.lifetime_value if stats else Decimal("0.00")
+
+    def resolve_last_order_date(self, info):
+        stats = _customer_stats(self, info)
+        return stats.last_order_date if stats else None
+
+
+def _customer_stats(customer, info):
+    try:
+        return get_loader(info).load(customer, "stats")
+    except CustomerStats.DoesNotExist:
+        return None
 
 
 class ProductType(DjangoObjectType):
@@ -14,6 +61,13 @@ class ProductType(DjangoObjectType):
         model = Product
         fields = "__all__"
         interfaces = (graphene.relay.Node,)
+        connection_class = CountableConnection
+
+    def resolve_order_set(self, info, **kwargs):
+        return get_loader(info).load(self, "order_set")
+
+    def resolve_order_items(self, info, **kwargs):
+        return get_loader(info).load(self, "order_items")
 
 
 class OrderType(DjangoObjectType):
@@ -21,6 +75,93 @@ class OrderType(DjangoObjectType):
         model = Order
         fields = "__all__"
         interfaces = (graphene.relay.Node,)
+        connection_class = CountableConnection
+
+    def resolve_customer(self, info):
+        return get_loader(info).load(self, "customer")
+
+    def resolve_products(self, info, **kwargs):
+        return get_loader(info).load(self, "products")
+
+    def resolve_items(self, info, **kwargs):
+        return get_loader(info).load(self, "items")
+
+
+class OrderItemType(DjangoObjectType):
+    line_total = graphene.Decimal(description="quantity * unitPrice")
+
+    class Meta:
+        model = OrderItem
+        fields = "__all__"
+        interfaces = (graphene.relay.Node,)
+        connection_class = CountableConnection
+
+    def resolve_order(self, info):
+        return get_loader(info).load(self, "order")
+
+    def resolve_product(self, info):
+        return get_loader(info).load(self, "product")
+
+    def resolve_line_total(self, info):
+        return self.quantity * self.unit_price
+
+
+class OrderStatsBucketType(graphene.ObjectType):
+    day = graphene.Date()
+    customer = graphene.Field(CustomerType)
+    product = graphene.Field(ProductType)
+    count = graphene.Int()
+    quantity = graphene.Int(description="Units sold (byProduct only).")
+    revenue = graphene.Decimal()
+    avg = graphene.Decimal()
+    min = graphene.Decimal()
+    max = graphene.Decimal()
+
+
+class OrderStatsType(graphene.ObjectType):
+    count = graphene.Int()
+    revenue = graphene.Decimal()
+    avg = graphene.Decimal()
+    min = graphene.Decimal()
+    max = graphene.Decimal()
+    by_day = graphene.List(OrderStatsBucketType)
+    by_customer = graphene.List(OrderStatsBucketType, first=graphene.Int())
+    by_product = graphene.List(OrderStatsBucketType, first=graphene.Int())
+
+    def resolve_count(self, info):
+        return self.totals["count"]
+
+    def resolve_revenue(self, info):
+        return self.totals["revenue"] or Decimal("0.00")
+
+    def resolve_avg(self, info):
+        return self.totals["avg"]
+
+    def resolve_min(self, info):
+        return self.totals["min"]
+
+    def resolve_max(self, info):
+        return self.totals["max"]
+
+    def resolve_by_day(self, info):
+        return self.by_day()
+
+    def resolve_by_customer(self, info, first=None):
+        return self.by_customer(first=first)
+
+    def resolve_by_product(self, info, first=None):
+        return self.by_product(first=first)
+
+
+SalesGranularity = graphene.Enum("SalesGranularity", [("DAY", "day"), ("WEEK", "week"), ("MONTH", "month")])
+
+
+class SalesBucketType(graphene.ObjectType):
+    period = graphene.Date(description="First day of the day, week (Monday) or month.")
+    order_count = graphene.Int()
+    customer_count = graphene.Int(description="Distinct customers (all-product series only).")
+    units = graphene.Int(description="Units sold (productId series only).")
+    revenue = graphene.Decimal()
 
 # class ProductType(graphene.ObjectType):
 #     id = graphene.ID()
@@ -0,0 +1,148 @@
+import sqlite3
+from django.conf import settings
+from django.db import connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+from .models import Customer, Product
+
+# Columns each model is searchable on
+SEARCH_FIELDS = {
+    Customer: ("name", "email"),
+    Product: ("name",),
+}
+
+
+class SearchBackend:
+    """
+    Substring search over SEARCH_FIELDS.
+
+    Every whitespace-separated term must appear in at least one of the
+    fields, case-insensitively. This base class uses plain ``icontains``;
+    subclasses answer the same question from an index.
+    """
+
+    def install(self, connection, model, fields):
+        """Create whatever keeps the index in sync with ``model``'s table."""
+
+    def search(self, queryset, query):
+        fields = SEARCH_FIELDS[queryset.model]
+        for term in query.split():
+            queryset = queryset.filter(_contains_any(fields, term))
+        return queryset
+
+
+class SQLiteFTSBackend(SearchBackend):
+    """
+    SQLite FTS5 with the trigram tokenizer (SQLite 3.34+).
+
+    Each model gets an external-content ``<table>_search`` index kept in
+    sync by triggers, so bulk_create, update() and raw SQL writes are
+    indexed too. Trigrams match substrings, so results are the same as
+    ``icontains``; terms shorter than three characters fall back to it.
+    """
+
+    def install(self, connection, model, fields):
+        table = model._meta.db_table
+        index = f"{table}_search"
+        columns = ", ".join(fields)
+        new = ", ".join(f"new.{field}" for field in fields)
+        old = ", ".join(f"old.{field}" for field in fields)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT count(*) FROM sqlite_master WHERE name IN (%s, %s, %s, %s)",
+                [index, f"{index}_ai", f"{index}_ad", f"{index}_au"],
+            )
+            if cursor.fetchone()[0] == 4:
+                return
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {index} USING fts5("
+                f"{columns}, content='{table}', content_rowid='id', tokenize='trigram')"
+            )
+            cursor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {index}_ai AFTER INSERT ON {table} BEGIN "
+                f"INSERT INTO {index}(rowid, {columns}) VALUES (new.id, {new}); END"
+            )
+            cursor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {index}_ad AFTER DELETE ON {table} BEGIN "
+                f"INSERT INTO {index}({index}, rowid, {columns}) VALUES ('delete', old.id, {old}); END"
+            )
+            cursor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {index}_au AFTER UPDATE ON {table} BEGIN "
+                f"INSERT INTO {index}({index}, rowid, {columns}) VALUES ('delete', old.id, {old}); "
+                f"INSERT INTO {index}(rowid, {columns}) VALUES (new.id, {new}); END"
+            )
+            # Rows written while the triggers were missing are picked up here.
+            cursor.execute(f"INSERT INTO {index}({index}) VALUES ('rebuild')")
+
+    def search(self, queryset, query):
+        fields = SEARCH_FIELDS[queryset.model]
+        terms = query.split()
+        indexed = [term for term in terms if len(term) >= 3]
+        if indexed:
+            index = f"{queryset.model._meta.db_table}_search"
+            match = " AND ".join('"{}"'.format(term.replace('"', '""')) for term in indexed)
+            queryset = queryset.filter(
+                pk__in=RawSQL(f"SELECT rowid FROM {index} WHERE {index} MATCH %s", [match])
+            )
+        for term in terms:
+            if len(term) < 3:
+                queryset = queryset.filter(_contains_any(fields, term))
+        return queryset
+
+
+class PostgresTrigramBackend(SearchBackend):
+    """
+    PostgreSQL pg_trgm GIN indexes on the searched columns.
+
+    ILIKE '%term%' can use a gin_trgm_ops index directly, so the lookups
+    stay ``icontains`` and PostgreSQL maintains the index on every write.
+    """
+
+    def install(self, connection, model, fields):
+        table = model._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            for field in fields:
+                cursor.execute(
+                    f"CREATE INDEX IF NOT EXISTS {table}_{field}_trgm "
+                    f"ON {table} USING gin ({field} gin_trgm_ops)"
+                )
+
+
+def get_search_backend(using="default"):
+    """
+    The backend named by CRM_SEARCH_BACKEND (a dotted path), or the best
+    one for the database vendor.
+    """
+    path = getattr(settings, "CRM_SEARCH_BACKEND", None)
+    if path:
+        return import_string(path)()
+    vendor = connections[using].vendor
+    if vendor == "sqlite" and sqlite3.sqlite_version_info >= (3, 34):
+        return SQLiteFTSBackend()
+    if vendor == "postgresql":
+        return PostgresTrigramBackend()
+    return SearchBackend()
+
+
+def search(queryset, query):
+    """Filter a Customer or Product queryset to rows matching ``query``."""
+    return get_search_backend(queryset.db).search(queryset, query)
+
+
+def install_search(using="default", **kwargs):
+    """post_migrate receiver: (re)create the search index for every model."""
+    backend = get_search_backend(using)
+    connection = connections[using]
+    tables = set(connection.introspection.table_names())
+    for model, fields in SEARCH_FIELDS.items():
+        if model._meta.db_table in tables:
+            backend.install(connection, model, fields)
+
+
+def _contains_any(fields, term):
+    condition = Q(pk__in=[])
+    for field in fields:
+        condition |= Q(**{f"{field}__icontains": term})
+    return condition
@@ -0,0 +1,130 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, Q, When
+from django.db.models.functions import Coalesce, Greatest
+from .models import Product
+from .response_cache import invalidate
+
+
+class InsufficientStock(Exception):
+    def __init__(self, product_ids):
+        self.product_ids = sorted(product_ids)
+        super().__init__(f"Insufficient stock for product IDs: {self.product_ids}")
+
+
+def low_stock(queryset, threshold=None):
+    """Products whose stock is below ``threshold`` (CRM_LOW_STOCK_THRESHOLD by default)."""
+    if threshold is None:
+        threshold = settings.CRM_LOW_STOCK_THRESHOLD
+    return queryset.filter(stock__lt=threshold)
+
+
+def restock_low_stock(threshold=None, increment=10, to_target=False):
+    """
+    Restock every low-stock product in a single UPDATE and return the
+    ones whose stock changed.
+
+    The low-stock rows are locked before they are updated and the UPDATE
+    repeats the threshold check, so a concurrent order cannot slip between
+    reading and writing a row. With
+    ``to_target`` products that have a ``restock_target`` are raised to it
+    instead (never lowered); the rest still get ``increment``.
+    """
+    stock = F("stock") + increment
+    if to_target:
+        stock = Greatest(Coalesce(F("restock_target"), stock), F("stock"))
+
+    queryset = low_stock(Product.objects.all(), threshold)
+    # Only rows whose stock changes are updated and returned: a target at
+    # or below the current stock leaves it as it is.
+    if to_target:
+        queryset = queryset.exclude(restock_target__lte=F("stock"))
+    if not increment:
+        queryset = queryset.filter(restock_target__isnull=False) if to_target else queryset.none()
+    with transaction.atomic():
+        ids = _update_returning_ids(queryset, stock=stock)
+        invalidate(Product)
+        return list(Product.objects.filter(id__in=ids).order_by("id"))
+
+
+def reserve_stock(quantities):
+    """
+    Take ``quantities`` ({product_id: quantity}) out of stock atomically.
+
+    Every product is decremented by one conditional UPDATE
+    (``SET stock = stock - qty WHERE stock >= qty``), so concurrent orders
+    never oversell and no SELECT ... FOR UPDATE is needed. If any product
+    is short nothing is taken and InsufficientStock names the short ones.
+    """
+    quantities = {pid: qty for pid, qty in quantities.items() if qty}
+    if not quantities:
+        return
+    condition = Q(pk__in=[])
+    whens = []
+    for pid, qty in quantities.items():
+        condition |= Q(pk=pid, stock__gte=qty)
+        whens.append(When(pk=pid, then=F("stock") - qty))
+
+    try:
+        with transaction.atomic():
+            updated = Product.objects.filter(condition).update(
+                stock=Case(*whens, default=F("stock"), output_field=Product._meta.get_field("stock"))
+            )
+            if updated != len(quantities):
+                raise InsufficientStock(quantities)
+            # update() sends no signals
+            invalidate(Product)
+    except InsufficientStock:
+        current = dict(Product.objects.filter(pk__in=quantities).values_list("pk", "stock"))
+        raise InsufficientStock(pid for pid, qty in quantities.items() if current.get(pid, 0) < qty)
+
+
+def allocate_stock(demands):
+    """
+    Reserve stock for as many of ``demands`` (a list of {product_id: qty})
+    as fit, in input order, and return {index: InsufficientStock} for the
+    rest. When everything fits this is a single UPDATE.
+    """
+    try:
+        reserve_stock(_sum_quantities(demands))
+        return {}
+    except InsufficientStock as exc:
+        short = set(exc.product_ids)
+
+    # Only demands touching a short product can fail; share out what is left.
+    involved = {pid for demand in demands for pid in demand}
+    available = dict(Product.objects.filter(pk__in=involved).values_list("pk", "stock"))
+    accepted, rejected = [], {}
+    for idx, demand in enumerate(demands):
+        missing = [pid for pid, qty in demand.items() if pid in short and available.get(pid, 0) < qty]
+        if missing:
+            rejected[idx] = InsufficientStock(missing)
+            continue
+        for pid, qty in demand.items():
+            available[pid] = available.get(pid, 0) - qty
+        accepted.append(demand)
+
+    reserve_stock(_sum_quantities(accepted))
+    return rejected
+
+
+def _sum_quantities(demands):
+    totals = {}
+    for demand in demands:
+        for pid, qty in demand.items():
+            totals[pid] = totals.get(pid, 0) + qty
+    return totals
+
+
+def _update_returning_ids(queryset, **values):
+    """
+    Run ``queryset.update(**values)`` and return the primary keys it touched.
+
+    The rows are locked first (SELECT ... FOR UPDATE where the backend
+    supports it) and the UPDATE keeps the queryset's conditions, so it
+    changes exactly the rows that were read.
+    """
+    ids = list(queryset.select_for_update().values_list("pk", flat=True))
+    if ids:
+        queryset.filter(pk__in=ids).update(**values)
+    return ids
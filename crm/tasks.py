@@ -1,55 +1,106 @@
 from celery import shared_task
 import os
-import requests
+import smtplib
 from datetime import datetime
+from decimal import Decimal
+from crm import graphql_client
+from crm.cleanup import delete_inactive_customers
+from crm.metrics import JOB_ITEMS, track_job
+from crm.reminders import send_order_reminders as run_order_reminders
+
+REFRESH_ROLLUPS = """
+mutation {
+  refreshSalesRollups {
+    refreshedDays
+  }
+}
+"""
 
 @shared_task
 def generate_crm_report():
     """
     Fetch total customers, orders, and revenue using GraphQL
     and log results to /tmp/crm_report_log.txt
+
+    Order totals are summed from the monthly sales rollups, refreshed
+    first, so the report reads a row per month instead of scanning every
+    order. Both operations go through crm.graphql_client: in the worker
+    process, or on the server under CRM_JOBS_GRAPHQL_URL.
     """
     query = """
     {
       allCustomers {
         totalCount
       }
-      allOrders {
-        totalCount
-        edges {
-          node {
-            totalAmount
-          }
-        }
+      salesTimeseries(granularity: MONTH) {
+        orderCount
+        revenue
       }
     }
     """
 
-    try:
-        response = requests.post("http://localhost:8000/graphql", json={"query": query})
-        data = response.json()["data"]
+    with track_job("generate_crm_report") as job:
+        try:
+            graphql_client.query(REFRESH_ROLLUPS)
+            data = graphql_client.query(query)
+
+            months = data["salesTimeseries"]
+            total_customers = data["allCustomers"]["totalCount"]
+            total_orders = sum(month["orderCount"] for month in months)
+            total_revenue = sum((Decimal(month["revenue"]) for month in months), Decimal("0.00"))
+
+            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            report = (
+                f"{timestamp} - Report: {total_customers} customers, "
+                f"{total_orders} orders, GHS {total_revenue:.2f} revenue\n"
+            )
+
+            tmp_dir = "/tmp" if os.name != "nt" else os.path.join(os.getcwd(), "crm", "logs")
+            os.makedirs(tmp_dir, exist_ok=True)
+            log_path = os.path.join(tmp_dir, "crm_report_log.txt")
+
+            with open(log_path, "a", encoding="utf-8") as f:
+                f.write(report)
 
-        total_customers = data["allCustomers"]["totalCount"]
-        total_orders = data["allOrders"]["totalCount"]
+            print("Weekly CRM report generated successfully!")
 
-        total_revenue = sum(
-            float(order["node"]["totalAmount"]) for order in data["allOrders"]["edges"]
-        )
+        except Exception as e:
+            job.fail()
+            print(f"Error generating CRM report: {e}")
 
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        report = (
-            f"{timestamp} - Report: {total_customers} customers, "
-            f"{total_orders} orders, GHS {total_revenue:.2f} revenue\n"
-        )
 
-        tmp_dir = "/tmp" if os.name != "nt" else os.path.join(os.getcwd(), "crm", "logs")
-        os.makedirs(tmp_dir, exist_ok=True)
-        log_path = os.path.join(tmp_dir, "crm_report_log.txt")
+@shared_task(
+    autoretry_for=(smtplib.SMTPException, OSError),
+    retry_backoff=True,
+    max_retries=5,
+)
+def send_order_reminders():
+    """
+    Email customers with orders in the last week (see crm.reminders).
+    SMTP failures are retried; each retry resumes from the checkpoint.
+    """
+    with track_job("send_order_reminders"):
+        sent, resumed = run_order_reminders()
+    print(f"Order reminders sent to {sent} customers{' (resumed)' if resumed else ''}")
+    return sent
 
-        with open(log_path, "a", encoding="utf-8") as f:
-            f.write(report)
 
-        print("Weekly CRM report generated successfully!")
+@shared_task
+def clean_inactive_customers(days=365):
+    """
+    Delete customers with no orders older than ``days`` in throttled
+    batches (see crm.cleanup). Resumes an interrupted run.
+    """
+    with track_job("clean_inactive_customers"):
+        deleted, resumed = delete_inactive_customers(days=days)
+    print(f"Deleted {deleted} inactive customers{' (resumed)' if resumed else ''}")
+    return deleted
+
 
-    except Exception as e:
-        print(f"Error generating CRM report: {e}")
+@shared_task
+def refresh_sales_rollups():
+    """Recompute the sales rollups of days with changed orders (see crm.rollups)."""
+    with track_job("refresh_sales_rollups"):
+        days = graphql_client.query(REFRESH_ROLLUPS)["refreshSalesRollups"]["refreshedDays"]
+    JOB_ITEMS.labels("refresh_sales_rollups", "refreshed").inc(len(days))
+    return len(days)
@@ -1,3 +1,1272 @@
-from django.test import TestCase
+import base64
+import contextlib
+import csv
+import datetime
+import io
+import json
+import os
+import smtplib
+import tempfile
+from decimal import Decimal
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Permission
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends import locmem, smtp
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import path
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from graphql import get_operation_ast, parse
+from prometheus_client import REGISTRY
+from alx_backend_graphql_crm.schema import schema
+from alx_backend_graphql_crm.views import AsyncCRMGraphQLView, DocumentCache, document_cache, query_hash
+from . import graphql_client, tasks
+from .cleanup import cleanup_candidates, delete_inactive_customers
+from .customer_stats import reconcile_stats
+from .importer import import_file
+from .mail import PooledEmailBackend, close_pooled_connections
+from .models import Customer, CustomerStats, DirtySalesDay, JobCheckpoint, Order, OrderItem, Product, SalesRollup
+from .orders import create_items
+from .query_cost import analyze
+from .reminders import send_order_reminders
+from .response_cache import response_cache_stats
+from .rollups import refresh_rollups, sales_timeseries
+from .search import SearchBackend, SQLiteFTSBackend, get_search_backend
+from .stock import InsufficientStock, allocate_stock, reserve_stock, restock_low_stock
 
-# Create your tests here.
+# The async view, mounted for AsyncGraphQLViewTests only
+urlpatterns = [
+    path("graphql", csrf_exempt(AsyncCRMGraphQLView.as_view(schema=schema))),
+]
+
+
+# Queries resolve in worker threads with their own connections, which
+# only see committed rows.
+@override_settings(ROOT_URLCONF="crm.tests")
+class AsyncGraphQLViewTests(TransactionTestCase):
+    query = {"query": "{ allCustomers(first: 5) { edges { node { name } } } }"}
+
+    def setUp(self):
+        Customer.objects.create(name="Ama", email="ama@example.com")
+        self.user = get_user_model().objects.create_user("staff", password="secret")
+
+    async def test_anonymous_query(self):
+        response = await self.async_client.post("/graphql", self.query, content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["data"]["allCustomers"]["edges"], [{"node": {"name": "Ama"}}])
+
+    async def test_logged_in_query(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.post("/graphql", self.query, content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["data"]["allCustomers"]["edges"], [{"node": {"name": "Ama"}}])
+
+    @override_settings(CRM_RESPONSE_CACHE_FIELDS={"allCustomers": 60})
+    async def test_logged_in_query_with_response_cache(self):
+        await self.async_client.aforce_login(self.user)
+        for _ in range(2):
+            response = await self.async_client.post("/graphql", self.query, content_type="application/json")
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn("errors", response.json())
+
+
+class QueryCostTests(TestCase):
+    unpaged = "{ allCustomers { edges { node { name orders { edges { node { products { edges { node { name } } } } } } } } } }"
+
+    def cost(self, query):
+        document = parse(query)
+        return analyze(schema.graphql_schema, document, get_operation_ast(document))
+
+    def test_unpaged_connections_count_100_rows(self):
+        cost = self.cost(self.unpaged)
+        self.assertEqual((cost.cost, cost.depth), (1 + 100 + 100 * 100, 4))
+
+    def test_first_limits_the_rows_below(self):
+        cost = self.cost(
+            "{ allCustomers(first: 10) { edges { node { orders(first: 5) { edges { node { totalAmount } } } } } } }"
+        )
+        self.assertEqual((cost.cost, cost.depth), (1 + 10, 3))
+
+    def test_default_settings_accept_unpaged_query(self):
+        response = self.client.post("/graphql", {"query": self.unpaged}, content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("errors", response.json())
+
+    @override_settings(CRM_QUERY_MAX_COST=5000)
+    def test_max_cost(self):
+        response = self.client.post("/graphql", {"query": self.unpaged}, content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["errors"][0]["extensions"]["code"], "QUERY_TOO_COSTLY")
+
+    @override_settings(CRM_QUERY_BUDGETS={"default": {"capacity": 15000, "rate": 0}})
+    def test_budget(self):
+        cache.clear()
+        first = self.client.post("/graphql", {"query": self.unpaged}, content_type="application/json")
+        second = self.client.post("/graphql", {"query": self.unpaged}, content_type="application/json")
+        self.assertNotIn("errors", first.json())
+        self.assertEqual(second.json()["errors"][0]["extensions"]["code"], "BUDGET_EXCEEDED")
+
+
+class TracingTests(TestCase):
+    query = "{ allCustomers(first: 5) { edges { node { name orders(first: 5) { edges { node { totalAmount } } } } } } }"
+
+    @classmethod
+    def setUpTestData(cls):
+        customer = Customer.objects.create(name="Ama", email="ama@example.com")
+        Order.objects.create(customer=customer, total_amount=Decimal("10.00"))
+
+    def post(self):
+        return self.client.post("/graphql", {"query": self.query}, content_type="application/json").json()
+
+    @override_settings(CRM_TRACE_IN_RESPONSE=True)
+    def test_off_by_default(self):
+        self.assertNotIn("extensions", self.post())
+
+    @override_settings(CRM_GRAPHQL_TRACING=True, CRM_TRACE_IN_RESPONSE=True)
+    def test_traces_resolvers_but_not_plain_scalars(self):
+        with self.assertLogs("crm.graphql", "INFO") as logs:
+            tracing = self.post()["extensions"]["tracing"]
+        self.assertEqual(json.loads(logs.records[0].getMessage())["sqlQueries"], tracing["sqlQueries"])
+        paths = {resolver["path"] for resolver in tracing["resolvers"]}
+        self.assertIn("allCustomers", paths)
+        self.assertIn("allCustomers.edges.node.orders", paths)
+        self.assertNotIn("allCustomers.edges.node.name", paths)
+        self.assertGreater(tracing["sqlQueries"], 0)
+
+    @override_settings(CRM_GRAPHQL_TRACING=True, CRM_TRACE_SAMPLE_RATE=0, CRM_TRACE_IN_RESPONSE=True)
+    def test_sample_rate(self):
+        self.assertNotIn("extensions", self.post())
+
+
+class MetricsTests(TestCase):
+    def sample(self, operation):
+        return REGISTRY.get_sample_value(
+            "crm_graphql_operation_seconds_count", {"operation_type": "query", "operation": operation}
+        ) or 0
+
+    def post(self, query):
+        self.client.post("/graphql", {"query": query}, content_type="application/json")
+
+    @override_settings(CRM_METRICS_OPERATIONS={"Known"})
+    def test_operation_names_outside_the_allow_list_are_other(self):
+        before = {name: self.sample(name) for name in ("Known", "other", "Unknown123")}
+        self.post("query Known { allProducts(first: 1) { edges { node { name } } } }")
+        self.post("query Unknown123 { allProducts(first: 1) { edges { node { name } } } }")
+        self.assertEqual(self.sample("Known"), before["Known"] + 1)
+        self.assertEqual(self.sample("other"), before["other"] + 1)
+        self.assertEqual(self.sample("Unknown123"), 0)
+
+    def test_aliased_root_fields_are_labelled_by_field_name(self):
+        self.post("{ custom123: allProducts(first: 1) { edges { node { name } } } }")
+        self.assertIsNone(REGISTRY.get_sample_value("crm_graphql_field_seconds_count", {"field": "custom123"}))
+        self.assertIsNotNone(REGISTRY.get_sample_value("crm_graphql_field_seconds_count", {"field": "allProducts"}))
+
+
+@override_settings(CRM_CLEANUP_PAUSE=0)
+class InactiveCustomerCleanupTests(TestCase):
+    def customer(self, name, days_old):
+        customer = Customer.objects.create(name=name, email=f"{name.lower()}@example.com")
+        Customer.objects.filter(pk=customer.pk).update(created_at=timezone.now() - datetime.timedelta(days=days_old))
+        return customer
+
+    def test_deletes_old_customers_without_orders(self):
+        old = self.customer("Old", 400)
+        no_stats = self.customer("NoStats", 400)
+        CustomerStats.objects.filter(customer=no_stats).delete()
+        recent = self.customer("Recent", 10)
+        buyer = self.customer("Buyer", 400)
+        Order.objects.create(customer=buyer, total_amount=Decimal("5.00"))
+        # Stale stats must not get a customer with orders deleted
+        stale = self.customer("Stale", 400)
+        Order.objects.create(customer=stale, total_amount=Decimal("5.00"))
+        CustomerStats.objects.filter(customer=stale).update(order_count=0)
+
+        deleted, resumed = delete_inactive_customers(days=365, batch_size=2)
+
+        self.assertEqual((deleted, resumed), (2, False))
+        self.assertEqual(
+            set(Customer.objects.values_list("pk", flat=True)), {recent.pk, buyer.pk, stale.pk}
+        )
+        self.assertFalse(Customer.objects.filter(pk__in=[old.pk, no_stats.pk]).exists())
+
+    def test_candidates_read_stats_not_orders(self):
+        sql = str(cleanup_candidates(timezone.now()).query)
+        self.assertIn("crm_customerstats", sql)
+        self.assertNotIn("crm_order", sql)
+
+
+class SalesRollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = Customer.objects.create(name="Ama", email="ama@example.com")
+
+    def at(self, day):
+        return timezone.make_aware(datetime.datetime.combine(day, datetime.time(12)))
+
+    def day_counts(self, *days):
+        rows = dict(
+            SalesRollup.objects.filter(granularity=SalesRollup.DAY, period__in=days).values_list("period", "order_count")
+        )
+        return [rows.get(day, 0) for day in days]
+
+    def test_refresh_recomputes_dirty_days(self):
+        day = datetime.date(2026, 3, 4)
+        with self.captureOnCommitCallbacks(execute=True):
+            Order.objects.create(customer=self.customer, total_amount=Decimal("10.00"), order_date=self.at(day))
+            Order.objects.create(customer=self.customer, total_amount=Decimal("5.50"), order_date=self.at(day))
+        self.assertEqual(list(DirtySalesDay.objects.values_list("day", flat=True)), [day])
+
+        self.assertEqual(refresh_rollups(), [day])
+
+        self.assertFalse(DirtySalesDay.objects.exists())
+        daily = SalesRollup.objects.get(granularity=SalesRollup.DAY, period=day)
+        self.assertEqual((daily.order_count, daily.customer_count, daily.revenue), (2, 1, Decimal("15.50")))
+        monthly = SalesRollup.objects.get(granularity=SalesRollup.MONTH, period=day.replace(day=1))
+        self.assertEqual(monthly.revenue, Decimal("15.50"))
+        buckets = sales_timeseries(day - datetime.timedelta(days=1), day)
+        self.assertEqual([bucket["order_count"] for bucket in buckets], [0, 2])
+
+    def test_moving_an_order_refreshes_both_days(self):
+        old, new = datetime.date(2026, 3, 4), datetime.date(2026, 3, 9)
+        with self.captureOnCommitCallbacks(execute=True):
+            order = Order.objects.create(customer=self.customer, total_amount=Decimal("10.00"), order_date=self.at(old))
+        refresh_rollups()
+        self.assertEqual(self.day_counts(old, new), [1, 0])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            order.order_date = self.at(new)
+            order.save()
+        refresh_rollups()
+        self.assertEqual(self.day_counts(old, new), [0, 1])
+
+    def test_deleting_an_order_refreshes_its_day(self):
+        day = datetime.date(2026, 3, 4)
+        with self.captureOnCommitCallbacks(execute=True):
+            order = Order.objects.create(customer=self.customer, total_amount=Decimal("10.00"), order_date=self.at(day))
+        refresh_rollups()
+        with self.captureOnCommitCallbacks(execute=True):
+            order.delete()
+        refresh_rollups()
+        self.assertEqual(self.day_counts(day), [0])
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        customer = Customer.objects.create(name="Ama", email="ama@example.com")
+        cls.order_date = timezone.make_aware(datetime.datetime(2026, 3, 4, 12, 30, 15, 123456))
+        Order.objects.create(customer=customer, total_amount=Decimal("10.50"), order_date=cls.order_date)
+        Order.objects.create(customer=customer, total_amount=Decimal("99.00"), order_date=cls.order_date)
+        cls.user = get_user_model().objects.create_user("clerk", password="secret")
+        cls.user.user_permissions.add(
+            *Permission.objects.filter(codename__in=["view_order", "view_customer"], content_type__app_label="crm")
+        )
+
+    def get(self, url, **params):
+        response = self.client.get(url, params)
+        content = b"".join(response.streaming_content) if response.streaming else response.content
+        return response, content.decode("utf-8")
+
+    def test_needs_login_and_permissions(self):
+        self.assertEqual(self.get("/export/orders.csv")[0].status_code, 403)
+        other = get_user_model().objects.create_user("other", password="secret")
+        other.user_permissions.add(Permission.objects.get(codename="view_order", content_type__app_label="crm"))
+        self.client.force_login(other)
+        self.assertEqual(self.get("/export/orders.csv")[0].status_code, 403)
+        self.client.force_login(self.user)
+        self.assertEqual(self.get("/export/orders.csv")[0].status_code, 200)
+        self.assertEqual(self.get("/export/products.csv")[0].status_code, 403)
+
+    def test_filters(self):
+        self.client.force_login(self.user)
+        response, content = self.get("/export/orders.ndjson", totalAmount_Gte="20")
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual([row["total_amount"] for row in rows], ["99.00"])
+
+    def test_invalid_filters_are_rejected(self):
+        self.client.force_login(self.user)
+        for name, params in (
+            ("orders.csv", {"nosuchFilter": "1"}),
+            ("orders.csv", {"totalAmount_Gte": "lots"}),
+            ("orders.csv", {"orderBy": "nosuchfield"}),
+            ("orders.xml", {}),
+            ("invoices.csv", {}),
+        ):
+            with self.subTest(name=name, params=params):
+                self.assertEqual(self.get(f"/export/{name}", **params)[0].status_code, 400)
+
+    def test_datetimes_keep_microseconds_in_both_formats(self):
+        self.client.force_login(self.user)
+        _, ndjson = self.get("/export/orders.ndjson")
+        _, text = self.get("/export/orders.csv")
+        expected = self.order_date.isoformat()
+        self.assertEqual(json.loads(ndjson.splitlines()[0])["order_date"], expected)
+        self.assertEqual(next(csv.DictReader(io.StringIO(text)))["order_date"], expected)
+
+
+def post_graphql(client, query, variables=None):
+    response = client.post(
+        "/graphql", {"query": query, "variables": variables or {}}, content_type="application/json"
+    )
+    return response.json()
+
+
+class RelationLoaderTests(TestCase):
+    query = """
+    {
+      allCustomers(first: 20, orderBy: "name") {
+        edges { node { name orderCount orders { edges { node { totalAmount items { edges { node {
+          quantity product { name }
+        } } } products { edges { node { name } } } } } } } }
+      }
+    }
+    """
+
+    def seed(self, customers):
+        products = [Product.objects.create(name=f"P{n}", price=Decimal("2.50"), stock=10) for n in range(3)]
+        start = Customer.objects.count()
+        for n in range(start, start + customers):
+            customer = Customer.objects.create(name=f"C{n:02}", email=f"c{n}@example.com")
+            for m in range(2):
+                order = Order.objects.create(customer=customer, total_amount=Decimal("0.00"))
+                create_items([(order, {product.pk: m + 1 for product in products[: m + 2]})], {
+                    product.pk: product.price for product in products
+                })
+                order.products.add(*products[: m + 2])
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            result = post_graphql(self.client, self.query)
+        self.assertNotIn("errors", result)
+        return len(queries), result["data"]["allCustomers"]["edges"]
+
+    def test_query_count_does_not_grow_with_rows(self):
+        self.seed(2)
+        few, edges = self.count_queries()
+        self.assertEqual(len(edges), 2)
+        self.seed(6)
+        many, edges = self.count_queries()
+        self.assertEqual(len(edges), 8)
+        self.assertEqual(few, many)
+        # The page, then one query each for stats, orders, items (joined
+        # to their product) and order products, whatever the page size
+        self.assertEqual(many, 5)
+
+    def test_nested_rows_match_the_database(self):
+        self.seed(2)
+        _, edges = self.count_queries()
+        orders = edges[0]["node"]["orders"]["edges"]
+        self.assertEqual(edges[0]["node"]["orderCount"], 2)
+        self.assertEqual(
+            [len(order["node"]["items"]["edges"]) for order in orders],
+            [len(order["node"]["products"]["edges"]) for order in orders],
+        )
+
+
+class OptimizerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        pen = Product.objects.create(name="Pen", price=Decimal("1.50"), stock=10)
+        for n in range(3):
+            customer = Customer.objects.create(name=f"C{n}", email=f"c{n}@example.com")
+            for _ in range(2):
+                order = Order.objects.create(customer=customer, total_amount=Decimal("3.00"))
+                create_items([(order, {pen.pk: 2})], {pen.pk: pen.price})
+
+    def run_query(self, query):
+        with CaptureQueriesContext(connection) as queries:
+            result = post_graphql(self.client, query)
+        self.assertNotIn("errors", result)
+        return [query["sql"] for query in queries]
+
+    def test_reads_only_the_selected_columns(self):
+        [sql] = self.run_query("{ allOrders(first: 5) { edges { node { totalAmount } } } }")
+        self.assertIn('"total_amount"', sql)
+        self.assertNotIn('"order_date"', sql)
+        self.assertNotIn("JOIN", sql)
+
+    def test_joins_selected_foreign_keys(self):
+        [sql] = self.run_query("{ allOrders(first: 5) { edges { node { customer { name } } } } }")
+        self.assertIn('INNER JOIN "crm_customer"', sql)
+        self.assertIn('"crm_customer"."name"', sql)
+        self.assertNotIn('"crm_customer"."email"', sql)
+
+    def test_expands_fragments(self):
+        [sql] = self.run_query("""
+            { allOrders(first: 5) { edges { node { ...OrderFields ... on OrderType { totalAmount } } } } }
+            fragment OrderFields on OrderType { customer { email } }
+        """)
+        self.assertIn('"crm_customer"."email"', sql)
+        self.assertIn('"total_amount"', sql)
+
+    def test_prefetches_nested_connections_narrowed(self):
+        page, orders = self.run_query(
+            "{ allCustomers(first: 5) { edges { node { name orders { edges { node { totalAmount } } } } } } }"
+        )
+        self.assertNotIn('"email"', page)
+        self.assertIn('"crm_order"."customer_id"', orders)
+        self.assertIn('"crm_order"."total_amount"', orders)
+        self.assertNotIn('"crm_order"."order_date"', orders)
+
+
+class OrderStatsTests(TestCase):
+    query = """
+    query ($gte: DateTime) {
+      orderStats(orderDate_Gte: $gte) {
+        count revenue avg min max
+        byDay { day count revenue }
+        byCustomer(first: 1) { customer { name } count revenue }
+        byProduct { product { name } count quantity revenue }
+      }
+    }
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ama = Customer.objects.create(name="Ama", email="ama@example.com")
+        kofi = Customer.objects.create(name="Kofi", email="kofi@example.com")
+        pen = Product.objects.create(name="Pen", price=Decimal("1.50"), stock=10)
+        lamp = Product.objects.create(name="Lamp", price=Decimal("20.00"), stock=10)
+        day = lambda n: timezone.make_aware(datetime.datetime(2026, 3, n, 12))
+        for customer, date, lines in (
+            (cls.ama, day(1), {pen.pk: (2, Decimal("1.50")), lamp.pk: (1, Decimal("18.00"))}),
+            (cls.ama, day(2), {pen.pk: (1, Decimal("1.50"))}),
+            (kofi, day(2), {lamp.pk: (1, Decimal("20.00"))}),
+        ):
+            order = Order.objects.create(customer=customer, total_amount=Decimal("0.00"), order_date=date)
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product_id=pid, quantity=quantity, unit_price=price)
+                for pid, (quantity, price) in lines.items()
+            ])
+            order.products.add(*lines)
+            Order.objects.filter(pk=order.pk).update(
+                total_amount=sum(quantity * price for quantity, price in lines.values())
+            )
+
+    def stats(self, **variables):
+        with CaptureQueriesContext(connection) as queries:
+            result = post_graphql(self.client, self.query, variables)
+        self.assertNotIn("errors", result)
+        return result["data"]["orderStats"], len(queries)
+
+    def test_aggregates_in_the_database(self):
+        stats, queries = self.stats()
+        self.assertEqual(
+            {key: stats[key] for key in ("count", "revenue", "avg", "min", "max")},
+            {"count": 3, "revenue": "42.50", "avg": "14.17", "min": "1.50", "max": "21.00"},
+        )
+        self.assertEqual(
+            [(bucket["day"], bucket["count"], bucket["revenue"]) for bucket in stats["byDay"]],
+            [("2026-03-01", 1, "21.00"), ("2026-03-02", 2, "21.50")],
+        )
+        self.assertEqual(stats["byCustomer"], [{"customer": {"name": "Ama"}, "count": 2, "revenue": "22.50"}])
+        # Products at the prices their lines were sold at
+        self.assertEqual(stats["byProduct"], [
+            {"product": {"name": "Lamp"}, "count": 2, "quantity": 2, "revenue": "38.00"},
+            {"product": {"name": "Pen"}, "count": 2, "quantity": 3, "revenue": "4.50"},
+        ])
+        # Totals, each breakdown and the customers and products they name
+        self.assertEqual(queries, 6)
+
+    def test_takes_the_order_filters(self):
+        stats, _ = self.stats(gte="2026-03-02T00:00:00+00:00")
+        self.assertEqual((stats["count"], stats["revenue"]), (2, "21.50"))
+
+    def test_filter_joins_do_not_double_count(self):
+        result = post_graphql(self.client, '{ orderStats(productName: "p") { count revenue } }')
+        self.assertEqual(result["data"]["orderStats"], {"count": 3, "revenue": "42.50"})
+
+
+class KeysetPaginationTests(TestCase):
+    page = """
+    query ($order: String, $first: Int, $after: String, $last: Int, $before: String) {
+      allCustomers(keyset: true, orderBy: $order, first: $first, after: $after, last: $last, before: $before) {
+        pageInfo { hasNextPage hasPreviousPage startCursor endCursor }
+        edges { node { name } }
+      }
+    }
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        # Two NULL phones, and a tie on the phone, so the pk breaks ties
+        for name, phone in (("A", "+233200000003"), ("B", None), ("C", "+233200000001"),
+                            ("D", None), ("E", "+233200000002"), ("F", "+233200000001")):
+            Customer.objects.create(name=name, email=f"{name.lower()}@example.com", phone=phone)
+
+    def fetch(self, order, **args):
+        result = post_graphql(self.client, self.page, dict(order=order, **args))
+        self.assertNotIn("errors", result)
+        connection = result["data"]["allCustomers"]
+        return [edge["node"]["name"] for edge in connection["edges"]], connection["pageInfo"]
+
+    def walk_forward(self, order):
+        names, after = [], None
+        while True:
+            page, info = self.fetch(order, first=2, after=after)
+            names += page
+            if not info["hasNextPage"]:
+                return names
+            after = info["endCursor"]
+
+    def walk_backward(self, order):
+        names, before = [], None
+        while True:
+            page, info = self.fetch(order, last=2, before=before)
+            names = page + names
+            if not info["hasPreviousPage"]:
+                return names
+            before = info["startCursor"]
+
+    def test_nulls_sort_last_both_ways(self):
+        self.assertEqual(self.walk_forward("phone"), ["C", "F", "E", "A", "B", "D"])
+        self.assertEqual(self.walk_forward("-phone"), ["A", "E", "C", "F", "B", "D"])
+
+    def test_backward_pages_match_forward_pages(self):
+        for order in ("phone", "-phone", "name", "-created_at"):
+            with self.subTest(order=order):
+                self.assertEqual(self.walk_backward(order), self.walk_forward(order))
+
+    def test_cursor_from_a_null_key(self):
+        page, info = self.fetch("phone", first=5)
+        self.assertEqual(page[-1], "B")
+        page, info = self.fetch("phone", first=5, after=info["endCursor"])
+        self.assertEqual((page, info["hasNextPage"]), (["D"], False))
+
+    def test_cursor_must_match_the_ordering(self):
+        _, info = self.fetch("phone", first=1)
+        result = post_graphql(self.client, self.page, {"order": "phone,name", "first": 1, "after": info["endCursor"]})
+        self.assertIn("Invalid keyset cursor", result["errors"][0]["message"])
+
+    def test_malformed_cursors_are_rejected(self):
+        for payload in ("keyset:{not json", "keyset:5", 'keyset:["yesterday", 1]'):
+            with self.subTest(payload=payload):
+                cursor = base64.b64encode(payload.encode()).decode()
+                result = post_graphql(
+                    self.client, self.page, {"order": "created_at", "first": 1, "after": cursor}
+                )
+                self.assertEqual(result["errors"][0]["message"], "Invalid keyset cursor for this ordering.")
+
+
+class BulkCreateCustomersTests(TestCase):
+    mutation = """
+    mutation ($input: [BulkCustomerInput!]!, $allOrNothing: Boolean) {
+      bulkCreateCustomers(input: $input, allOrNothing: $allOrNothing, batchSize: 2) { customers { email } errors }
+    }
+    """
+    rows = [
+        {"name": "New", "email": "new@example.com", "phone": "+233201234567"},
+        {"name": "Taken", "email": "TAKEN@example.com"},
+        {"name": "Bad phone", "email": "bad@example.com", "phone": "not a phone"},
+        {"name": "Again", "email": "new@example.com"},
+        {"name": "Other", "email": "other@example.com"},
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        Customer.objects.create(name="Taken", email="taken@example.com")
+
+    def run_mutation(self, all_or_nothing=False):
+        result = post_graphql(self.client, self.mutation, {"input": self.rows, "allOrNothing": all_or_nothing})
+        return result["data"]["bulkCreateCustomers"]
+
+    def test_valid_rows_are_created_and_the_rest_reported(self):
+        payload = self.run_mutation()
+        self.assertEqual([c["email"] for c in payload["customers"]], ["new@example.com", "other@example.com"])
+        self.assertEqual([error.split(":")[0] for error in payload["errors"]], ["Row 2", "Row 3", "Row 4"])
+        self.assertEqual(Customer.objects.count(), 3)
+        # Created in bulk, but with stats rows like any other customer
+        self.assertEqual(CustomerStats.objects.count(), 3)
+
+    def test_all_or_nothing_creates_nothing(self):
+        payload = self.run_mutation(all_or_nothing=True)
+        self.assertEqual(payload["customers"], [])
+        self.assertEqual(len(payload["errors"]), 3)
+        self.assertEqual(Customer.objects.count(), 1)
+
+
+class BulkCreateOrdersTests(TestCase):
+    mutation = """
+    mutation ($input: [BulkOrderInput!]!, $allOrNothing: Boolean) {
+      bulkCreateOrders(input: $input, allOrNothing: $allOrNothing) { orders { totalAmount } errors }
+    }
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ama = Customer.objects.create(name="Ama", email="ama@example.com")
+        cls.kofi = Customer.objects.create(name="Kofi", email="kofi@example.com")
+        cls.pen = Product.objects.create(name="Pen", price=Decimal("1.50"), stock=10)
+        cls.lamp = Product.objects.create(name="Lamp", price=Decimal("20.00"), stock=1)
+
+    def rows(self):
+        return [
+            {"customerId": str(self.ama.pk), "items": [{"productId": str(self.pen.pk), "quantity": 2}]},
+            {"customerId": "999", "productIds": [str(self.pen.pk)]},
+            {"customerId": str(self.kofi.pk), "productIds": ["999"]},
+            {"customerId": str(self.kofi.pk), "productIds": [str(self.pen.pk), str(self.lamp.pk)]},
+            # The lamp is gone after the row above
+            {"customerId": str(self.ama.pk), "productIds": [str(self.lamp.pk)]},
+        ]
+
+    def run_mutation(self, all_or_nothing=False):
+        result = post_graphql(self.client, self.mutation, {"input": self.rows(), "allOrNothing": all_or_nothing})
+        return result["data"]["bulkCreateOrders"]
+
+    def stock(self):
+        return list(Product.objects.order_by("pk").values_list("stock", flat=True))
+
+    def test_valid_rows_are_created_and_the_rest_reported(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            payload = self.run_mutation()
+        self.assertEqual([o["totalAmount"] for o in payload["orders"]], ["3.00", "21.50"])
+        self.assertEqual([error.split(":")[0] for error in payload["errors"]], ["Row 2", "Row 3", "Row 5"])
+        self.assertIn("Insufficient stock", payload["errors"][2])
+        self.assertEqual(self.stock(), [7, 0])
+        stats = CustomerStats.objects.in_bulk([self.ama.pk, self.kofi.pk])
+        self.assertEqual((stats[self.ama.pk].order_count, stats[self.ama.pk].lifetime_value), (1, Decimal("3.00")))
+        self.assertEqual((stats[self.kofi.pk].order_count, stats[self.kofi.pk].lifetime_value), (1, Decimal("21.50")))
+        self.assertEqual(reconcile_stats(dry_run=True), (0, 0))
+        self.assertTrue(DirtySalesDay.objects.exists())
+
+    def test_all_or_nothing_creates_nothing(self):
+        payload = self.run_mutation(all_or_nothing=True)
+        self.assertEqual(payload["orders"], [])
+        self.assertEqual(len(payload["errors"]), 3)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(self.stock(), [10, 1])
+
+
+class RestockTests(TestCase):
+    mutation = """
+    mutation ($toTarget: Boolean) {
+      updateLowStockProducts(threshold: 10, increment: 5, restockToTarget: $toTarget) {
+        success message updatedProducts { name stock }
+      }
+    }
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        for name, stock, target in (("Pen", 2, None), ("Lamp", 3, 50), ("Mug", 4, 4), ("Desk", 8, 6), ("Sofa", 20, 100)):
+            Product.objects.create(name=name, price=Decimal("1.00"), stock=stock, restock_target=target)
+
+    def stock(self):
+        return dict(Product.objects.values_list("name", "stock"))
+
+    def restock(self, to_target=False):
+        result = post_graphql(self.client, self.mutation, {"toTarget": to_target})
+        return result["data"]["updateLowStockProducts"]
+
+    def test_increments_low_stock_products(self):
+        payload = self.restock()
+        self.assertEqual(payload["message"], "4 products restocked successfully.")
+        self.assertEqual(self.stock(), {"Pen": 7, "Lamp": 8, "Mug": 9, "Desk": 13, "Sofa": 20})
+
+    def test_to_target_reports_only_changed_products(self):
+        payload = self.restock(to_target=True)
+        # Mug is at its target and Desk above it; neither changes
+        self.assertEqual(payload["updatedProducts"], [{"name": "Pen", "stock": 7}, {"name": "Lamp", "stock": 50}])
+        self.assertEqual(self.stock(), {"Pen": 7, "Lamp": 50, "Mug": 4, "Desk": 8, "Sofa": 20})
+
+    def test_nothing_to_restock(self):
+        self.assertEqual(restock_low_stock(threshold=10, increment=0), [])
+        self.assertEqual([p.name for p in restock_low_stock(threshold=10, increment=0, to_target=True)], ["Lamp"])
+        self.assertEqual(restock_low_stock(threshold=1), [])
+
+
+class StockReservationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.pen = Product.objects.create(name="Pen", price=Decimal("1.50"), stock=10)
+        cls.lamp = Product.objects.create(name="Lamp", price=Decimal("20.00"), stock=3)
+
+    def stock(self):
+        return list(Product.objects.order_by("pk").values_list("stock", flat=True))
+
+    def test_reserves_every_line_in_one_update(self):
+        with CaptureQueriesContext(connection) as queries:
+            reserve_stock({self.pen.pk: 4, self.lamp.pk: 3})
+        self.assertEqual([q["sql"].split()[0] for q in queries if "crm_product" in q["sql"]], ["UPDATE"])
+        self.assertEqual(self.stock(), [6, 0])
+
+    def test_short_product_takes_nothing(self):
+        with self.assertRaises(InsufficientStock) as raised:
+            reserve_stock({self.pen.pk: 4, self.lamp.pk: 5})
+        self.assertEqual(raised.exception.product_ids, [self.lamp.pk])
+        self.assertEqual(self.stock(), [10, 3])
+
+    def test_create_order_leaves_stock_alone_when_short(self):
+        customer = Customer.objects.create(name="Ama", email="ama@example.com")
+        result = post_graphql(self.client, """
+            mutation ($input: CreateOrderInput!) { createOrder(input: $input) { order { id } errors } }
+        """, {"input": {"customerId": str(customer.pk), "items": [
+            {"productId": str(self.pen.pk), "quantity": 2}, {"productId": str(self.lamp.pk), "quantity": 4},
+        ]}})
+        self.assertIn("Insufficient stock", result["data"]["createOrder"]["errors"][0])
+        self.assertEqual(self.stock(), [10, 3])
+        self.assertFalse(Order.objects.exists())
+
+    def test_allocate_shares_out_what_is_left(self):
+        rejected = allocate_stock([{self.lamp.pk: 2}, {self.lamp.pk: 2}, {self.pen.pk: 1, self.lamp.pk: 1}])
+        self.assertEqual(list(rejected), [1])
+        self.assertEqual(self.stock(), [9, 0])
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.ama = Customer.objects.create(name="Ama Mensah", email="ama@example.com")
+        cls.kofi = Customer.objects.create(name="Kofi Owusu", email="kofi@mail.test")
+        Customer.objects.bulk_create([Customer(name="Abena Ofori", email="abena@example.org")])
+        pen = Product.objects.create(name="Blue Pen", price=Decimal("1.50"), stock=10)
+        order = Order.objects.create(customer=cls.kofi, total_amount=Decimal("1.50"))
+        OrderItem.objects.create(order=order, product=pen, quantity=1, unit_price=pen.price)
+
+    def names(self, query, backend=None):
+        backend = backend or get_search_backend()
+        return sorted(backend.search(Customer.objects.all(), query).values_list("name", flat=True))
+
+    def test_index_matches_substring_search(self):
+        self.assertIsInstance(get_search_backend(), SQLiteFTSBackend)
+        for query in ("MENSAH", "example", "ama example.com", "of", "ku", 'a"b', "nobody"):
+            with self.subTest(query=query):
+                self.assertEqual(self.names(query), self.names(query, SearchBackend()))
+        self.assertEqual(self.names("example"), ["Abena Ofori", "Ama Mensah"])
+
+    def test_index_follows_writes(self):
+        Customer.objects.filter(pk=self.ama.pk).update(name="Ama Boateng")
+        self.kofi.delete()
+        self.assertEqual(self.names("boateng"), ["Ama Boateng"])
+        self.assertEqual(self.names("mensah"), [])
+        self.assertEqual(self.names("owusu"), [])
+
+    def test_search_filters(self):
+        result = post_graphql(self.client, """{
+          allCustomers(search: "ofori example") { edges { node { name } } }
+          allOrders(search: "blue") { edges { node { customer { name } } } }
+        }""")
+        self.assertEqual(result["data"]["allCustomers"]["edges"], [{"node": {"name": "Abena Ofori"}}])
+        self.assertEqual(result["data"]["allOrders"]["edges"], [{"node": {"customer": {"name": "Kofi Owusu"}}}])
+
+
+class DocumentCacheTests(TestCase):
+    def test_least_recently_used_entry_is_evicted(self):
+        documents = DocumentCache(maxsize=2)
+        documents.set("a", 1)
+        documents.set("b", 2)
+        self.assertEqual(documents.get("a"), 1)
+        documents.set("c", 3)
+        self.assertIsNone(documents.get("b"))
+        self.assertEqual((documents.get("a"), documents.get("c")), (1, 3))
+        self.assertEqual(
+            documents.stats(), {"size": 2, "maxsize": 2, "hits": 3, "misses": 1, "evictions": 1}
+        )
+
+    def test_view_parses_and_validates_once(self):
+        document_cache.clear()
+        before = document_cache.stats()
+        for _ in range(2):
+            result = post_graphql(self.client, "{ allProducts(first: 1) { edges { node { name } } } }")
+            self.assertNotIn("errors", result)
+        for _ in range(2):
+            result = post_graphql(self.client, "{ allProducts { nope } }")
+            self.assertIn("Cannot query field 'nope'", result["errors"][0]["message"])
+        after = document_cache.stats()
+        self.assertEqual((after["misses"] - before["misses"], after["hits"] - before["hits"]), (2, 2))
+
+
+class PersistedQueryTests(TestCase):
+    query = "{ allProducts(first: 1) { edges { node { name } } } }"
+
+    def setUp(self):
+        cache.clear()
+        Product.objects.create(name="Pen", price=Decimal("1.50"), stock=10)
+
+    def post(self, extensions, query=None):
+        body = {"extensions": extensions}
+        if query is not None:
+            body["query"] = query
+        return self.client.post("/graphql", body, content_type="application/json")
+
+    def persisted(self, sha256=None):
+        return {"persistedQuery": {"version": 1, "sha256Hash": sha256 or query_hash(self.query)}}
+
+    def error_code(self, response):
+        return response.json()["errors"][0]["extensions"]["code"]
+
+    def test_unknown_hash_then_register_then_hit(self):
+        self.assertEqual(self.error_code(self.post(self.persisted())), "PERSISTED_QUERY_NOT_FOUND")
+        registered = self.post(self.persisted(), query=self.query).json()
+        self.assertEqual(registered["data"]["allProducts"]["edges"], [{"node": {"name": "Pen"}}])
+        self.assertEqual(self.post(self.persisted()).json(), registered)
+        response = self.client.get("/graphql", {"extensions": json.dumps(self.persisted())}, HTTP_ACCEPT="application/json")
+        self.assertEqual(response.json(), registered)
+
+    def test_hash_must_match_the_query(self):
+        response = self.post(self.persisted("0" * 64), query=self.query)
+        self.assertEqual(self.error_code(response), "PERSISTED_QUERY_HASH_MISMATCH")
+        self.assertEqual(self.error_code(self.post(self.persisted("0" * 64))), "PERSISTED_QUERY_NOT_FOUND")
+
+    def test_unsupported_version(self):
+        response = self.post({"persistedQuery": {"version": 2, "sha256Hash": query_hash(self.query)}})
+        self.assertEqual(self.error_code(response), "PERSISTED_QUERY_NOT_SUPPORTED")
+
+    def test_malformed_extensions_are_bad_requests(self):
+        for extensions in ("x", ["persistedQuery"], {"persistedQuery": "x"}, {"persistedQuery": [1]},
+                           {"persistedQuery": {"version": 1}}, {"persistedQuery": {"version": 1, "sha256Hash": 5}}):
+            with self.subTest(extensions=extensions):
+                self.assertEqual(self.post(extensions, query=self.query).status_code, 400)
+        response = self.client.get("/graphql", {"query": self.query, "extensions": "{nope"}, HTTP_ACCEPT="application/json")
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(CRM_RESPONSE_CACHE_FIELDS={"allProducts": 60, "allOrders": 60})
+class ResponseCacheTests(TestCase):
+    products = "{ allProducts(first: 5) { edges { node { name } } } }"
+    orders = "{ allOrders(first: 5) { edges { node { totalAmount items { edges { node { quantity } } } } } } }"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.pen = Product.objects.create(name="Pen", price=Decimal("1.50"), stock=10)
+        cls.customer = Customer.objects.create(name="Ama", email="ama@example.com")
+
+    def setUp(self):
+        cache.clear()
+
+    def names(self):
+        edges = post_graphql(self.client, self.products)["data"]["allProducts"]["edges"]
+        return [edge["node"]["name"] for edge in edges]
+
+    def hits(self, query):
+        before = response_cache_stats.stats()["hits"]
+        post_graphql(self.client, query)
+        return response_cache_stats.stats()["hits"] - before
+
+    def test_cached_until_the_model_is_written(self):
+        self.assertEqual(self.names(), ["Pen"])
+        # update() sends no signals, so the cached page is served
+        Product.objects.filter(pk=self.pen.pk).update(name="Quill")
+        self.assertEqual(self.names(), ["Pen"])
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(name="Lamp", price=Decimal("20.00"), stock=1)
+        self.assertEqual(self.names(), ["Quill", "Lamp"])
+
+    def test_writes_to_other_models_keep_the_entry(self):
+        self.hits(self.products)
+        with self.captureOnCommitCallbacks(execute=True):
+            Customer.objects.create(name="Kofi", email="kofi@example.com")
+            Order.objects.create(customer=self.customer, total_amount=Decimal("1.00"))
+        self.assertEqual(self.hits(self.products), 1)
+
+    def test_order_lines_invalidate_orders_and_products(self):
+        order = Order.objects.create(customer=self.customer, total_amount=Decimal("1.50"))
+        self.hits(self.orders)
+        self.hits(self.products)
+        with self.captureOnCommitCallbacks(execute=True):
+            OrderItem.objects.create(order=order, product=self.pen, quantity=1, unit_price=self.pen.price)
+        self.assertEqual((self.hits(self.orders), self.hits(self.products)), (0, 0))
+        self.assertEqual((self.hits(self.orders), self.hits(self.products)), (1, 1))
+
+    def test_only_listed_root_fields_are_cached(self):
+        query = "{ allCustomers(first: 5) { edges { node { name } } } }"
+        post_graphql(self.client, query)
+        self.assertEqual(self.hits(query), 0)
+        mixed = "{ allProducts(first: 5) { edges { node { name } } } allCustomers(first: 1) { edges { node { name } } } }"
+        post_graphql(self.client, mixed)
+        self.assertEqual(self.hits(mixed), 0)
+
+    def test_entries_are_per_user(self):
+        self.hits(self.products)
+        user = get_user_model().objects.create_user("staff", password="secret")
+        self.client.force_login(user)
+        self.assertEqual(self.hits(self.products), 0)
+        self.assertEqual(self.hits(self.products), 1)
+
+
+class GraphQLClientTests(TestCase):
+    query = "query ($first: Int) { allProducts(first: $first) { edges { node { name } } } }"
+
+    @classmethod
+    def setUpTestData(cls):
+        Product.objects.create(name="Pen", price=Decimal("1.50"), stock=10)
+
+    def test_runs_in_process(self):
+        data = graphql_client.query(self.query, {"first": 1})
+        self.assertEqual(data["allProducts"]["edges"], [{"node": {"name": "Pen"}}])
+        response = graphql_client.execute("{ allProducts { nope } }")
+        self.assertIsNone(response["data"])
+        self.assertIn("Cannot query field 'nope'", response["errors"][0]["message"])
+        with self.assertRaises(graphql_client.GraphQLClientError) as raised:
+            graphql_client.query("{ allProducts { nope } }")
+        self.assertIn("nope", str(raised.exception))
+
+    @override_settings(
+        CRM_JOBS_GRAPHQL_URL="https://crm.example.com/graphql", CRM_JOBS_GRAPHQL_API_KEY="key", CRM_JOBS_GRAPHQL_TIMEOUT=5
+    )
+    def test_posts_to_the_configured_server(self):
+        body = {"data": {"allProducts": {"edges": []}}}
+        with mock.patch.object(graphql_client.requests, "post") as post:
+            post.return_value.json.return_value = body
+            with self.assertNumQueries(0):
+                self.assertEqual(graphql_client.query(self.query, {"first": 1}, "Products"), body["data"])
+        post.assert_called_once_with(
+            "https://crm.example.com/graphql",
+            json={"query": self.query, "variables": {"first": 1}, "operationName": "Products"},
+            headers={"X-API-Key": "key"},
+            timeout=5,
+        )
+
+    @override_settings(CRM_JOBS_GRAPHQL_URL="https://crm.example.com/graphql")
+    def test_remote_errors(self):
+        with mock.patch.object(graphql_client.requests, "post") as post:
+            post.return_value.json.return_value = {"data": None, "errors": [{"message": "Denied"}]}
+            with self.assertRaisesMessage(graphql_client.GraphQLClientError, "Denied"):
+                graphql_client.query(self.query)
+            # A non-JSON body (e.g. a proxy's 502 page) raises the HTTP error
+            post.return_value.json.side_effect = ValueError
+            post.return_value.raise_for_status.side_effect = graphql_client.requests.HTTPError("502")
+            with self.assertRaises(graphql_client.requests.HTTPError):
+                graphql_client.execute(self.query)
+
+
+@mock.patch("crm.reminders._log")
+class OrderReminderTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        for n, (recent, old) in enumerate(((2, 0), (1, 1), (0, 3), (1, 0))):
+            customer = Customer.objects.create(name=f"C{n}", email=f"c{n}@example.com")
+            for days in [1] * recent + [30] * old:
+                Order.objects.create(
+                    customer=customer, total_amount=Decimal("1.00"), order_date=now - datetime.timedelta(days=days)
+                )
+
+    def test_one_email_per_customer_with_recent_orders(self, log):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(send_order_reminders(chunk_size=2), (3, False))
+        # One aggregated query per page of customers, the last one empty
+        self.assertEqual(sum('FROM "crm_order"' in query["sql"] for query in queries), 3)
+        self.assertEqual([message.to for message in mail.outbox], [["c0@example.com"], ["c1@example.com"], ["c3@example.com"]])
+        self.assertIn("You placed 2 orders", mail.outbox[0].body)
+        self.assertIn("You placed 1 order ", mail.outbox[1].body)
+        self.assertEqual(mail.outbox[0].subject, "Thanks for your recent orders")
+        self.assertIsNotNone(JobCheckpoint.objects.get(name="order_reminders").finished_at)
+
+    def test_interrupted_run_resumes_after_the_last_page(self, log):
+        send = locmem.EmailBackend.send_messages
+        calls = []
+
+        def flaky(backend, messages):
+            calls.append(len(messages))
+            if len(calls) == 2:
+                raise smtplib.SMTPServerDisconnected("gone")
+            return send(backend, messages)
+
+        with mock.patch.object(locmem.EmailBackend, "send_messages", flaky):
+            with self.assertRaises(smtplib.SMTPServerDisconnected):
+                send_order_reminders(chunk_size=2)
+            self.assertEqual(len(mail.outbox), 2)
+            self.assertEqual(send_order_reminders(chunk_size=2), (3, True))
+        self.assertEqual([message.to[0] for message in mail.outbox[2:]], ["c3@example.com"])
+        # The next run starts a new window
+        self.assertEqual(send_order_reminders(chunk_size=2), (3, False))
+
+
+class PooledEmailBackendTests(TestCase):
+    def setUp(self):
+        self.addCleanup(close_pooled_connections)
+
+    def backend(self):
+        return PooledEmailBackend(host="smtp.example.com", port=25, username="crm", password="secret")
+
+    def test_connection_is_reused_while_alive(self):
+        connection = mock.Mock(**{"noop.return_value": (250, b"OK")})
+        first = self.backend()
+        first.connection = connection
+        first.close()
+        connection.quit.assert_not_called()
+
+        second = self.backend()
+        self.assertTrue(second.open())
+        self.assertIs(second.connection, connection)
+        # Another server has its own pool entry
+        other = PooledEmailBackend(host="other.example.com", port=25)
+        with mock.patch.object(smtp.EmailBackend, "open", return_value=True) as opened:
+            other.open()
+        opened.assert_called_once()
+
+        second.close()
+        close_pooled_connections()
+        connection.quit.assert_called_once()
+
+    def test_dead_connection_is_replaced(self):
+        dead = mock.Mock(**{"noop.side_effect": smtplib.SMTPServerDisconnected})
+        first = self.backend()
+        first.connection = dead
+        first.close()
+
+        second = self.backend()
+        with mock.patch.object(smtp.EmailBackend, "open", return_value=True) as opened:
+            self.assertTrue(second.open())
+        dead.close.assert_called_once()
+        opened.assert_called_once()
+
+    def test_displaced_connection_is_closed(self):
+        old, new = mock.Mock(), mock.Mock()
+        for connection in (old, new):
+            backend = self.backend()
+            backend.connection = connection
+            backend.close()
+        old.quit.assert_called_once()
+        new.quit.assert_not_called()
+
+
+class CustomerStatsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = Customer.objects.create(name="Ama", email="ama@example.com")
+
+    def stats(self):
+        stats = CustomerStats.objects.get(customer=self.customer)
+        return stats.order_count, stats.lifetime_value, stats.last_order_date
+
+    def test_created_with_the_customer(self):
+        self.assertEqual(self.stats(), (0, Decimal("0.00"), None))
+
+    def test_follows_created_and_deleted_orders(self):
+        early = timezone.make_aware(datetime.datetime(2026, 1, 1, 9))
+        late = timezone.make_aware(datetime.datetime(2026, 2, 1, 9))
+        first = Order.objects.create(customer=self.customer, total_amount=Decimal("10.00"), order_date=late)
+        Order.objects.create(customer=self.customer, total_amount=Decimal("2.25"), order_date=early)
+        self.assertEqual(self.stats(), (2, Decimal("12.25"), late))
+
+        first.delete()
+        self.assertEqual(self.stats(), (1, Decimal("2.25"), early))
+
+    def test_reconcile_restores_drifted_and_missing_rows(self):
+        Order.objects.create(customer=self.customer, total_amount=Decimal("10.00"))
+        other = Customer.objects.create(name="Kofi", email="kofi@example.com")
+        CustomerStats.objects.filter(customer=self.customer).update(order_count=7, lifetime_value=0)
+        CustomerStats.objects.filter(customer=other).delete()
+
+        self.assertEqual(reconcile_stats(dry_run=True), (1, 1))
+        self.assertEqual(self.stats()[0], 7)
+        self.assertEqual(reconcile_stats(batch_size=1), (1, 1))
+        self.assertEqual(self.stats()[:2], (1, Decimal("10.00")))
+        self.assertTrue(CustomerStats.objects.filter(customer=other, order_count=0).exists())
+        self.assertEqual(reconcile_stats(), (0, 0))
+
+
+class OrderLineTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = Customer.objects.create(name="Ama", email="ama@example.com")
+        cls.pen = Product.objects.create(name="Pen", price=Decimal("1.50"), stock=100)
+        cls.lamp = Product.objects.create(name="Lamp", price=Decimal("20.00"), stock=100)
+
+    def create_order(self, items):
+        result = post_graphql(self.client, """
+            mutation ($input: CreateOrderInput!) {
+              createOrder(input: $input) { order { id totalAmount items { edges { node { quantity unitPrice lineTotal } } } } errors }
+            }
+        """, {"input": {"customerId": str(self.customer.pk), "items": [
+            {"productId": str(product.pk), "quantity": quantity} for product, quantity in items
+        ]}})
+        return result["data"]["createOrder"]["order"]
+
+    def test_lines_snapshot_prices_and_make_up_the_total(self):
+        order = self.create_order([(self.pen, 3), (self.lamp, 1)])
+        self.assertEqual(order["totalAmount"], "24.50")
+        self.assertEqual(
+            sorted((line["node"]["quantity"], line["node"]["unitPrice"], line["node"]["lineTotal"])
+                   for line in order["items"]["edges"]),
+            [(1, "20.00", "20.00"), (3, "1.50", "4.50")],
+        )
+        Product.objects.filter(pk=self.pen.pk).update(price=Decimal("9.99"))
+        self.assertEqual(OrderItem.objects.get(product=self.pen).unit_price, Decimal("1.50"))
+
+    def test_line_total_alone_reads_its_columns_with_the_lines(self):
+        for n in range(20):
+            self.create_order([(self.pen, n % 3 + 1), (self.lamp, 1)])
+        with CaptureQueriesContext(connection) as queries:
+            result = post_graphql(
+                self.client, "{ allOrders(first: 20) { edges { node { id items { edges { node { lineTotal } } } } } } }"
+            )
+        # The page of orders, then all of their lines
+        self.assertEqual(len(queries), 2)
+        totals = [line["node"]["lineTotal"] for edge in result["data"]["allOrders"]["edges"]
+                  for line in edge["node"]["items"]["edges"]]
+        self.assertEqual(len(totals), 40)
+        self.assertEqual(sorted(set(totals)), ["1.50", "20.00", "3.00", "4.50"])
+
+    def test_line_filters(self):
+        small = self.create_order([(self.pen, 1)])
+        large = self.create_order([(self.pen, 2), (self.lamp, 5)])
+        result = post_graphql(self.client, """
+            query ($product: Decimal) {
+              bulk: allOrders(itemQuantity_Gte: 5) { edges { node { id } } }
+              lamps: allOrders(productId: $product) { edges { node { id } } }
+              pens: allOrders(productId: %d) { edges { node { id } } }
+            }
+        """ % self.pen.pk, {"product": str(self.lamp.pk)})
+        ids = {name: [edge["node"]["id"] for edge in field["edges"]] for name, field in result["data"].items()}
+        self.assertEqual(ids, {"bulk": [large["id"]], "lamps": [large["id"]], "pens": [small["id"], large["id"]]})
+
+
+class RollupJobTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = Customer.objects.create(name="Ama", email="ama@example.com")
+
+    def run_task(self, task):
+        with mock.patch("crm.tasks.open", mock.mock_open(), create=True) as opened, \
+                contextlib.redirect_stdout(io.StringIO()):
+            result = task()
+        return result, "".join(call.args[0] for call in opened().write.call_args_list)
+
+    def test_refresh_mutation(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Order.objects.create(customer=self.customer, total_amount=Decimal("10.00"))
+        result = post_graphql(self.client, "mutation { refreshSalesRollups { refreshedDays } }")
+        self.assertEqual(result["data"]["refreshSalesRollups"]["refreshedDays"], [timezone.localdate().isoformat()])
+        self.assertEqual(self.run_task(tasks.refresh_sales_rollups)[0], 0)
+
+    def test_report_reads_refreshed_rollups(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Order.objects.create(customer=self.customer, total_amount=Decimal("10.00"))
+            Order.objects.create(customer=self.customer, total_amount=Decimal("2.50"))
+        _, report = self.run_task(tasks.generate_crm_report)
+        self.assertIn("Report: 1 customers, 2 orders, GHS 12.50 revenue", report)
+        self.assertFalse(DirtySalesDay.objects.exists())
+
+    @override_settings(CRM_JOBS_GRAPHQL_URL="https://crm.example.com/graphql")
+    def test_jobs_need_only_graphql_in_remote_mode(self):
+        responses = {
+            "refreshSalesRollups": {"data": {"refreshSalesRollups": {"refreshedDays": ["2026-03-04"]}}},
+            "salesTimeseries": {"data": {
+                "allCustomers": {"totalCount": 3},
+                "salesTimeseries": [{"orderCount": 2, "revenue": "12.50"}, {"orderCount": 1, "revenue": "1.00"}],
+            }},
+        }
+
+        def post(url, json, **kwargs):
+            response = mock.Mock()
+            response.json.return_value = next(body for key, body in responses.items() if key in json["query"])
+            return response
+
+        with mock.patch.object(graphql_client.requests, "post", side_effect=post) as posted, \
+                self.assertNumQueries(0):
+            self.assertEqual(self.run_task(tasks.refresh_sales_rollups)[0], 1)
+            _, report = self.run_task(tasks.generate_crm_report)
+        self.assertIn("Report: 3 customers, 3 orders, GHS 13.50 revenue", report)
+        self.assertEqual(posted.call_count, 3)
+
+
+class OrderDateTests(TestCase):
+    mutation = """
+    mutation ($input: CreateOrderInput!) { createOrder(input: $input) { order { orderDate } errors } }
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = Customer.objects.create(name="Ama", email="ama@example.com")
+        cls.pen = Product.objects.create(name="Pen", price=Decimal("1.50"), stock=10)
+
+    def create_order(self, **extra):
+        variables = {"input": {"customerId": str(self.customer.pk), "productIds": [str(self.pen.pk)], **extra}}
+        with self.captureOnCommitCallbacks(execute=True):
+            result = post_graphql(self.client, self.mutation, variables)
+        self.assertEqual(result["data"]["createOrder"]["errors"], [])
+        return Order.objects.latest("pk").order_date
+
+    def test_supplied_order_date_is_stored(self):
+        self.assertEqual(
+            self.create_order(orderDate="2026-01-02T10:30:00+00:00"),
+            datetime.datetime(2026, 1, 2, 10, 30, tzinfo=datetime.timezone.utc),
+        )
+        self.assertIn(datetime.date(2026, 1, 2), DirtySalesDay.objects.values_list("day", flat=True))
+
+    def test_order_date_defaults_to_now(self):
+        before = timezone.now()
+        self.assertTrue(before <= self.create_order() <= timezone.now())
+
+
+class ImportTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def write(self, name, text):
+        path = os.path.join(self.directory, name)
+        with open(path, "w", encoding="utf-8", newline="") as handle:
+            handle.write(text)
+        return path
+
+    def test_customers_are_upserted_on_email_and_bad_rows_rejected(self):
+        path = self.write("customers.csv", (
+            "name,email,phone\n"
+            "Ama,ama@example.com,+233201234567\n"
+            "No email,,\n"
+            "Kofi,kofi@example.com,not a phone\n"
+            "Kwame,kwame@example.com,\n"
+        ))
+        stats = import_file("customers", path, workers=1, batch_size=2)
+        self.assertEqual((stats.read, stats.imported, stats.rejected), (4, 2, 2))
+        with open(stats.rejects_path, encoding="utf-8", newline="") as handle:
+            rejects = list(csv.DictReader(handle))
+        self.assertEqual([row["_line"] for row in rejects], ["3", "4"])
+        self.assertIn("email is required", rejects[0]["_error"])
+
+        path = self.write("again.csv", "name,email,phone\nAma Mensah,AMA@example.com,\n")
+        stats = import_file("customers", path, workers=1)
+        self.assertEqual((stats.imported, stats.rejected), (1, 0))
+        self.assertEqual(Customer.objects.count(), 2)
+        self.assertEqual(Customer.objects.get(email="ama@example.com").name, "Ama Mensah")
+        self.assertEqual(CustomerStats.objects.count(), 2)
+
+    def test_products_are_upserted_on_id(self):
+        path = self.write("products.csv", "id,name,price,stock\n7,Pen,1.50,10\n,Lamp,20,3\n")
+        import_file("products", path, workers=1)
+        path = self.write("again.csv", "id,name,price,stock\n7,Blue pen,1.75,12\n,Free,0,1\n")
+        stats = import_file("products", path, workers=1)
+        self.assertEqual((stats.imported, stats.rejected), (1, 1))
+        self.assertEqual(Product.objects.count(), 2)
+        pen = Product.objects.get(pk=7)
+        self.assertEqual((pen.name, pen.price, pen.stock), ("Blue pen", Decimal("1.75"), 12))
+
+    def test_orders_are_skipped_when_run_again(self):
+        customer = Customer.objects.create(name="Ama", email="ama@example.com")
+        pen = Product.objects.create(name="Pen", price=Decimal("1.50"), stock=10)
+        lines = [
+            {"id": 100, "customer_id": customer.pk, "order_date": "2026-01-02T10:00:00",
+             "items": [{"product_id": pen.pk, "quantity": 2}]},
+            {"id": 101, "customer_email": "AMA@example.com", "items": [{"product_id": pen.pk, "unit_price": "1.00"}]},
+            {"id": 102, "customer_id": customer.pk, "items": [999]},
+            {"id": 103, "customer_email": "nobody@example.com", "items": [pen.pk]},
+        ]
+        path = self.write("orders.ndjson", "".join(json.dumps(line) + "\n" for line in lines) + "{not json\n")
+        stats = import_file("orders", path, workers=1)
+        self.assertEqual((stats.imported, stats.skipped, stats.rejected), (2, 0, 3))
+        with open(stats.rejects_path, encoding="utf-8") as handle:
+            rejects = [json.loads(line) for line in handle]
+        self.assertEqual([reject["_line"] for reject in rejects], [3, 4, 5])
+        self.assertIn("Invalid product IDs: [999]", rejects[0]["_error"])
+        self.assertEqual(rejects[0]["id"], 102)
+
+        totals = dict(Order.objects.values_list("pk", "total_amount"))
+        self.assertEqual(totals, {100: Decimal("3.00"), 101: Decimal("1.00")})
+        stats_row = CustomerStats.objects.get(customer=customer)
+        self.assertEqual((stats_row.order_count, stats_row.lifetime_value), (2, Decimal("4.00")))
+        # Historical orders do not touch stock
+        self.assertEqual(Product.objects.get(pk=pen.pk).stock, 10)
+
+        stats = import_file("orders", path, workers=1)
+        self.assertEqual((stats.imported, stats.skipped, stats.rejected), (0, 2, 3))
+        self.assertEqual(Order.objects.count(), 2)
+        self.assertEqual(reconcile_stats(dry_run=True), (0, 0))
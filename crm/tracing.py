@@ -0,0 +1,170 @@
+import json
+import logging
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.db import connection
+from graphene.types.resolver import attr_resolver, dict_or_attr_resolver, dict_resolver
+from graphql import get_named_type, is_leaf_type
+
+logger = logging.getLogger("crm.graphql")
+slow_logger = logging.getLogger("crm.graphql.slow")
+
+_current_trace = ContextVar("crm_trace", default=None)
+_current_path = ContextVar("crm_trace_path", default=None)
+
+# ``IN (%s, %s, ...)`` of any length is the same query shape
+_IN_LIST = re.compile(r"\((?:%s, )*%s\)")
+
+_DEFAULT_RESOLVERS = (attr_resolver, dict_or_attr_resolver, dict_resolver)
+
+
+class RequestTrace:
+    """
+    Timings for one GraphQL operation: wall time per resolver path (list
+    indices dropped, so ``allCustomers.edges.node.orders`` aggregates every
+    customer) and every SQL query, attributed to the resolver running it.
+
+    Without ``detailed`` (metrics only) just the root fields are timed and
+    SQL queries are counted, not kept.
+    """
+
+    def __init__(self, operation_name=None, operation_type=None, detailed=True):
+        self.operation_name = operation_name
+        self.operation_type = operation_type
+        self.detailed = detailed
+        self.started = time.perf_counter()
+        self.duration = None
+        self.resolvers = {}
+        self.queries = []
+        self.query_count = 0
+
+    def finish(self):
+        self.duration = time.perf_counter() - self.started
+
+    def _stats(self, path):
+        stats = self.resolvers.get(path)
+        if stats is None:
+            stats = self.resolvers[path] = {"calls": 0, "ms": 0.0, "queries": 0, "sqlMs": 0.0}
+        return stats
+
+    def add_resolver(self, path, duration):
+        stats = self._stats(path)
+        stats["calls"] += 1
+        stats["ms"] += duration * 1000
+
+    def record_sql(self, execute, sql, params, many, context):
+        """connection.execute_wrapper hook."""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            path = _current_path.get()
+            self.query_count += 1
+            if self.detailed:
+                self.queries.append((path, _IN_LIST.sub("(...)", sql), duration))
+            if path is not None:
+                stats = self._stats(path)
+                stats["queries"] += 1
+                stats["sqlMs"] += duration * 1000
+
+    @contextmanager
+    def activate(self):
+        """Make this the current trace and record SQL on this thread's connection."""
+        token = _current_trace.set(self)
+        try:
+            with connection.execute_wrapper(self.record_sql):
+                yield self
+        finally:
+            _current_trace.reset(token)
+
+    def repeated_queries(self, threshold):
+        """SQL shapes run more than ``threshold`` times (likely N+1)."""
+        counts = {}
+        for path, shape, _ in self.queries:
+            entry = counts.setdefault(shape, {"sql": shape, "count": 0, "paths": set()})
+            entry["count"] += 1
+            entry["paths"].add(path or "<execution>")
+        return [
+            dict(entry, paths=sorted(entry["paths"]))
+            for entry in sorted(counts.values(), key=lambda e: -e["count"])
+            if entry["count"] > threshold
+        ]
+
+    def summary(self, top=10):
+        resolvers = sorted(self.resolvers.items(), key=lambda item: -item[1]["ms"])
+        return {
+            "operation": self.operation_name,
+            "durationMs": round((self.duration or 0) * 1000, 2),
+            "sqlQueries": self.query_count,
+            "sqlMs": round(sum(duration for _, _, duration in self.queries) * 1000, 2),
+            "resolvers": [
+                dict(
+                    path=path,
+                    calls=stats["calls"],
+                    ms=round(stats["ms"], 2),
+                    queries=stats["queries"],
+                    sqlMs=round(stats["sqlMs"], 2),
+                )
+                for path, stats in resolvers[:top]
+            ],
+            "nPlusOne": self.repeated_queries(getattr(settings, "CRM_N_PLUS_ONE_THRESHOLD", 10)),
+        }
+
+    def log(self):
+        """Emit the summary as one JSON log line; slow requests also go to the slow log."""
+        summary = self.summary()
+        line = json.dumps(summary, sort_keys=True)
+        logger.info(line)
+        if summary["nPlusOne"]:
+            logger.warning("Repeated SQL in %s: %s", self.operation_name or "<anonymous>", json.dumps(summary["nPlusOne"]))
+        slow_ms = getattr(settings, "CRM_SLOW_REQUEST_MS", None)
+        if slow_ms is not None and summary["durationMs"] >= slow_ms:
+            slow_logger.warning(line)
+        return summary
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+@contextmanager
+def trace_thread():
+    """Record SQL on this (worker) thread's connection into the current trace."""
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    with connection.execute_wrapper(trace.record_sql):
+        yield
+
+
+def _default_scalar(info):
+    """Whether the field is a scalar read straight off its parent."""
+    field = info.parent_type.fields[info.field_name]
+    return getattr(field.resolve, "func", field.resolve) in _DEFAULT_RESOLVERS and is_leaf_type(
+        get_named_type(info.return_type)
+    )
+
+
+class TracingMiddleware:
+    """
+    Graphene middleware timing the resolvers of the current trace: every
+    one but plain scalar fields for a detailed trace, else the root fields.
+    """
+
+    def resolve(self, next, root, info, **args):
+        trace = _current_trace.get()
+        if trace is None or (info.path.prev is not None and not trace.detailed) or _default_scalar(info):
+            return next(root, info, **args)
+        path = ".".join(str(key) for key in info.path.as_list() if not isinstance(key, int))
+        token = _current_path.set(path)
+        start = time.perf_counter()
+        try:
+            return next(root, info, **args)
+        finally:
+            trace.add_resolver(path, time.perf_counter() - start)
+            _current_path.reset(token)
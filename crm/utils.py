@@ -3,12 +3,19 @@ from decimal import Decimal, InvalidOperation
 
 
 PHONE_RE = re.compile(r'^(\+?\d{7,15}|(\d{3}-\d{3}-\d{4}))$')
+PHONE_ERROR = "Invalid phone format. Use +1234567890 or 123-456-7890."
 
 
 def validate_phone(phone):
     """Raise ValueError if phone provided and invalid."""
     if phone and not PHONE_RE.match(phone):
-        raise ValueError("Invalid phone format. Use +1234567890 or 123-456-7890.")
+        raise ValueError(PHONE_ERROR)
+
+
+def invalid_phones(phones):
+    """Return the positions of provided-but-invalid phones in a sequence."""
+    match = PHONE_RE.match
+    return {idx for idx, phone in enumerate(phones) if phone and not match(phone)}
 
 
 def to_decimal(value):
@@ -16,4 +23,11 @@ def to_decimal(value):
     try:
         return Decimal(str(value))
     except (InvalidOperation, TypeError, ValueError):
-        raise ValueError(f"Invalid decimal value: {value}")
\ No newline at end of file
+        raise ValueError(f"Invalid decimal value: {value}")
+
+
+def chunked(items, size):
+    """Yield successive lists of at most ``size`` items."""
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
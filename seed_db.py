@@ -8,6 +8,7 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "alx_backend_graphql_crm.setting
 django.setup()
 
 from crm.models import Customer, Product, Order  
+from crm.orders import apply_totals, create_items
 
 def seed_customers():
     """Seed initial customers."""
@@ -59,14 +60,15 @@ def seed_orders(customers, products):
     for i in range(3):  # create 3 sample orders
         customer = random.choice(customers)
         selected_products = random.sample(products, k=random.randint(1, 3))
-        total_amount = sum(p.price for p in selected_products)
+        quantities = {p.id: random.randint(1, 3) for p in selected_products}
 
         order = Order.objects.create(
             customer=customer,
-            total_amount=total_amount,
+            total_amount=Decimal("0.00"),
             order_date=timezone.now(),
         )
-        order.products.set(selected_products)
+        create_items([(order, quantities)], {p.id: p.price for p in selected_products})
+        apply_totals([order])
         print(f"✅ Created order #{order.id} for {customer.name} with {len(selected_products)} products.")
 
 